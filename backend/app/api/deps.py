@@ -1,4 +1,7 @@
 # backend/app/api/deps.py
+import logging
+import time
+from functools import lru_cache
 from typing import Annotated, Any
 from app.models.user import User
 from fastapi import Depends, HTTPException, status
@@ -6,11 +9,23 @@ from app.core.settings import settings
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.database import (DATABASE_NAME, analytics_read_preference,
+                               create_client)
+from app.core.indexes import ensure_indexes, explain_queries, format_report
+from app.core.metrics import span
+from app.utils.cache import TTLCache
 
 # OAuth2PasswordBearer instance
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 client = None
 
+# Verified JWT payloads keyed by raw token, and authenticated users keyed by
+# username. Token entries never outlive the token's own "exp" claim.
+token_cache = TTLCache(maxsize=settings.auth_cache_max_entries,
+                       ttl=settings.auth_token_cache_ttl)
+user_cache = TTLCache(maxsize=settings.auth_cache_max_entries,
+                      ttl=settings.auth_user_cache_ttl)
+
 
 def define_db_management(app):
     global client
@@ -18,7 +33,11 @@ def define_db_management(app):
     @app.on_event("startup")
     async def startup_db_client():
         global client
-        client = AsyncIOMotorClient(settings.mongodb_uri)
+        client = create_client()
+        db = client[DATABASE_NAME]
+        await ensure_indexes(db)
+        if settings.mongodb_index_diagnostics:
+            await log_query_plans(db)
 
     @app.on_event("shutdown")
     async def shutdown_db_client():
@@ -26,23 +45,81 @@ def define_db_management(app):
         client.close()
 
 
+async def log_query_plans(db):
+    """Log explain() output for each endpoint query, using any existing user."""
+    user = await db.users.find_one({}, {"username": 1})
+    if not user:
+        logging.info("Index diagnostics skipped: no users yet")
+        return
+    report = await explain_queries(db, str(user["_id"]), user["username"])
+    logging.info("Query plans:\n%s", format_report(report))
+
+
+def define_receipt_workers(app, queue):
+    """Run the receipt job workers for the lifetime of the app."""
+
+    @app.on_event("startup")
+    async def start_receipt_workers():
+        queue.start(client[DATABASE_NAME], settings.receipt_job_workers)
+
+    @app.on_event("shutdown")
+    async def stop_receipt_workers():
+        await queue.stop()
+
+
+def define_worker_pools(app, *pools):
+    """Shut down the process pools behind ``pools`` when the app stops."""
+
+    @app.on_event("shutdown")
+    async def stop_worker_pools():
+        for pool in pools:
+            pool.shutdown()
+
+
 async def get_db():
     if not client:
         raise Exception("Error mongodb not started")
-    db = client.taxBusiness
+    db = client[DATABASE_NAME]
     yield db
 
+
+async def get_analytics_db():
+    """The database with the analytics read preference, for heavy reads that
+    can tolerate replication lag (secondaries by default)."""
+    if not client:
+        raise Exception("Error mongodb not started")
+    yield client.get_database(DATABASE_NAME, read_preference=analytics_read_preference())
+
+
+def decode_token(token: str) -> dict:
+    """Verify a JWT, memoizing the payload so repeat tokens skip verification."""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    with span("jwt_decode"):
+        payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
+    ttl = settings.auth_token_cache_ttl
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(token, payload, ttl=ttl)
+    return payload
+
+
+def invalidate_user(username: str) -> None:
+    """Drop a cached user; call whenever the user's document changes."""
+    user_cache.pop(username)
+
 # Dependency to get the current user
 
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme), db: AsyncIOMotorClient = Depends(get_db)
 ) -> User:
-    print("jwt %s" % settings.jwt_secret)
     try:
         # Decode the token
-        payload = jwt.decode(token, settings.jwt_secret,
-                             algorithms=["HS256"])
+        payload = decode_token(token)
         user_name: str = payload.get("sub")
         if not user_name:
             raise ValueError("User name not found in token")
@@ -59,9 +136,14 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    user = user_cache.get(user_name)
+    if user is not None:
+        return user
+
     # geting user data from db
-    user_data = await db.users.find_one({"username": "manoj_panda"})
-    user_data = await db.users.find_one({"username": user_name})
+    with span("user_lookup"):
+        user_data = await db.users.find_one(
+            {"username": user_name}, {"username": 1, "hashed_password": 1})
     if not user_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -69,12 +151,54 @@ async def get_current_user(
         )
 
     # Return the User object
-    return User(
+    user = User(
         id=str(user_data["_id"]),
         username=str(user_data["username"]),
         password=str(user_data["hashed_password"])
     )
+    user_cache.set(user_name, user)
+    return user
+
+
+# Service providers. Each service (and the SDKs behind it: Google Vision and
+# Gemini, TaxJar) is imported and built on first use rather than when the
+# app is imported, so workers start fast and boot without third-party
+# credentials. Override them with app.dependency_overrides.
+
+
+@lru_cache(maxsize=None)
+def get_ocr_service():
+    from app.services.ocr_service import OCRService
+
+    try:
+        return OCRService()
+    except (RuntimeError, ImportError, OSError, ValueError) as e:
+        # Missing SDKs, keys or credential files are configuration, not a crash
+        logging.error(f"Could not start the OCR service: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"OCR is not configured: {e}",
+        )
+
+
+@lru_cache(maxsize=None)
+def get_tax_service():
+    from app.services.tax_service import TaxService
+
+    return TaxService()
+
+
+@lru_cache(maxsize=None)
+def get_forecast_service():
+    from app.services.forecast_service import ForecastService
+
+    return ForecastService()
+
 
 # Annotated types for dependencies
 DB = Annotated[Any, Depends(get_db)]
+AnalyticsDB = Annotated[Any, Depends(get_analytics_db)]
 CurrentUser = Annotated[User, Depends(get_current_user)]
+OCR = Annotated[Any, Depends(get_ocr_service)]
+Tax = Annotated[Any, Depends(get_tax_service)]
+Forecast = Annotated[Any, Depends(get_forecast_service)]
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pymongo import MongoClient
 from datetime import datetime, timedelta
 from typing import Optional
-from app.api.deps import DB
+from app.api.deps import DB, invalidate_user
+from app.core.security import PasswordHasherBusy, password_hasher
 from app.core.settings import settings
 import os
 
@@ -14,8 +14,6 @@ jwt_secret = settings.jwt_secret
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password Hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 router = APIRouter()
@@ -23,24 +21,40 @@ router = APIRouter()
 # Utility Functions
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await _hash_or_busy(password_hasher.verify(plain_password, hashed_password))
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await _hash_or_busy(password_hasher.hash(password))
+
+
+async def _hash_or_busy(operation):
+    try:
+        return await operation
+    except PasswordHasherBusy as busy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry",
+            headers={"Retry-After": str(busy.retry_after)},
+        )
 
 
 async def get_user(users_collection, username: str):
     return await users_collection.find_one({"username": username})
 
 
-def create_user(users_collection, username: str, password: str):
+# Every write to the users collection goes through a helper here that drops
+# the user from get_current_user's cache.
+
+
+async def create_user(users_collection, username: str, password: str):
     user = {
         "username": username,
-        "hashed_password": get_password_hash(password),
+        "hashed_password": await get_password_hash(password),
     }
-    users_collection.insert_one(user)
+    await users_collection.insert_one(user)
+    invalidate_user(username)
     return user
 
 
@@ -48,7 +62,7 @@ async def authenticate_user(users_collection, username: str, password: str):
     user = await get_user(users_collection, username)
     if not user:
         return False
-    if not verify_password(password, user["hashed_password"]):
+    if not await verify_password(password, user["hashed_password"]):
         return False
     return user
 
@@ -57,7 +71,6 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
-    print(jwt_secret)
     encoded_jwt = jwt.encode(to_encode, jwt_secret, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -68,13 +81,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 async def register_user(db: DB, form_data: OAuth2PasswordRequestForm = Depends()):
     users_collection = db.users
     user = await get_user(users_collection, form_data.username)
-    print("User...", user)
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered",
         )
-    create_user(users_collection, form_data.username, form_data.password)
+    await create_user(users_collection, form_data.username, form_data.password)
     return {"msg": "User created successfully"}
 
 
@@ -1,78 +1,390 @@
-from datetime import datetime
-from typing import List
+import asyncio
+import io
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional, Tuple, Union
 
-from fastapi import APIRouter, HTTPException, status, File, UploadFile, Depends
-from app.api.deps import DB, CurrentUser
-from app.models.expense import Expense, ExpenseCreate, ReceiptResponse
-from app.services.ocr_service import OCRService
+from fastapi import APIRouter, HTTPException, status, File, UploadFile, Depends, Header, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+from app.api.deps import DB, OCR, AnalyticsDB, CurrentUser, get_ocr_service
+from app.core.settings import settings
+from app.models.expense import (Expense, ExpenseCreate, ExpensePage, ReceiptJob,
+                                ReceiptResponse)
+from app.services.export_service import EXPORT_PROJECTION, export_csv, export_parquet
+from app.services.import_service import ExpenseImporter, dedupe_key
+from app.services.receipt_jobs import PermanentJobError, ReceiptJobQueue
+from app.services.receipt_storage import get_receipt_store, read_ocr_image, store_receipt
+from app.services.rollup_service import RollupService
+from app.utils.helpers import decode_cursor, encode_cursor
 from app.models.expense import ConfirmExpenseRequest
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 
 router = APIRouter()
-ocr_service = OCRService()
+rollup_service = RollupService()
+expense_importer = ExpenseImporter(settings.import_batch_size, settings.import_max_errors)
+
+
+def analyze_receipt(receipt_data: dict, filename: str) -> dict:
+    """Map OCR output onto the receipt fields shown to the user for review."""
+    return {
+        "amount": receipt_data.get("total_amount", 0.0),
+        "merchant": receipt_data.get("vendor", ""),
+        # Add logic to extract or assign a category
+        "category": receipt_data.get("category", "Uncategorized"),
+        "upload_date": datetime.utcnow(),
+        "is_tax_deductible": False,  # Default value until user confirms
+        "deduction_reason": None,  # Default value until user provides input
+        "receipt_image": filename,
+        "date": receipt_data.get("date", ""),
+        "invoice_number": receipt_data.get("invoice_number", ""),
+        "tax_rate": receipt_data.get("tax_rate", 0.0),
+        "tax_amount": receipt_data.get("tax_amount", 0.0),
+        "items": receipt_data.get("items", [])
+    }
+
+
+# OCR outcomes that are the same however often the receipt is retried
+PERMANENT_OCR_ERRORS = {"No text found in image"}
+
+
+async def process_receipt_job(db, job: dict) -> dict:
+    """Run OCR for a queued upload and store the parsed receipt."""
+    stored = await db.receipt_files.find_one(
+        {"_id": job["receipt_file_id"], "user_id": job["user_id"]})
+    if not stored:
+        raise PermanentJobError("Receipt file not found")
+    if "image_format" in stored and not stored["image_format"]:
+        raise PermanentJobError("Unsupported image format")
+    try:
+        ocr_service = get_ocr_service()
+    except HTTPException as err:
+        raise PermanentJobError(err.detail)
+
+    image = await read_ocr_image(get_receipt_store(db), stored)
+    receipt_data = await ocr_service.extract_receipt_data(image, db, preprocessed=True)
+    if receipt_data.get("error") in PERMANENT_OCR_ERRORS:
+        raise PermanentJobError(receipt_data["error"])
+    if "error" in receipt_data:
+        raise RuntimeError(receipt_data["error"])
+
+    analyzed_data = analyze_receipt(receipt_data, str(stored["_id"]))
+    result = await db.receipts.insert_one({
+        "user_id": job["user_id"],
+        "filename": job["filename"],
+        **analyzed_data
+    })
+    return {"receipt_id": str(result.inserted_id), **analyzed_data}
+
+
+receipt_queue = ReceiptJobQueue(
+    process_receipt_job,
+    max_attempts=settings.receipt_job_max_attempts,
+    backoff_seconds=settings.receipt_job_backoff,
+    lease_seconds=settings.receipt_job_lease,
+    poll_interval=settings.receipt_job_poll_interval,
+)
 
 
 @router.post("/upload-receipt/", response_model=ReceiptResponse)
 async def upload_receipt(
     db: DB,
     current_user: CurrentUser,
+    ocr_service: OCR,
     file: UploadFile = File(...)
 ):
     """
     Uploads a receipt, extracts data using OCR, and returns the analyzed data for user confirmation.
     """
     try:
-        # Read file contents
-        contents = await file.read()
+        # Stream the upload into receipt storage instead of reading it whole
+        stored = await store_receipt(db, get_receipt_store(db), current_user.id,
+                                     file.file, file.filename, file.content_type)
+
+        # Re-uploads of a stored receipt return the receipt already parsed
+        if stored["duplicate"]:
+            receipt = await db.receipts.find_one(
+                {"user_id": current_user.id, "receipt_image": str(stored["_id"])})
+            if receipt:
+                return ReceiptResponse(
+                    id=str(receipt["_id"]),
+                    amount=receipt["amount"],
+                    date=receipt.get("date") or None,
+                    vendor=receipt.get("merchant") or None,
+                    receipt_image=receipt["receipt_image"]
+                )
 
         # Extract receipt data using OCR service
-        receipt_data = await ocr_service.extract_receipt_data(contents)
+        receipt_data = await ocr_service.extract_receipt_data(
+            stored["ocr_bytes"], db, preprocessed=True)
 
         # Prepare data for user review
-        analyzed_data = {
-            "amount": receipt_data.get("total_amount", 0.0),
-            "merchant": receipt_data.get("vendor", ""),
-            # Add logic to extract or assign a category
-            "category": receipt_data.get("category", "Uncategorized"),
-            "upload_date": datetime.utcnow(),
-            "is_tax_deductible": False,  # Default value until user confirms
-            "deduction_reason": None,  # Default value until user provides input
-            "receipt_image": file.filename,
-            "date": receipt_data.get("date", ""),
-            "invoice_number": receipt_data.get("invoice_number", ""),
-            "tax_rate": receipt_data.get("tax_rate", 0.0),
-            "tax_amount": receipt_data.get("tax_amount", 0.0),
-            "items": receipt_data.get("items", [])
-        }
+        analyzed_data = analyze_receipt(receipt_data, str(stored["_id"]))
 
         # Save the receipt data into the receipts collection
         result = await db.receipts.insert_one({
             "user_id": current_user.id,
-            "amount": analyzed_data["amount"],
-            "merchant": analyzed_data["merchant"],
-            "category": analyzed_data["category"],
-            "upload_date": analyzed_data["upload_date"],
-            "is_tax_deductible": analyzed_data["is_tax_deductible"],
-            "deduction_reason": analyzed_data["deduction_reason"],
-            "receipt_image": analyzed_data["receipt_image"],
-            "date": analyzed_data["date"],
-            "invoice_number": analyzed_data["invoice_number"],
-            "tax_rate": analyzed_data["tax_rate"],
-            "tax_amount": analyzed_data["tax_amount"],
-            "items": analyzed_data["items"]
+            "filename": file.filename,
+            **analyzed_data
         })
 
         return ReceiptResponse(
-            **analyzed_data
+            id=str(result.inserted_id),
+            amount=analyzed_data["amount"],
+            date=analyzed_data["date"] or None,
+            vendor=analyzed_data["merchant"] or None,
+            receipt_image=analyzed_data["receipt_image"]
         )
     except Exception as err:
-        print(f"Error while processing receipt in upload_receipt: {err}")
+        logging.error(f"Error while processing receipt in upload_receipt: {err}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process receipt"
         )
 
 
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """First range of a ``Range: bytes=...`` header as inclusive offsets."""
+    if not header or not header.startswith("bytes="):
+        return None
+    first = header[len("bytes="):].split(",")[0].strip()
+    start_text, _, end_text = first.partition("-")
+    try:
+        if not start_text:
+            start, end = max(size - int(end_text), 0), size - 1
+        else:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+@router.get("/receipts/{file_id}")
+async def get_receipt_image(
+    file_id: str,
+    db: DB,
+    current_user: CurrentUser,
+    variant: Literal["original", "thumbnail", "ocr"] = "original",
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Serves a stored receipt image (or its thumbnail/OCR variant) with
+    single-range requests, ETags and long-lived private caching.
+    """
+    doc = None
+    if ObjectId.is_valid(file_id):
+        doc = await db.receipt_files.find_one(
+            {"_id": ObjectId(file_id), "user_id": current_user.id})
+    blob = doc if variant == "original" or not doc else doc["variants"].get(variant)
+    if not blob:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Receipt image not found"
+        )
+
+    # Blobs are immutable, so their content hash is a strong validator
+    headers = {
+        "ETag": f'"{blob["sha256"]}"',
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if if_none_match and headers["ETag"] in if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    size = blob["size"]
+    byte_range = parse_range(range_header, size) if size else None
+    start, end = byte_range or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    store = get_receipt_store(db)
+    return StreamingResponse(
+        store.stream(blob["blob_id"], start, end) if size else iter(()),
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type=blob.get("content_type") or "application/octet-stream",
+        headers=headers
+    )
+
+
+@router.post("/upload-receipt/async/", status_code=status.HTTP_202_ACCEPTED)
+async def upload_receipt_async(
+    db: DB,
+    current_user: CurrentUser,
+    file: UploadFile = File(...)
+):
+    """
+    Queues a receipt for background OCR and returns a job id immediately.
+    Poll /jobs/{job_id} for progress and the parsed result.
+    """
+    # The job carries a reference to the stored upload, not its bytes
+    stored = await store_receipt(db, get_receipt_store(db), current_user.id,
+                                 file.file, file.filename, file.content_type)
+    job_id = await receipt_queue.enqueue(
+        db, current_user.id, file.filename, stored["_id"])
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/jobs/{job_id}", response_model=ReceiptJob)
+async def get_receipt_job(
+    job_id: str,
+    db: DB,
+    current_user: CurrentUser
+):
+    """
+    Returns the status, progress and (once finished) result of a receipt job.
+    """
+    job = await receipt_queue.get(db, job_id, current_user.id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return ReceiptJob(job_id=str(job["_id"]), **job)
+
+
+@router.post("/upload-receipts/")
+async def upload_receipts(
+    db: DB,
+    current_user: CurrentUser,
+    ocr_service: OCR,
+    files: List[UploadFile] = File(...),
+    stream_format: Literal["ndjson", "sse"] = "ndjson"
+):
+    """
+    Uploads many receipts at once. Files are stored and run through OCR with
+    bounded concurrency and one result per file is streamed back as soon as
+    it is ready; parsed receipts are written to the receipts collection in
+    batches.
+    """
+    semaphore = asyncio.Semaphore(settings.receipt_batch_concurrency)
+
+    # FastAPI closes form uploads as soon as the endpoint returns, before the
+    # StreamingResponse is drained, so take ownership of the spooled files.
+    uploads = []
+    for file in files:
+        uploads.append((file.filename, file.content_type, file.file))
+        file.file = io.BytesIO()
+    store = get_receipt_store(db)
+
+    async def process(filename: str, content_type: Optional[str], spooled):
+        # Failures are reported against the file they came from. Returns the
+        # stored file id and either OCR output or, for a re-upload, the
+        # receipt already parsed from it.
+        async with semaphore:
+            try:
+                stored = await store_receipt(db, store, current_user.id,
+                                             spooled, filename, content_type)
+                spooled.close()
+                receipt_image = str(stored["_id"])
+                if stored["duplicate"]:
+                    receipt = await db.receipts.find_one(
+                        {"user_id": current_user.id, "receipt_image": receipt_image})
+                    if receipt:
+                        return filename, receipt_image, receipt
+                return filename, receipt_image, await ocr_service.extract_receipt_data(
+                    stored["ocr_bytes"], db, preprocessed=True)
+            except Exception as err:
+                logging.error(f"Error while processing receipt {filename!r} in "
+                              f"upload_receipts: {err}")
+                return filename, None, {"error": "Failed to process receipt"}
+
+    def encode(event: dict) -> str:
+        payload = json.dumps(jsonable_encoder(event))
+        if stream_format == "sse":
+            return f"event: {event['status']}\ndata: {payload}\n\n"
+        return payload + "\n"
+
+    async def results():
+        # Parsed receipts wait here with their "ok" events until they are saved
+        pending: List[Tuple[dict, dict]] = []
+        counts = {"processed": 0, "failed": 0, "inserted": 0}
+
+        async def flush() -> List[dict]:
+            """Saves the pending receipts; returns the events that may now be sent."""
+            docs = [doc for doc, _ in pending]
+            events = [event for _, event in pending]
+            pending.clear()
+            if not docs:
+                return []
+            failed = set()
+            try:
+                result = await db.receipts.insert_many(docs, ordered=False)
+                counts["inserted"] += len(result.inserted_ids)
+            except BulkWriteError as err:
+                failed = {error["index"] for error in err.details["writeErrors"]}
+                counts["inserted"] += err.details["nInserted"]
+            except Exception as err:
+                logging.error(f"Error while saving receipts in upload_receipts: {err}")
+                failed = set(range(len(docs)))
+            for index in sorted(failed):
+                counts["processed"] -= 1
+                counts["failed"] += 1
+                events[index] = {"status": "error", "filename": events[index]["filename"],
+                                 "error": "Failed to save receipt"}
+            return events
+
+        remaining = {asyncio.ensure_future(process(*upload)) for upload in uploads}
+        tasks = set(remaining)
+        try:
+            while remaining:
+                done, remaining = await asyncio.wait(
+                    remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    filename, receipt_image, receipt_data = task.result()
+                    if "error" in receipt_data:
+                        counts["failed"] += 1
+                        yield encode({"status": "error", "filename": filename,
+                                      "error": receipt_data["error"]})
+                        continue
+
+                    counts["processed"] += 1
+                    if "_id" in receipt_data:
+                        # Already saved when these bytes were first uploaded
+                        receipt_id = receipt_data.pop("_id")
+                        for field in ("user_id", "filename"):
+                            receipt_data.pop(field, None)
+                        yield encode({"status": "ok", "filename": filename,
+                                      "id": str(receipt_id), "receipt": receipt_data})
+                        continue
+
+                    receipt_id = ObjectId()
+                    analyzed_data = analyze_receipt(receipt_data, receipt_image)
+                    pending.append((
+                        {"_id": receipt_id, "user_id": current_user.id,
+                         "filename": filename, **analyzed_data},
+                        {"status": "ok", "filename": filename,
+                         "id": str(receipt_id), "receipt": analyzed_data},
+                    ))
+                    if len(pending) >= settings.receipt_batch_insert_size:
+                        for event in await flush():
+                            yield encode(event)
+
+                # Whatever finished together is saved as one batch before its
+                # ids are announced, so a dropped stream never loses a receipt.
+                for event in await flush():
+                    yield encode(event)
+            yield encode({"status": "done", **counts})
+        finally:
+            for task in tasks:
+                task.cancel()
+            for _, _, spooled in uploads:
+                spooled.close()
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(results(), media_type=media_type)
+
+
 @router.post("/confirm-receipt/", response_model=Expense)
 async def confirm_receipt(
     request: ConfirmExpenseRequest,
@@ -87,42 +399,160 @@ async def confirm_receipt(
         expense = {
             "user_id": current_user.id,
             "amount": request.amount,
-            "merchant": request.merchant,
+            "date": request.date,
+            "vendor": request.vendor,
             "category": request.category,
-            "receipt_image": request.receipt_image,
-            "upload_date": request.upload_date,
-            "is_tax_deductible": request.is_tax_deductible,
-            "deduction_reason": request.deduction_reason
+            "description": request.description,
+            "receipt_image": request.receipt_image
         }
+        # Lets a later bank import recognise this expense; see ExpenseImporter
+        expense["dedupe_key"] = dedupe_key(expense)
 
-        # Insert into MongoDB receipts collection
-        result = await db.receipts.insert_one(expense)
+        # Insert into MongoDB expenses collection and keep rollups current
+        result = await db.expenses.insert_one(expense)
+        await rollup_service.apply(db, current_user.id, expense)
 
         # Return the inserted document
-        expense["_id"] = str(result.inserted_id)
-        return Expense(**expense)
+        return Expense(**expense, id=str(result.inserted_id))
     except Exception as err:
-        print(f"Error confirming receipt in confirm_receipt: {err}")
+        logging.error(f"Error confirming receipt in confirm_receipt: {err}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to confirm receipt"
         )
 
 
-@router.get("/list/", response_model=List[Expense])
+EXPENSE_LIST_FIELDS = {"vendor", "category", "description", "receipt_image"}
+MAX_PAGE_SIZE = 100
+
+
+def expense_projection(fields: Optional[str]) -> dict:
+    """Projection for list views: never the items array, optionally only ``fields``."""
+    if not fields:
+        return {"items": 0}
+    requested = {field.strip() for field in fields.split(",")} & EXPENSE_LIST_FIELDS
+    projection = {"user_id": 1, "amount": 1, "date": 1}
+    projection.update({field: 1 for field in requested})
+    return projection
+
+
+@router.get("/list/", response_model=Union[List[Expense], ExpensePage])
 async def list_expenses(
     db: DB,
     current_user: CurrentUser,
-    skip: int = 0,
-    limit: int = 10
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    pagination: Literal["offset", "cursor"] = "offset",
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
 ):
     """
     Lists all expenses for the current user with optional pagination.
+
+    ``pagination=cursor`` (implied by passing ``cursor``) pages newest-first on
+    (date, _id) and returns ``{"items": [...], "next_cursor": ...}``; pass
+    ``next_cursor`` back to get the following page. ``fields`` limits the
+    optional fields returned, e.g. ``fields=vendor,category``.
+    """
+    projection = expense_projection(fields)
+    if pagination == "offset" and cursor is None:
+        query = db.expenses.find(
+            {"user_id": current_user.id}, projection).skip(skip).limit(limit)
+        expenses = await query.to_list(length=limit)
+        return [Expense(**expense, id=str(expense["_id"])) for expense in expenses]
+
+    query_filter = {"user_id": current_user.id}
+    if cursor:
+        try:
+            last_date, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        query_filter["$or"] = [
+            {"date": {"$lt": last_date}},
+            {"date": last_date, "_id": {"$lt": last_id}},
+        ]
+
+    query = db.expenses.find(query_filter, projection).sort(
+        [("date", -1), ("_id", -1)]).limit(limit + 1)
+    expenses = await query.to_list(length=limit + 1)
+    next_cursor = None
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        next_cursor = encode_cursor(expenses[-1]["date"], expenses[-1]["_id"])
+    return ExpensePage(
+        items=[Expense(**expense, id=str(expense["_id"])) for expense in expenses],
+        next_cursor=next_cursor
+    )
+
+
+@router.post("/import/")
+async def import_expenses(
+    db: DB,
+    current_user: CurrentUser,
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "ofx"]] = None
+):
+    """
+    Imports expense history from a bank or accounting export (CSV or
+    OFX/QFX). Rows that fail validation are reported individually and do not
+    abort the import; rows matching an existing (date, amount, vendor) are
+    skipped as duplicates.
+    """
+    if format is None:
+        extension = (file.filename or "").rsplit(".", 1)[-1].lower()
+        format = "ofx" if extension in ("ofx", "qfx") else "csv"
+    try:
+        return await expense_importer.run(db, current_user.id, file.file, format,
+                                          rollup_service)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+
+
+@router.get("/export/")
+async def export_expenses(
+    db: AnalyticsDB,
+    current_user: CurrentUser,
+    format: Literal["csv", "parquet"] = "csv",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category: Optional[str] = None,
+    batch_size: int = 1000
+):
     """
-    cursor = db.expenses.find(
-        {"user_id": current_user.id}).skip(skip).limit(limit)
-    expenses = await cursor.to_list(length=limit)
-    return [Expense(**expense, id=str(expense["_id"])) for expense in expenses]
+    Streams all of the user's expenses as CSV or Parquet. Date range
+    (end_date inclusive) and comma-separated category filters are applied in
+    the MongoDB query; memory use is bounded by ``batch_size`` rows.
+    """
+    query = {"user_id": current_user.id}
+    if start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = start_date
+        if end_date:
+            query["date"]["$lt"] = end_date + timedelta(days=1)
+    if category:
+        query["category"] = {"$in": [c.strip() for c in category.split(",")]}
+
+    batch_size = max(1, min(batch_size, 10000))
+    cursor = db.expenses.find(query, EXPORT_PROJECTION).sort("date", 1)
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                detail="Parquet export requires pyarrow"
+            )
+        body, media_type = export_parquet(cursor, batch_size), "application/vnd.apache.parquet"
+    else:
+        body, media_type = export_csv(cursor, batch_size), "text/csv"
+
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="expenses.{format}"'
+    })
 
 
 @router.put("/update-collection/{expense_id}")
@@ -138,19 +568,31 @@ async def update_collection(
     try:
         # Ensure the expense belongs to the current user
         query = {"_id": ObjectId(expense_id), "user_id": current_user.id}
-        update = {"$set": updates}
+        current = await db.expenses.find_one(query)
+        if current is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Expense not found or unauthorized access"
+            )
+        update = {"$set": {**updates, "dedupe_key": dedupe_key({**current, **updates})}}
 
-        result = await db.expenses.update_one(query, update)
+        before = await db.expenses.find_one_and_update(
+            query, update, return_document=ReturnDocument.BEFORE)
 
-        if result.matched_count == 0:
+        if before is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Expense not found or unauthorized access"
             )
 
-        return {"status": "success", "updated_count": result.modified_count}
+        await rollup_service.apply_update(
+            db, current_user.id, before, {**before, **updates})
+        modified = any(before.get(key) != value for key, value in updates.items())
+        return {"status": "success", "updated_count": int(modified)}
+    except HTTPException:
+        raise
     except Exception as err:
-        print(f"Error updating collection: {err}")
+        logging.error(f"Error updating collection: {err}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update expense"
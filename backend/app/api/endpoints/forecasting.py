@@ -1,33 +1,48 @@
 # backend/app/api/endpoints/forecasting.py
 from typing import Annotated, List
 
-from app.api.deps import DB, get_current_user
+from app.api.deps import AnalyticsDB, Forecast, get_current_user
 from app.models.forecasting import CashFlowInsight, TaxPredictionResponse
 from app.models.user import User
-from app.services.forecast_service import ForecastService
+from app.core.settings import settings
+from app.services.expense_columns import load_expense_columns
+from app.services.rollup_service import RollupService
 from fastapi import APIRouter, Depends
 
 router = APIRouter()
-forecast_service = ForecastService()
+rollup_service = RollupService()
 
 @router.get("/tax-liability-prediction/", response_model=TaxPredictionResponse)
 async def predict_tax_liability(
     current_user: Annotated[User, Depends(get_current_user)],
-    db: DB
+    db: AnalyticsDB,
+    forecast_service: Forecast
 ):
-    cursor = db.expenses.find({"user_id": current_user.id})
-    historical_data = await cursor.to_list(length=None)
-    
-    predictions = await forecast_service.predict_tax_liability(historical_data)
+    if settings.forecast_source == "rollup":
+        version = await rollup_service.get_version(db, current_user.id)
+        stored = await db.forecasts.find_one({"_id": current_user.id})
+        predictions = await forecast_service.predict_tax_liability_for_user(
+            current_user.id, version,
+            lambda: rollup_service.get_rollups(db, current_user.id),
+            stored)
+    else:
+        columns = await load_expense_columns(db.expenses, {"user_id": current_user.id})
+        predictions = await forecast_service.predict_tax_liability_from_columns(columns)
     return TaxPredictionResponse(**predictions)
 
 @router.get("/cash-flow-insights/", response_model=CashFlowInsight)
 async def get_cash_flow_insights(
     current_user: Annotated[User, Depends(get_current_user)],
-    db: DB
+    db: AnalyticsDB,
+    forecast_service: Forecast
 ):
-    cursor = db.expenses.find({"user_id": current_user.id})
-    expenses = await cursor.to_list(length=None)
-    
-    insights = await forecast_service.get_cash_flow_insights(expenses)
+    if settings.forecast_source == "rollup":
+        rollups = await rollup_service.get_rollups(db, current_user.id)
+        insights = await forecast_service.get_cash_flow_insights_from_rollups(rollups)
+    elif settings.forecast_source == "aggregate":
+        insights = await forecast_service.get_cash_flow_insights_from_db(
+            db.expenses, current_user.id)
+    else:
+        columns = await load_expense_columns(db.expenses, {"user_id": current_user.id})
+        insights = await forecast_service.get_cash_flow_insights_from_columns(columns)
     return CashFlowInsight(**insights)
\ No newline at end of file
@@ -1,17 +1,27 @@
 # backend/app/api/endpoints/tax_alerts.py
-from typing import List
+import csv
+import io
+import json
+from typing import List, Optional
 
-from app.api.deps import get_current_user
-from app.services.tax_service import TaxService
-from fastapi import APIRouter, Depends
+from app.api.deps import DB, CurrentUser, Tax, get_current_user
+from app.core.settings import settings
+from app.services.rollup_service import RollupService
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 
 router = APIRouter()
-tax_service = TaxService()
+rollup_service = RollupService()
 
 
 @router.get("/alerts/", response_model=List[dict])
-async def get_tax_alerts(current_user: dict = Depends(get_current_user)):
-    alerts = await tax_service.get_tax_alerts()
+async def get_tax_alerts(db: DB, current_user: CurrentUser, tax_service: Tax,
+                         days: int = 30):
+    version = await rollup_service.get_version(db, current_user.id)
+    alerts = await tax_service.get_tax_alerts(
+        current_user.id, version,
+        lambda: rollup_service.get_rollups(db, current_user.id),
+        days)
     return alerts
 
 
@@ -19,7 +29,86 @@ async def get_tax_alerts(current_user: dict = Depends(get_current_user)):
 async def calculate_tax_liability(
     amount: float,
     state: str,
+    tax_service: Tax,
+    zip_code: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    liability = await tax_service.calculate_tax_liability(amount, state)
+    liability = await tax_service.calculate_tax_liability(amount, state, zip_code)
     return liability
+
+
+async def read_tax_rows(request: Request) -> List[dict]:
+    """Parse a JSON array (or ``{"rows": [...]}``) or CSV request body."""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "csv" in content_type:
+            return list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"))))
+        rows = json.loads(body)
+        if isinstance(rows, dict):
+            rows = rows.get("rows")
+        if not isinstance(rows, list):
+            raise ValueError("expected a list of rows")
+        return rows
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Could not parse rows: {e}",
+        )
+
+
+@router.post("/calculate-liability/bulk/")
+async def calculate_tax_liability_bulk(
+    request: Request,
+    tax_service: Tax,
+    stream: Optional[bool] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Calculates sales tax for a whole ledger of (amount, state[, zip, category])
+    rows sent as JSON or CSV. Large inputs (or ``stream=true``) are streamed
+    back as NDJSON, one line per row followed by a summary line.
+    """
+    rows = await read_tax_rows(request)
+    if stream is None:
+        stream = len(rows) > settings.tax_bulk_stream_threshold
+    if not stream:
+        results = await tax_service.calculate_tax_liabilities(rows)
+        summary = TaxSummary()
+        summary.add(results)
+        return {"results": results, "summary": summary.as_dict()}
+
+    async def lines():
+        # Each chunk is sent as soon as it is computed; the summary comes last
+        summary = TaxSummary()
+        async for chunk in tax_service.iter_tax_liabilities(rows):
+            summary.add(chunk)
+            yield "".join(json.dumps(result) + "\n" for result in chunk)
+        yield json.dumps({"summary": summary.as_dict()}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+class TaxSummary:
+    """Running totals over bulk results."""
+
+    def __init__(self):
+        self.rows = self.errors = 0
+        self.total_amount = self.total_tax = 0.0
+
+    def add(self, results: List[dict]) -> None:
+        for result in results:
+            self.rows += 1
+            if "error" in result:
+                self.errors += 1
+            else:
+                self.total_amount += result["amount"]
+                self.total_tax += result["tax_amount"]
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "errors": self.errors,
+            "total_amount": round(self.total_amount, 2),
+            "total_tax": round(self.total_tax, 2),
+        }
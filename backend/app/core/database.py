@@ -0,0 +1,55 @@
+# backend/app/core/database.py
+"""Motor client construction: pool sizing, timeouts, compression, monitoring.
+
+``create_client`` is the only place a client is built. A ``mongomock://``
+URI gives an in-memory mongomock stand-in with the same options applied, so
+the app (and the pool/read-preference wiring) runs without a mongod.
+"""
+from typing import Optional
+
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+
+from app.core.metrics import MongoCommandListener, MongoPoolListener
+from app.core.settings import settings
+
+DATABASE_NAME = "taxBusiness"
+
+
+def client_options() -> dict:
+    """Keyword arguments for ``AsyncIOMotorClient`` from ``settings``; 0 = driver default."""
+    options = {
+        "maxPoolSize": settings.mongodb_max_pool_size,
+        "minPoolSize": settings.mongodb_min_pool_size,
+        "connectTimeoutMS": settings.mongodb_connect_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongodb_server_selection_timeout_ms,
+        "maxIdleTimeMS": settings.mongodb_max_idle_time_ms or None,
+        "waitQueueTimeoutMS": settings.mongodb_wait_queue_timeout_ms or None,
+        "socketTimeoutMS": settings.mongodb_socket_timeout_ms or None,
+        "appname": settings.mongodb_app_name,
+    }
+    if settings.mongodb_compressors:
+        options["compressors"] = settings.mongodb_compressors
+    if settings.metrics_enabled:
+        options["event_listeners"] = [MongoCommandListener(), MongoPoolListener()]
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def create_client(uri: Optional[str] = None, **overrides):
+    uri = uri or settings.mongodb_uri
+    options = {**client_options(), **overrides}
+    if uri.startswith("mongomock://"):
+        from mongomock_motor import AsyncMongoMockClient
+
+        return AsyncMongoMockClient(**options)
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    return AsyncIOMotorClient(uri, **options)
+
+
+def analytics_read_preference():
+    """Read preference for heavy reads that tolerate replication lag."""
+    return make_read_preference(
+        read_pref_mode_from_name(settings.mongodb_analytics_read_preference), None,
+        settings.mongodb_analytics_max_staleness)
+
@@ -0,0 +1,146 @@
+# backend/app/core/indexes.py
+"""Index declarations for every collection the API queries.
+
+``ensure_indexes`` runs at startup (see ``define_db_management``). The
+diagnostics half runs ``explain()`` on the queries the endpoints issue and
+reports documents examined versus returned; run it against a deployment with
+
+    python -m app.core.indexes --user-id <id> --username <name>
+"""
+import argparse
+import asyncio
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "expenses": [
+        # Also serves keyset pagination, which sorts on (date, _id).
+        IndexModel([("user_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+                   name="user_date"),
+        IndexModel([("user_id", ASCENDING), ("category", ASCENDING)],
+                   name="user_category"),
+        # Not unique: two identical purchases can both be entered by hand.
+        # The importer looks keys up here to skip rows already stored; see
+        # import_service.dedupe_key.
+        IndexModel([("user_id", ASCENDING), ("dedupe_key", ASCENDING)],
+                   name="user_dedupe_key"),
+    ],
+    "expense_rollups": [
+        IndexModel([("user_id", ASCENDING), ("month", ASCENDING), ("category", ASCENDING)],
+                   name="user_month_category", unique=True),
+    ],
+    "receipts": [
+        IndexModel([("user_id", ASCENDING), ("upload_date", DESCENDING)],
+                   name="user_upload_date"),
+        IndexModel([("user_id", ASCENDING), ("receipt_image", ASCENDING)],
+                   name="user_receipt_image"),
+    ],
+    "receipt_files": [
+        IndexModel([("user_id", ASCENDING), ("sha256", ASCENDING)], name="user_sha256"),
+    ],
+    "receipt_jobs": [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        IndexModel([("user_id", ASCENDING)], name="user"),
+    ],
+    "ocr_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl",
+                   expireAfterSeconds=0),
+    ],
+}
+
+
+async def ensure_indexes(db) -> None:
+    """Create every declared index; existing identical indexes are a no-op."""
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except Exception as err:
+            logging.error(f"Could not create indexes on {collection}: {err}")
+
+
+def diagnostic_queries(user_id: str, username: str) -> Dict[str, dict]:
+    """The find() shapes issued by each endpoint, keyed by endpoint name."""
+    return {
+        "get_current_user": {"collection": "users",
+                             "filter": {"username": username}},
+        "list_expenses": {"collection": "expenses",
+                          "filter": {"user_id": user_id}},
+        "list_expenses_cursor": {"collection": "expenses",
+                                 "filter": {"user_id": user_id},
+                                 "sort": [("date", -1), ("_id", -1)]},
+        "predict_tax_liability": {"collection": "expenses",
+                                  "filter": {"user_id": user_id}},
+        "get_cash_flow_insights": {"collection": "expenses",
+                                   "filter": {"user_id": user_id}},
+        "update_collection": {"collection": "expenses",
+                              "filter": {"user_id": user_id}},
+        "get_receipt_job": {"collection": "receipt_jobs",
+                            "filter": {"user_id": user_id}},
+    }
+
+
+def _plan_stages(plan: dict) -> List[str]:
+    stages = []
+    while plan:
+        stages.append(plan.get("stage"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+async def explain_queries(db, user_id: str, username: str) -> List[dict]:
+    """Explain each endpoint query and report scanned versus returned documents."""
+    report = []
+    for endpoint, query in diagnostic_queries(user_id, username).items():
+        cursor = db[query["collection"]].find(query["filter"])
+        if "sort" in query:
+            cursor = cursor.sort(query["sort"])
+        explain = await cursor.explain()
+        stats = explain.get("executionStats", {})
+        winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning.get("queryPlan", winning))
+        report.append({
+            "endpoint": endpoint,
+            "collection": query["collection"],
+            "plan": " <- ".join(stage for stage in stages if stage),
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "returned": stats.get("nReturned"),
+            "collection_scan": "COLLSCAN" in stages,
+        })
+    return report
+
+
+def format_report(report: List[dict]) -> str:
+    lines = ["%-24s %-13s %9s %9s %9s  %s" % (
+        "endpoint", "collection", "examined", "keys", "returned", "plan")]
+    for row in report:
+        lines.append("%-24s %-13s %9s %9s %9s  %s%s" % (
+            row["endpoint"], row["collection"], row["docs_examined"],
+            row["keys_examined"], row["returned"], row["plan"],
+            "  (COLLECTION SCAN)" if row["collection_scan"] else ""))
+    return "\n".join(lines)
+
+
+async def _main(args) -> None:
+    from app.core.database import DATABASE_NAME, create_client
+
+    client = create_client()
+    db = client[DATABASE_NAME]
+    if args.create:
+        await ensure_indexes(db)
+    print(format_report(await explain_queries(db, args.user_id, args.username)))
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Explain endpoint queries")
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--create", action="store_true",
+                        help="create the declared indexes first")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,321 @@
+# backend/app/core/metrics.py
+"""Request latency histograms and per-stage spans, exposed at /metrics.
+
+``define_metrics`` wraps the app in a plain ASGI middleware that times every
+request against its route template (``/api/expenses/{expense_id}``, not the
+raw path). Code inside a request times its expensive stages with ``span``;
+Mongo commands are timed by ``MongoCommandListener``. Stage timings go to the
+``app_stage_duration_seconds`` histogram and, for requests slower than
+``METRICS_SLOW_REQUEST_SECONDS``, into a JSON ``slow_request`` log line.
+``MongoPoolListener`` adds connection pool checkout waits and pool sizes.
+
+Recording is a bisect and a few additions under a lock, so it stays on in
+production (see ``benchmarks/bench_metrics_overhead.py``).
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+from app.core.settings import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every metric, in the order /metrics renders them
+_registry = []
+
+# Stage timings of the request being handled, {stage: [count, seconds]}
+_request_spans: ContextVar[Optional[Dict[str, list]]] = ContextVar(
+    "request_spans", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense, one per label set."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], list] = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, label_values: Tuple[str, ...], value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = {key: list(series) for key, series in self.series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"'
+                              for name, value in zip(self.labels, label_values))
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            selector = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{selector} {series[-1]}")
+            lines.append(f"{self.name}_count{selector} {cumulative}")
+        return "\n".join(lines)
+
+
+class Counter:
+    """Labelled totals that only go up."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, label_values: Tuple[str, ...], amount: float = 1) -> None:
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def value(self, label_values: Tuple[str, ...]) -> float:
+        return self.series.get(label_values, 0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            snapshot = dict(self.series)
+        for label_values, value in sorted(snapshot.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"'
+                              for name, value in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels
+                         else f"{self.name} {value}")
+        return "\n".join(lines)
+
+
+class Gauge(Counter):
+    """Labelled values that go up and down (``inc`` by a negative amount)."""
+
+    kind = "gauge"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "app_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status"))
+stage_duration = Histogram(
+    "app_stage_duration_seconds", "Time spent in a stage of request handling.",
+    ("stage",))
+
+
+pool_wait = Histogram(
+    "app_mongo_pool_wait_seconds", "Time spent waiting to check out a Mongo connection.",
+    ("address",), buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+pool_checkouts = Counter(
+    "app_mongo_pool_checkouts_total", "Mongo connection checkouts by outcome.",
+    ("address", "outcome"))
+pool_connections = Gauge(
+    "app_mongo_pool_connections", "Open Mongo connections.", ("address",))
+pool_in_use = Gauge(
+    "app_mongo_pool_checked_out", "Mongo connections currently checked out.", ("address",))
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Add a stage timing to the histogram and to the current request, if any."""
+    stage_duration.observe((stage,), seconds)
+    spans = _request_spans.get()
+    if spans is not None:
+        totals = spans.get(stage)
+        if totals is None:
+            spans[stage] = [1, seconds]
+        else:
+            totals[0] += 1
+            totals[1] += seconds
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block (which may ``await``) as ``stage``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Records each Mongo command as a ``mongo.<command>`` stage.
+
+    Motor runs pymongo on its executor with the caller's context copied, so
+    the timings land on the request that issued the command.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record_stage(f"mongo.{event.command_name}", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record_stage(f"mongo.{event.command_name}", event.duration_micros / 1e6)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Pool checkout waits, checkout failures and pool size per server.
+
+    A checkout starts and finishes on the same thread, so the wait is timed
+    with a thread-local start time.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pool_connections.inc((_address(event),))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pool_connections.inc((_address(event),), -1)
+
+    def connection_check_out_started(self, event):
+        self.local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        address = _address(event)
+        pool_checkouts.inc((address, str(event.reason)))
+        self._waited(address)
+
+    def connection_checked_out(self, event):
+        address = _address(event)
+        pool_checkouts.inc((address, "ok"))
+        pool_in_use.inc((address,))
+        self._waited(address)
+
+    def connection_checked_in(self, event):
+        pool_in_use.inc((_address(event),), -1)
+
+    def _waited(self, address: str) -> None:
+        started = getattr(self.local, "started", None)
+        if started is not None:
+            self.local.started = None
+            seconds = time.perf_counter() - started
+            pool_wait.observe((address,), seconds)
+            record_stage("mongo_pool_wait", seconds)
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed to the last byte."""
+
+    def __init__(self, app):
+        self.app = app
+        self.routes: Optional[Dict] = None
+
+    def route_template(self, scope) -> str:
+        # Matched endpoints map back to the app-level path, prefix included
+        if self.routes is None:
+            self.routes = {r.endpoint: r.path for r in scope["app"].routes
+                           if hasattr(r, "endpoint") and hasattr(r, "path")}
+        path = self.routes.get(scope.get("endpoint"))
+        if path is not None:
+            return path
+        # Newer FastAPI versions route into included routers lazily and only
+        # expose the router-relative route; recover the prefix from the path.
+        route = scope.get("route")
+        if not hasattr(route, "path"):
+            return "unmatched"
+        request_path = scope["path"]
+        if not route.path_regex.match(request_path):
+            for index in range(1, len(request_path)):
+                if request_path[index] == "/" and route.path_regex.match(request_path[index:]):
+                    return request_path[:index] + route.path
+        return route.path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        spans: Dict[str, list] = {}
+        token = _request_spans.set(spans)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _request_spans.reset(token)
+            route = self.route_template(scope)
+            request_duration.observe((scope["method"], route, str(status_code)), duration)
+            if duration >= settings.metrics_slow_request_seconds:
+                logging.warning(json.dumps({
+                    "event": "slow_request",
+                    "method": scope["method"],
+                    "route": route,
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round(duration * 1000, 1),
+                    "spans": {stage: {"count": count, "ms": round(seconds * 1000, 1)}
+                              for stage, (count, seconds) in spans.items()},
+                }))
+
+
+def define_metrics(app):
+    """Time every request and serve the histograms at /metrics."""
+    from fastapi.responses import PlainTextResponse
+
+    if not settings.metrics_enabled:
+        return
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(render_metrics(),
+                                 media_type="text/plain; version=0.0.4")
@@ -1,8 +1,15 @@
 # backend/app/core/security.py
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
 from app.core.settings import settings
+from app.utils.helpers import run_blocking
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
@@ -22,4 +29,112 @@ def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+# bcrypt runs in worker processes, so the context is built once per process.
+_worker_contexts = {}
+
+
+def _context_for(rounds: int) -> CryptContext:
+    context = _worker_contexts.get(rounds)
+    if context is None:
+        context = CryptContext(schemes=["bcrypt"], deprecated="auto",
+                               bcrypt__rounds=rounds)
+        _worker_contexts[rounds] = context
+    return context
+
+
+def _hash_password(password: str, rounds: int) -> str:
+    return _context_for(rounds).hash(password)
+
+
+def _verify_password(password: str, hashed_password: str, rounds: int) -> bool:
+    return _context_for(rounds).verify(password, hashed_password)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password operations are already waiting."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop behind a bounded admission queue.
+
+    At most ``max_concurrency`` operations run at once and at most
+    ``queue_limit`` wait behind them; beyond that callers get
+    ``PasswordHasherBusy`` with a retry hint derived from the observed
+    per-operation time, so a login storm sheds load instead of piling up.
+    """
+
+    def __init__(self, executor_kind: str, workers: int, rounds: int,
+                 max_concurrency: int, queue_limit: int):
+        self.executor_kind = executor_kind
+        self.workers = workers
+        self.rounds = rounds
+        self.queue_limit = queue_limit
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.average_seconds = 0.1
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        # Created lazily so importing the app never starts worker processes.
+        # Workers come from a forkserver: forking the running server would
+        # copy its threads' held locks into the children.
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("forkserver"))
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(_verify_password, password, hashed_password,
+                                  self.rounds)
+
+    async def _submit(self, func, *args):
+        if self.waiting >= self.queue_limit:
+            backlog = self.waiting + self.max_concurrency
+            raise PasswordHasherBusy(math.ceil(
+                backlog * self.average_seconds / self.max_concurrency))
+
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            start = time.perf_counter()
+            result = await run_blocking(self.executor, func, *args)
+            elapsed = time.perf_counter() - start
+            self.average_seconds = 0.9 * self.average_seconds + 0.1 * elapsed
+            return result
+        finally:
+            self.semaphore.release()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+_hash_workers = settings.password_hash_workers or os.cpu_count() or 1
+password_hasher = PasswordHasher(
+    executor_kind=settings.password_hash_executor,
+    workers=_hash_workers,
+    rounds=settings.bcrypt_rounds,
+    max_concurrency=settings.password_hash_concurrency or _hash_workers,
+    queue_limit=settings.password_hash_queue_limit,
+)
@@ -1,4 +1,6 @@
 # backend/app/core/settings.py
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 import os
 from dotenv import load_dotenv
@@ -7,10 +9,126 @@ load_dotenv()
 
 class Settings(BaseSettings):
     mongodb_uri: str = os.getenv("MONGODB_URI")
+    # Motor client pool and timeouts (0 = driver default / no limit) and wire
+    # compression, e.g. "zstd,zlib" (zstd needs the zstandard package)
+    mongodb_max_pool_size: int = os.getenv("MONGODB_MAX_POOL_SIZE", 100)
+    mongodb_min_pool_size: int = os.getenv("MONGODB_MIN_POOL_SIZE", 0)
+    mongodb_max_idle_time_ms: int = os.getenv("MONGODB_MAX_IDLE_TIME_MS", 0)
+    mongodb_wait_queue_timeout_ms: int = os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 0)
+    mongodb_connect_timeout_ms: int = os.getenv("MONGODB_CONNECT_TIMEOUT_MS", 20000)
+    mongodb_server_selection_timeout_ms: int = os.getenv(
+        "MONGODB_SERVER_SELECTION_TIMEOUT_MS", 30000)
+    mongodb_socket_timeout_ms: int = os.getenv("MONGODB_SOCKET_TIMEOUT_MS", 0)
+    mongodb_compressors: str = os.getenv("MONGODB_COMPRESSORS", "")
+    mongodb_app_name: str = os.getenv("MONGODB_APP_NAME", "taxBusiness")
+    # Heavy reads (forecasting, exports) use this read preference; they may
+    # lag writes by up to max staleness (-1 = no limit, otherwise at least
+    # 90 seconds). Expense lists stay on the primary so new writes show up.
+    mongodb_analytics_read_preference: str = os.getenv(
+        "MONGODB_ANALYTICS_READ_PREFERENCE", "secondaryPreferred")
+    mongodb_analytics_max_staleness: int = os.getenv("MONGODB_ANALYTICS_MAX_STALENESS", -1)
+    # Log explain() plans for every endpoint query at startup
+    mongodb_index_diagnostics: bool = os.getenv("MONGODB_INDEX_DIAGNOSTICS", False)
     jwt_secret: str = os.getenv("JWT_SECRET")
-    google_cloud_credentials: str = os.getenv("GOOGLE_CLOUD_CREDENTIALS")
-    taxjar_api_key: str = os.getenv("TAXJAR_API_KEY")
-    gemini_api: str = os.getenv("GEMINI_API")
+    # Third-party credentials are optional: the app boots without them and
+    # only the endpoints that need a missing one fail (503)
+    google_cloud_credentials: Optional[str] = os.getenv("GOOGLE_CLOUD_CREDENTIALS")
+    taxjar_api_key: Optional[str] = os.getenv("TAXJAR_API_KEY")
+    gemini_api: Optional[str] = os.getenv("GEMINI_API")
+
+    # Authenticated-principal caches used by get_current_user
+    auth_cache_max_entries: int = os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000)
+    auth_token_cache_ttl: float = os.getenv("AUTH_TOKEN_CACHE_TTL", 300)
+    auth_user_cache_ttl: float = os.getenv("AUTH_USER_CACHE_TTL", 60)
+
+    # bcrypt runs on a dedicated executor ("process" or "thread"); 0 = CPU count
+    password_hash_executor: str = os.getenv("PASSWORD_HASH_EXECUTOR", "process")
+    password_hash_workers: int = os.getenv("PASSWORD_HASH_WORKERS", 0)
+    password_hash_concurrency: int = os.getenv("PASSWORD_HASH_CONCURRENCY", 0)
+    password_hash_queue_limit: int = os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 64)
+    bcrypt_rounds: int = os.getenv("BCRYPT_ROUNDS", 12)
+
+    # OCR pipeline: blocking Vision/Gemini calls run on a bounded thread pool
+    # Backends (see app.services.ocr_backends): "google", "tesseract" or
+    # "stub" for OCR; "gemini", "rules" or "stub" for receipt extraction
+    ocr_backend: str = os.getenv("OCR_BACKEND", "google")
+    ocr_llm_backend: str = os.getenv("OCR_LLM_BACKEND", "gemini")
+    # Fixed latency (seconds) the stub backends block for
+    ocr_stub_latency: float = os.getenv("OCR_STUB_LATENCY", 0.3)
+    ocr_llm_stub_latency: float = os.getenv("OCR_LLM_STUB_LATENCY", 0.5)
+    tesseract_lang: str = os.getenv("TESSERACT_LANG", "eng")
+    tesseract_config: str = os.getenv("TESSERACT_CONFIG", "--psm 4")
+    ocr_max_workers: int = os.getenv("OCR_MAX_WORKERS", 8)
+    ocr_max_concurrency: int = os.getenv("OCR_MAX_CONCURRENCY", 4)
+    ocr_vision_timeout: float = os.getenv("OCR_VISION_TIMEOUT", 15)
+    ocr_gemini_timeout: float = os.getenv("OCR_GEMINI_TIMEOUT", 30)
+    # Rule-based parser tried on the Vision text first; Gemini only runs when
+    # its confidence is below this or a required field is missing
+    ocr_rules_parser: bool = os.getenv("OCR_RULES_PARSER", True)
+    ocr_rules_min_confidence: float = os.getenv("OCR_RULES_MIN_CONFIDENCE", 0.8)
+    # Preprocess photos before OCR (orientation, grayscale, crop, DPI resize,
+    # recompress) on a "process" or "thread" pool; 0 workers = CPU count
+    ocr_preprocess: bool = os.getenv("OCR_PREPROCESS", True)
+    ocr_preprocess_executor: str = os.getenv("OCR_PREPROCESS_EXECUTOR", "process")
+    ocr_preprocess_workers: int = os.getenv("OCR_PREPROCESS_WORKERS", 0)
+    ocr_target_dpi: int = os.getenv("OCR_TARGET_DPI", 300)
+    ocr_receipt_width: float = os.getenv("OCR_RECEIPT_WIDTH", 3.2)
+    ocr_jpeg_quality: int = os.getenv("OCR_JPEG_QUALITY", 85)
+
+    # Parsed receipts keyed by image hash: in-process LRU + Mongo collection
+    ocr_cache_max_entries: int = os.getenv("OCR_CACHE_MAX_ENTRIES", 1024)
+    ocr_cache_ttl: int = os.getenv("OCR_CACHE_TTL", 7 * 24 * 3600)
+
+    # Batch receipt uploads
+    receipt_batch_concurrency: int = os.getenv("RECEIPT_BATCH_CONCURRENCY", 4)
+    receipt_batch_insert_size: int = os.getenv("RECEIPT_BATCH_INSERT_SIZE", 50)
+
+    # Receipt image storage: "gridfs" or "local" (content-addressed files)
+    receipt_storage: str = os.getenv("RECEIPT_STORAGE", "gridfs")
+    receipt_storage_path: str = os.getenv("RECEIPT_STORAGE_PATH", "receipt_images")
+    receipt_chunk_size: int = os.getenv("RECEIPT_CHUNK_SIZE", 256 * 1024)
+    receipt_thumbnail_size: int = os.getenv("RECEIPT_THUMBNAIL_SIZE", 320)
+    receipt_ocr_max_side: int = os.getenv("RECEIPT_OCR_MAX_SIDE", 2000)
+    # Uploads whose perceptual hash differs from one of the user's stored
+    # receipts in at most this fraction of bits are duplicates; 0 = exact only.
+    # Keep it low: a false match reuses another receipt's parsed data.
+    receipt_near_duplicate_distance: float = os.getenv("RECEIPT_NEAR_DUPLICATE_DISTANCE", 0.02)
+
+    # Bulk CSV/OFX expense import
+    import_batch_size: int = os.getenv("IMPORT_BATCH_SIZE", 1000)
+    import_max_errors: int = os.getenv("IMPORT_MAX_ERRORS", 1000)
+
+    # Background receipt jobs (MongoDB-backed queue)
+    receipt_job_workers: int = os.getenv("RECEIPT_JOB_WORKERS", 2)
+    receipt_job_max_attempts: int = os.getenv("RECEIPT_JOB_MAX_ATTEMPTS", 5)
+    receipt_job_backoff: float = os.getenv("RECEIPT_JOB_BACKOFF", 5)
+    receipt_job_lease: float = os.getenv("RECEIPT_JOB_LEASE", 300)
+    receipt_job_poll_interval: float = os.getenv("RECEIPT_JOB_POLL_INTERVAL", 1)
+
+    # Where forecasting reads from: "rollup" (expense_rollups), "aggregate"
+    # (MongoDB pipeline over expenses) or "pandas" (amount/date/category of raw
+    # expenses decoded into NumPy columns in memory)
+    forecast_source: str = os.getenv("FORECAST_SOURCE", "rollup")
+    # Fitted forecast models cached per user, keyed by data version
+    forecast_cache_size: int = os.getenv("FORECAST_CACHE_SIZE", 10000)
+    forecast_cache_ttl: float = os.getenv("FORECAST_CACHE_TTL", 24 * 3600)
+
+    # Sales-tax rates: local CSV table first, TaxJar only for unknown places
+    tax_rates_path: str = os.getenv("TAX_RATES_PATH", os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "data", "tax_rates.csv"))
+    tax_rates_refresh_interval: float = os.getenv("TAX_RATES_REFRESH_INTERVAL", 3600)
+    taxjar_timeout: float = os.getenv("TAXJAR_TIMEOUT", 10)
+    taxjar_cache_ttl: float = os.getenv("TAXJAR_CACHE_TTL", 24 * 3600)
+    # Deadline calendar and threshold rules behind /api/tax-alerts/alerts/
+    tax_alert_rules_path: str = os.getenv("TAX_ALERT_RULES_PATH", os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "data", "tax_alert_rules.json"))
+    # Bulk tax calculations with more rows than this are streamed as NDJSON
+    tax_bulk_stream_threshold: int = os.getenv("TAX_BULK_STREAM_THRESHOLD", 1000)
+
+    # Request/stage latency histograms at /metrics; requests slower than
+    # this many seconds are logged with their stage breakdown
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", True)
+    metrics_slow_request_seconds: float = os.getenv("METRICS_SLOW_REQUEST_SECONDS", 1.0)
 
     class Config:
         env_file = ".env"
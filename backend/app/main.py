@@ -2,10 +2,16 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import auth, expenses, tax_alerts, forecasting
-from app.api.deps import define_db_management
+from app.api.deps import (define_db_management, define_receipt_workers,
+                          define_worker_pools)
+from app.core.metrics import define_metrics
+from app.core.security import password_hasher
+from app.services.image_preprocess import image_preprocessor
 
 app = FastAPI(title="Tax Management System")
 define_db_management(app)
+define_receipt_workers(app, expenses.receipt_queue)
+define_worker_pools(app, password_hasher, image_preprocessor)
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -14,6 +20,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+define_metrics(app)
 
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
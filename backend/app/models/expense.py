@@ -1,6 +1,6 @@
 # backend/app/models/expense.py
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, List, Optional
 
 from pydantic import BaseModel
 
@@ -26,6 +26,11 @@ class Expense(ExpenseBase):
         from_attributes = True
 
 
+class ExpensePage(BaseModel):
+    items: List[Expense]
+    next_cursor: Optional[str] = None
+
+
 class ReceiptResponse(BaseModel):
     id: str
     amount: float
@@ -36,3 +41,14 @@ class ReceiptResponse(BaseModel):
 
 class ConfirmExpenseRequest(Expense):
     confirm: bool
+
+
+class ReceiptJob(BaseModel):
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[dict[str, Any]] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
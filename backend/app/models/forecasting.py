@@ -11,6 +11,7 @@ class PredictionItem(BaseModel):
 
 class TaxPredictionResponse(BaseModel):
     predictions: List[PredictionItem]
+    model: Optional[str] = None
 
 class CashFlowInsight(BaseModel):
     total_expenses: float
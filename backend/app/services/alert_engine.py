@@ -0,0 +1,114 @@
+# backend/app/services/alert_engine.py
+"""Tax alerts compiled from declarative rules.
+
+Rules live in a JSON file (``app/data/tax_alert_rules.json`` by default):
+
+* ``deadlines`` recur every year on ``month``/``day``. ``tax_year_offset``
+  says which tax year the deadline belongs to (default -1, the prior year)
+  and weekend dates roll forward to Monday.
+* ``thresholds`` compare a metric computed from the user's expense rollups
+  against ``above``.
+
+Deadlines are expanded into a date-sorted calendar once per year, so
+"upcoming within N days" is a bisect. Threshold results are cached per user
+until the user's data version changes.
+"""
+import json
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.utils.cache import TTLCache
+
+
+class AlertEngine:
+    def __init__(self, rules_path: str, cache_size: int = 10000):
+        with open(rules_path) as rules_file:
+            rules = json.load(rules_file)
+        self.deadlines: List[Dict] = rules.get("deadlines", [])
+        self.thresholds: List[Dict] = rules.get("thresholds", [])
+        self.user_cache = TTLCache(maxsize=cache_size)
+        self._calendar_year: Optional[int] = None
+        self._dates: List[date] = []
+        self._alerts: List[Dict] = []
+
+    def compile_calendar(self, year: int) -> None:
+        """Expand deadlines for the previous, current and next year."""
+        entries = []
+        for calendar_year in (year - 1, year, year + 1):
+            for rule in self.deadlines:
+                due = date(calendar_year, rule["month"], rule["day"])
+                while due.weekday() >= 5:
+                    due += timedelta(days=1)
+                tax_year = calendar_year + rule.get("tax_year_offset", -1)
+                entries.append((due, {
+                    "id": rule["id"],
+                    "type": "deadline",
+                    "jurisdiction": rule.get("jurisdiction"),
+                    "message": rule["message"].format(
+                        tax_year=tax_year, due_date=due.strftime("%B %d, %Y")),
+                    "due_date": due.isoformat(),
+                }))
+        entries.sort(key=lambda entry: entry[0])
+        self._dates = [due for due, _ in entries]
+        self._alerts = [alert for _, alert in entries]
+        self._calendar_year = year
+
+    def upcoming(self, today: date, days: int) -> List[Dict]:
+        """Deadlines falling within ``days`` days from ``today`` (inclusive)."""
+        if self._calendar_year != today.year:
+            self.compile_calendar(today.year)
+        start = bisect_left(self._dates, today)
+        end = bisect_right(self._dates, today + timedelta(days=days))
+        return self._alerts[start:end]
+
+    @staticmethod
+    def metrics(rollups: List[Dict], today: date) -> Dict[str, float]:
+        quarter_start = (today.month - 1) // 3 * 3 + 1
+        quarter_months = {f"{today.year:04d}-{m:02d}"
+                          for m in range(quarter_start, quarter_start + 3)}
+        year_prefix = f"{today.year:04d}-"
+        quarter = year = uncategorized = 0.0
+        for row in rollups:
+            if row["month"] in quarter_months:
+                quarter += row["amount"]
+            if row["month"].startswith(year_prefix):
+                year += row["amount"]
+                if row.get("category") in (None, "", "Uncategorized"):
+                    uncategorized += row["amount"]
+        return {
+            "quarter_expenses": quarter,
+            "year_expenses": year,
+            "uncategorized_share": uncategorized / year if year else 0.0,
+        }
+
+    def evaluate_thresholds(self, rollups: List[Dict], today: date) -> List[Dict]:
+        values = self.metrics(rollups, today)
+        alerts = []
+        for rule in self.thresholds:
+            value = values.get(rule["metric"])
+            if value is not None and value > rule["above"]:
+                alerts.append({
+                    "id": rule["id"],
+                    "type": "threshold",
+                    "message": rule["message"].format(value=value, threshold=rule["above"]),
+                    "due_date": None,
+                })
+        return alerts
+
+    async def user_alerts(
+        self,
+        user_id: str,
+        version: int,
+        load_rollups: Callable[[], Awaitable[List[Dict]]],
+        today: date,
+        days: int
+    ) -> List[Dict]:
+        """Upcoming deadlines plus the user's threshold alerts."""
+        # Metrics are per quarter, so a new quarter also invalidates the entry.
+        key = (user_id, today.year, (today.month - 1) // 3)
+        entry = self.user_cache.get(key)
+        if entry is None or entry[0] != version:
+            entry = (version, self.evaluate_thresholds(await load_rollups(), today))
+            self.user_cache.set(key, entry)
+        return self.upcoming(today, days) + entry[1]
@@ -0,0 +1,108 @@
+# backend/app/services/expense_columns.py
+"""Expenses as typed NumPy columns for in-memory forecasting.
+
+``load_expense_columns`` asks MongoDB for ``amount``, ``date`` and
+``category`` only and decodes each batch of documents straight into float64
+amounts, datetime64 dates and int32 category codes, instead of building a
+DataFrame from whole expense documents (ObjectIds, item lists, free text).
+Missing amounts become NaN, missing or unparseable dates NaT and missing
+categories code -1, so they drop out of sums and groupbys as they do in
+pandas.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from app.core.metrics import span
+
+EXPENSE_COLUMNS_PROJECTION = {"_id": 0, "amount": 1, "date": 1, "category": 1}
+DECODE_BATCH_SIZE = 10000
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+@dataclass
+class ExpenseColumns:
+    amounts: np.ndarray         # float64
+    dates: np.ndarray           # datetime64[us]
+    category_codes: np.ndarray  # int32 index into categories, -1 = none
+    categories: List[str]
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict]) -> "ExpenseColumns":
+        decoder = ColumnDecoder()
+        decoder.add(list(documents))
+        return decoder.finish()
+
+
+class ColumnDecoder:
+    """Accumulates batches of expense documents as column chunks."""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.chunks: List[tuple] = []
+
+    def add(self, documents: List[Dict]) -> None:
+        if not documents:
+            return
+        codes = self.codes
+        amounts = np.array([d.get("amount") for d in documents], dtype=np.float64)
+        dates = _decode_dates([d.get("date") for d in documents])
+        category_codes = np.fromiter(
+            (-1 if c is None else codes.setdefault(c, len(codes))
+             for c in (d.get("category") for d in documents)),
+            dtype=np.int32, count=len(documents))
+        self.chunks.append((amounts, dates, category_codes))
+
+    def finish(self) -> ExpenseColumns:
+        if not self.chunks:
+            return ExpenseColumns(np.zeros(0), np.zeros(0, dtype="datetime64[us]"),
+                                  np.zeros(0, dtype=np.int32), [])
+        amounts, dates, codes = (np.concatenate(column) for column in zip(*self.chunks))
+        return ExpenseColumns(amounts, dates, codes, list(self.codes))
+
+
+def _decode_dates(values: List) -> np.ndarray:
+    try:
+        # Naive datetimes, as the driver returns them: integer microseconds
+        # since the epoch are much cheaper than NumPy's per-object conversion
+        return np.fromiter(((value - _EPOCH) // _MICROSECOND for value in values),
+                           dtype=np.int64, count=len(values)).view("datetime64[us]")
+    except TypeError:
+        pass
+    try:
+        return np.array(values, dtype="datetime64[us]")
+    except (TypeError, ValueError):
+        # A malformed value somewhere in the batch; fall back per value.
+        return np.array([decode_date(value) for value in values], dtype="datetime64[us]")
+
+
+def decode_date(value) -> np.datetime64:
+    """One date as the columns hold it: NaT if missing or unparseable."""
+    try:
+        return np.datetime64(value, "us")
+    except (TypeError, ValueError):
+        return np.datetime64("NaT", "us")
+
+
+async def load_expense_columns(collection, query: Dict,
+                               batch_size: int = DECODE_BATCH_SIZE) -> ExpenseColumns:
+    """Stream the matching expenses into columns, one batch of documents at a time."""
+    decoder = ColumnDecoder()
+    batch = []
+    async for document in collection.find(query, EXPENSE_COLUMNS_PROJECTION,
+                                          batch_size=batch_size):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            with span("expense_columns"):
+                decoder.add(batch)
+            batch = []
+    with span("expense_columns"):
+        decoder.add(batch)
+        return decoder.finish()
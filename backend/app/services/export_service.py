@@ -0,0 +1,103 @@
+# backend/app/services/export_service.py
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, Dict, List
+
+EXPORT_FIELDS = ["id", "date", "amount", "tax_amount", "vendor", "category",
+                 "description", "receipt_image"]
+EXPORT_PROJECTION = {field: 1 for field in EXPORT_FIELDS if field != "id"}
+
+
+def _export_row(expense: Dict) -> Dict:
+    row = {field: expense.get(field) for field in EXPORT_FIELDS}
+    row["id"] = str(expense["_id"])
+    if isinstance(row["date"], str):
+        try:
+            row["date"] = datetime.fromisoformat(row["date"])
+        except ValueError:
+            row["date"] = None
+    for field in ("amount", "tax_amount"):
+        try:
+            row[field] = None if row[field] is None else float(row[field])
+        except (TypeError, ValueError):
+            row[field] = None
+    return row
+
+
+async def _batches(cursor, batch_size: int) -> AsyncIterator[List[Dict]]:
+    batch = []
+    async for expense in cursor.batch_size(batch_size):
+        batch.append(_export_row(expense))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def export_csv(cursor, batch_size: int) -> AsyncIterator[str]:
+    """Yield CSV text one cursor batch at a time."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    async for batch in _batches(cursor, batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+async def export_parquet(cursor, batch_size: int) -> AsyncIterator[bytes]:
+    """Yield a Parquet file incrementally, one row group per cursor batch.
+
+    Requires pyarrow, imported on first use.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("date", pa.timestamp("ms")),
+        ("amount", pa.float64()),
+        ("tax_amount", pa.float64()),
+        ("vendor", pa.string()),
+        ("category", pa.string()),
+        ("description", pa.string()),
+        ("receipt_image", pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for batch in _batches(cursor, batch_size):
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,168 @@
+# backend/app/services/forecast_batch.py
+"""Nightly forecasts for every user.
+
+Streams ``expense_rollups`` once, sorted by user and month, cuts the stream
+into shards of users and fits each shard in a process pool. Results are
+upserted into ``forecasts`` together with the data version they were
+computed from and the month their predictions follow, which lets the
+prediction endpoint serve them directly until either changes:
+
+    python -m app.services.forecast_batch --workers 4 --shard-size 500
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReplaceOne
+
+from app.services.forecast_engine import ForecastEngine, months_between
+
+UserSeries = Tuple[str, List[str], List[float]]
+
+
+def fit_shard(shard: List[UserSeries], current_month: str) -> List[Dict]:
+    """Fit one forecast per user; runs inside a worker process."""
+    engine = ForecastEngine()
+    forecasts = []
+    for user_id, months, totals in shard:
+        # Fill months without expenses so the series is evenly spaced.
+        series = [0.0] * (months_between(months[0], months[-1]) + 1)
+        for month, total in zip(months, totals):
+            series[months_between(months[0], month)] += total
+        fitted = engine.fit(series, months[-1])
+        forecasts.append({
+            "user_id": user_id,
+            "model": fitted.model,
+            "predictions": [
+                {"month": month, "predicted_amount": round(amount, 2)}
+                for month, amount in fitted.predict_after(current_month).items()
+            ],
+        })
+    return forecasts
+
+
+class ForecastBatchJob:
+    def __init__(self, workers: int = 0, shard_size: int = 500):
+        self.workers = workers
+        self.shard_size = shard_size
+
+    async def run(self, db, current_month: Optional[str] = None) -> Dict:
+        """Forecast every user with rollups; returns throughput statistics."""
+        # Local time, as the endpoint uses when it predicts or checks the month
+        current_month = current_month or datetime.now().strftime("%Y-%m")
+        started = time.perf_counter()
+        # A forkserver keeps the event loop's threads and Motor's held locks
+        # out of the workers.
+        executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("forkserver")
+        ) if self.workers else None
+        loop = asyncio.get_running_loop()
+        in_flight = set()
+        stats = {"users": 0, "shards": 0}
+
+        # Snapshot versions before reading any rollups: an expense change
+        # during the run leaves the stored version behind the live one, so
+        # the endpoint recomputes instead of serving a stale forecast.
+        versions = {
+            doc["_id"]: doc["version"]
+            async for doc in db.expense_versions.find({}, {"version": 1})
+        }
+
+        async def submit(shard: List[UserSeries]):
+            if executor is None:
+                forecasts = fit_shard(shard, current_month)
+            else:
+                forecasts = await loop.run_in_executor(
+                    executor, fit_shard, shard, current_month)
+            await self._store(db, forecasts, versions, current_month)
+            stats["users"] += len(forecasts)
+            stats["shards"] += 1
+
+        try:
+            shard: List[UserSeries] = []
+            async for series in self._stream_series(db):
+                shard.append(series)
+                if len(shard) >= self.shard_size:
+                    in_flight.add(asyncio.ensure_future(submit(shard)))
+                    shard = []
+                    if len(in_flight) >= max(1, self.workers) * 2:
+                        done, in_flight = await asyncio.wait(
+                            in_flight, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            task.result()
+            if shard:
+                in_flight.add(asyncio.ensure_future(submit(shard)))
+            for task in asyncio.as_completed(in_flight):
+                await task
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = elapsed
+        stats["users_per_second"] = stats["users"] / elapsed if elapsed else 0.0
+        return stats
+
+    async def _stream_series(self, db):
+        """Yield (user_id, months, totals) per user from one sorted rollup scan."""
+        cursor = db.expense_rollups.find(
+            {"count": {"$gt": 0}},
+            {"_id": 0, "user_id": 1, "month": 1, "amount": 1},
+        ).sort([("user_id", 1), ("month", 1)])
+
+        user_id, months, totals = None, [], []
+        async for row in cursor:
+            if row["user_id"] != user_id:
+                if user_id is not None:
+                    yield user_id, months, totals
+                user_id, months, totals = row["user_id"], [], []
+            if months and months[-1] == row["month"]:
+                totals[-1] += row["amount"]
+            else:
+                months.append(row["month"])
+                totals.append(row["amount"])
+        if user_id is not None:
+            yield user_id, months, totals
+
+    async def _store(self, db, forecasts: List[Dict], versions: Dict[str, int],
+                     current_month: str) -> None:
+        if not forecasts:
+            return
+        generated_at = datetime.utcnow()
+        await db.forecasts.bulk_write([
+            ReplaceOne(
+                {"_id": forecast["user_id"]},
+                {
+                    "version": versions.get(forecast["user_id"], 0),
+                    "month": current_month,
+                    "model": forecast["model"],
+                    "predictions": forecast["predictions"],
+                    "generated_at": generated_at,
+                },
+                upsert=True,
+            )
+            for forecast in forecasts
+        ], ordered=False)
+
+
+async def _main(args) -> None:
+    from app.core.database import DATABASE_NAME, create_client
+
+    client = create_client()
+    job = ForecastBatchJob(workers=args.workers, shard_size=args.shard_size)
+    stats = await job.run(client[DATABASE_NAME])
+    print(f"Forecast {stats['users']} users in {stats['shards']} shards, "
+          f"{stats['seconds']:.2f}s ({stats['users_per_second']:.0f} users/s)")
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast every user")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="worker processes; 0 fits in-process")
+    parser.add_argument("--shard-size", type=int, default=500)
+    asyncio.run(_main(parser.parse_args()))
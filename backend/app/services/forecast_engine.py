@@ -0,0 +1,143 @@
+# backend/app/services/forecast_engine.py
+"""Monthly expense forecasting.
+
+Three models are fitted to a monthly total series with closed-form NumPy
+code: a linear trend, a seasonal naive model and simple exponential
+smoothing. A holdout backtest on the most recent months picks the model
+used for the forecast. Fitted parameters are small, so they are cached per
+user together with the data version they were fitted on.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.utils.cache import TTLCache
+
+SES_ALPHAS = np.linspace(0.05, 0.95, 19)
+
+
+def add_months(month: str, count: int) -> str:
+    """Shift a ``YYYY-MM`` key by ``count`` months."""
+    index = int(month[:4]) * 12 + int(month[5:7]) - 1 + count
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def months_between(start: str, end: str) -> int:
+    return (int(end[:4]) - int(start[:4])) * 12 + int(end[5:7]) - int(start[5:7])
+
+
+def fit_linear(y: np.ndarray):
+    """Least-squares intercept and slope of ``y`` against 0..n-1 (last axis)."""
+    n = y.shape[-1]
+    t = np.arange(n, dtype=float)
+    t_mean = t.mean()
+    y_mean = y.mean(axis=-1)
+    denominator = ((t - t_mean) ** 2).sum()
+    if denominator == 0:
+        return y_mean, np.zeros_like(y_mean)
+    slope = ((t - t_mean) * (y - y_mean[..., None])).sum(axis=-1) / denominator
+    return y_mean - slope * t_mean, slope
+
+
+def fit_exponential_smoothing(y: np.ndarray):
+    """Simple exponential smoothing; every alpha in the grid is run at once.
+
+    Returns the final level and alpha minimising one-step-ahead squared error.
+    """
+    levels = np.full(SES_ALPHAS.shape, y[0], dtype=float)
+    errors = np.zeros(SES_ALPHAS.shape)
+    for value in y[1:]:
+        residual = value - levels
+        errors += residual ** 2
+        levels += SES_ALPHAS * residual
+    best = int(np.argmin(errors))
+    return float(levels[best]), float(SES_ALPHAS[best])
+
+
+@dataclass
+class FittedForecast:
+    model: str
+    params: Dict[str, object] = field(default_factory=dict)
+    length: int = 0
+    last_month: Optional[str] = None
+
+    def predict(self, steps: int) -> np.ndarray:
+        """Forecast the ``steps`` months following the fitted series."""
+        if self.model == "linear_trend":
+            t = np.arange(self.length, self.length + steps)
+            return self.params["intercept"] + self.params["slope"] * t
+        if self.model == "seasonal_naive":
+            season = np.asarray(self.params["season"])
+            return np.resize(season, steps)
+        return np.full(steps, self.params["level"])
+
+    def predict_after(self, month: str, steps: int = 3) -> Dict[str, float]:
+        """Forecast the ``steps`` months following ``month`` (``YYYY-MM``).
+
+        Months between the end of the series and ``month`` are forecast too,
+        so a user whose last expense is old still gets upcoming months.
+        """
+        if self.last_month is None:
+            return {add_months(month, i): 0.0 for i in range(1, steps + 1)}
+        gap = max(0, months_between(self.last_month, month))
+        start = add_months(self.last_month, gap)
+        values = self.predict(gap + steps)[gap:]
+        return {add_months(start, i): max(0.0, float(value))
+                for i, value in enumerate(values, 1)}
+
+
+class ForecastEngine:
+    def __init__(self, season_length: int = 12, holdout: int = 3,
+                 cache_size: int = 10000, cache_ttl: Optional[float] = None):
+        self.season_length = season_length
+        self.holdout = holdout
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def fit_model(self, model: str, y: np.ndarray) -> FittedForecast:
+        if model == "linear_trend":
+            intercept, slope = fit_linear(y)
+            return FittedForecast(model, {"intercept": float(intercept),
+                                          "slope": float(slope)}, len(y))
+        if model == "seasonal_naive":
+            season = y[-self.season_length:]
+            return FittedForecast(model, {"season": season.tolist()}, len(y))
+        level, alpha = fit_exponential_smoothing(y)
+        return FittedForecast(model, {"level": level, "alpha": alpha}, len(y))
+
+    def candidate_models(self, n: int):
+        models = ["linear_trend", "exponential_smoothing"]
+        if n >= self.season_length + self.holdout:
+            models.append("seasonal_naive")
+        return models
+
+    def fit(self, y: np.ndarray, last_month: Optional[str] = None) -> FittedForecast:
+        """Pick a model by holdout MAE on the last months, then refit on all data."""
+        fitted = self._fit(np.asarray(y, dtype=float))
+        fitted.last_month = last_month
+        return fitted
+
+    def _fit(self, y: np.ndarray) -> FittedForecast:
+        if len(y) == 0:
+            return FittedForecast("linear_trend", {"intercept": 0.0, "slope": 0.0}, 0)
+        if len(y) < 2 * self.holdout:
+            return self.fit_model("linear_trend", y)
+
+        train, test = y[:-self.holdout], y[-self.holdout:]
+        scores = {
+            model: float(np.abs(self.fit_model(model, train).predict(len(test)) - test).mean())
+            for model in self.candidate_models(len(y))
+        }
+        best = min(scores, key=scores.get)
+        fitted = self.fit_model(best, y)
+        fitted.params["backtest_mae"] = scores[best]
+        return fitted
+
+    def cached(self, key, version) -> Optional[FittedForecast]:
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return None
+
+    def store(self, key, version, fitted: FittedForecast) -> None:
+        self.cache.set(key, (version, fitted))
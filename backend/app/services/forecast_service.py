@@ -1,53 +1,265 @@
 # backend/app/services/forecast_service.py
-from datetime import datetime, timedelta
-from typing import Dict, List
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
 
 import numpy as np
-import pandas as pd
-from sklearn.linear_model import LinearRegression
+
+from app.core.metrics import span
+from app.core.settings import settings
+from app.services.expense_columns import ExpenseColumns, decode_date
+from app.services.forecast_engine import ForecastEngine
 
 
 class ForecastService:
+    def __init__(self):
+        self.engine = ForecastEngine(cache_size=settings.forecast_cache_size,
+                                     cache_ttl=settings.forecast_cache_ttl)
+
     async def predict_tax_liability(self, historical_data: List[Dict]) -> Dict:
         """Predict future tax liability based on historical data."""
-        df = pd.DataFrame(historical_data)
-        
-        # Prepare data for prediction
-        X = np.array(range(len(df))).reshape(-1, 1)
-        y = df['amount'].values
-        
-        # Fit model
-        model = LinearRegression()
-        model.fit(X, y)
-        
-        # Predict next 3 months
-        future_months = np.array(range(len(df), len(df) + 3)).reshape(-1, 1)
-        predictions = model.predict(future_months)
-        
+        return await self.predict_tax_liability_from_columns(
+            ExpenseColumns.from_documents(historical_data))
+
+    async def predict_tax_liability_from_columns(self, columns: ExpenseColumns) -> Dict:
+        """Forecast the next three months from calendar-month totals.
+
+        Expenses are bucketed by month, empty months included, like the
+        rollups path, so stored order does not matter. Expenses without an
+        amount or a date are left out.
+        """
+        with span("forecast_fit"):
+            valid = ~np.isnan(columns.amounts) & ~np.isnat(columns.dates)
+            if valid.any():
+                months = columns.dates[valid].astype("datetime64[M]").astype(np.int64)
+                monthly = np.bincount(months - months.min(), weights=columns.amounts[valid])
+                last_month = str(np.datetime64(int(months.max()), "M"))
+            else:
+                monthly, last_month = np.zeros(0), None
+            fitted = self.engine.fit(monthly, last_month)
+        return self._predictions(fitted)
+
+    async def predict_tax_liability_from_rollups(self, rollups: List[Dict]) -> Dict:
+        """Forecast the next three months from monthly rollup totals."""
+        return self._predictions(self.fit_rollups(rollups))
+
+    async def predict_tax_liability_for_user(
+        self,
+        user_id: str,
+        version: int,
+        load_rollups: Callable[[], Awaitable[List[Dict]]],
+        stored: Optional[Dict] = None
+    ) -> Dict:
+        """Like ``predict_tax_liability_from_rollups``, reusing the fitted model
+        while the user's data version is unchanged.
+
+        ``stored`` is the user's document from the ``forecasts`` collection
+        written by the batch job; it is served as-is while both its version
+        and the month its predictions follow are current.
+        """
+        if (stored and stored.get("version") == version
+                and stored.get("month") == datetime.now().strftime("%Y-%m")):
+            return {"model": stored.get("model"), "predictions": stored["predictions"]}
+
+        fitted = self.engine.cached(user_id, version)
+        if fitted is None:
+            rollups = await load_rollups()
+            with span("forecast_fit"):
+                fitted = self.fit_rollups(rollups)
+            self.engine.store(user_id, version, fitted)
+        return self._predictions(fitted)
+
+    def fit_rollups(self, rollups: List[Dict]):
+        months, monthly = self._monthly_totals(rollups)
+        return self.engine.fit(monthly, months[-1] if months else None)
+
+    @staticmethod
+    def _predictions(fitted) -> Dict:
+        upcoming = fitted.predict_after(datetime.now().strftime("%Y-%m"))
         return {
+            "model": fitted.model,
             "predictions": [
-                {
-                    "month": (datetime.now() + timedelta(days=30 * i)).strftime("%Y-%m"),
-                    "predicted_amount": round(float(pred), 2)
-                }
-                for i, pred in enumerate(predictions, 1)
+                {"month": month, "predicted_amount": round(amount, 2)}
+                for month, amount in upcoming.items()
             ]
         }
 
     async def get_cash_flow_insights(self, expenses: List[Dict]) -> Dict:
-        """Analyze expenses and provide cash flow optimization strategies."""
-        df = pd.DataFrame(expenses)
-        
-        total_expenses = df['amount'].sum()
-        avg_monthly = df.groupby(pd.Grouper(key='date', freq='M'))['amount'].sum().mean()
-        
-        categories = df.groupby('category')['amount'].agg(['sum', 'mean'])
-        top_expenses = categories.nlargest(3, 'sum')
-        
+        """Analyze expenses and provide cash flow optimization strategies.
+
+        In-memory path, kept as the fallback for
+        ``get_cash_flow_insights_from_db``.
+        """
+        return await self.get_cash_flow_insights_from_columns(
+            ExpenseColumns.from_documents(expenses))
+
+    async def get_cash_flow_insights_from_columns(self, columns: ExpenseColumns) -> Dict:
+        """Same result as ``get_cash_flow_insights``, grouped with ``np.bincount``.
+
+        Months are calendar months from the first to the last dated expense,
+        empty months included, as in the monthly resample this replaces.
+        Without any dated expense (or amount) the averages are 0 rather than
+        NaN, which JSON cannot carry.
+        """
+        if not len(columns):
+            return self._cash_flow_insights(0.0, 0.0, {})
+
+        with span("cash_flow"):
+            amounts = np.nan_to_num(columns.amounts)
+            total_expenses = float(amounts.sum())
+
+            dated = ~np.isnat(columns.dates)
+            if dated.any():
+                months = columns.dates[dated].astype("datetime64[M]").astype(np.int64)
+                monthly = np.bincount(months - months.min(), weights=amounts[dated])
+                avg_monthly = float(monthly.mean())
+            else:
+                avg_monthly = 0.0
+
+            top_expenses = {}
+            codes = columns.category_codes
+            if len(columns.categories):
+                categorized = codes >= 0
+                size = len(columns.categories)
+                sums = np.bincount(codes[categorized], weights=amounts[categorized],
+                                   minlength=size)
+                counts = np.bincount(codes[categorized & ~np.isnan(columns.amounts)],
+                                     minlength=size)
+                # Largest sums first, ties by category name
+                top = sorted(range(size),
+                             key=lambda code: (-sums[code], columns.categories[code]))[:3]
+                top_expenses = {
+                    columns.categories[code]: {
+                        "sum": float(sums[code]),
+                        "mean": float(sums[code] / counts[code]) if counts[code] else 0.0,
+                    }
+                    for code in top
+                }
+
+        return self._cash_flow_insights(total_expenses, avg_monthly, top_expenses)
+
+    async def get_cash_flow_insights_from_db(self, collection, user_id: str) -> Dict:
+        """Same result as ``get_cash_flow_insights``, computed inside MongoDB.
+
+        A single ``$facet`` pipeline returns the total, the date range and the
+        top three categories, so only summary rows leave the database. Dates
+        stored as strings (``update_collection`` takes free-form values) come
+        back grouped by value and are parsed like the in-memory path parses
+        them, since ``$dateFromString`` is not available everywhere we run.
+        """
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$facet": {
+                "totals": [{"$group": {"_id": None, "total": {"$sum": "$amount"}}}],
+                "dates": [
+                    {"$match": {"date": {"$type": "date"}}},
+                    {"$group": {
+                        "_id": None,
+                        "first": {"$min": "$date"},
+                        "last": {"$max": "$date"},
+                        "amount": {"$sum": "$amount"},
+                    }},
+                ],
+                "string_dates": [
+                    {"$match": {"date": {"$type": "string"}}},
+                    {"$group": {"_id": "$date", "amount": {"$sum": "$amount"}}},
+                ],
+                "categories": [
+                    {"$match": {"category": {"$ne": None}}},
+                    {"$group": {
+                        "_id": "$category",
+                        "sum": {"$sum": "$amount"},
+                        "mean": {"$avg": "$amount"},
+                    }},
+                    # Ties by category name, as in the in-memory path
+                    {"$sort": {"sum": -1, "_id": 1}},
+                    {"$limit": 3},
+                ],
+            }},
+        ]
+        result = await collection.aggregate(pipeline).to_list(length=1)
+        facets = result[0] if result else {"totals": [], "dates": [], "string_dates": [],
+                                           "categories": []}
+        if not facets["totals"]:
+            return self._cash_flow_insights(0.0, 0.0, {})
+
+        total = facets["totals"][0]["total"]
+        top_expenses = {
+            row["_id"]: {"sum": row["sum"], "mean": row["mean"]}
+            for row in facets["categories"]
+        }
+
+        # Month numbers of the dated expenses and what they add up to
+        months, dated_total = [], 0.0
+        dates = facets["dates"][0] if facets["dates"] else {}
+        if dates.get("first") is not None:
+            months += [decode_date(dates["first"]), decode_date(dates["last"])]
+            dated_total += dates["amount"]
+        for row in facets["string_dates"]:
+            day = decode_date(row["_id"])
+            if not np.isnat(day):
+                months.append(day)
+                dated_total += row["amount"]
+        if not months:
+            return self._cash_flow_insights(total, 0.0, top_expenses)
+
+        # Calendar months spanned, empty months included, matching the
+        # in-memory path.
+        months = np.array(months).astype("datetime64[M]").astype(np.int64)
+        span_months = int(months.max() - months.min()) + 1
+        return self._cash_flow_insights(total, dated_total / span_months, top_expenses)
+
+    async def get_cash_flow_insights_from_rollups(self, rollups: List[Dict]) -> Dict:
+        """Same result as ``get_cash_flow_insights``, from per-month rollup rows."""
+        months, monthly = self._monthly_totals(rollups)
+        if not months:
+            return self._cash_flow_insights(0.0, 0.0, {})
+
+        categories: Dict[str, List[float]] = {}
+        for row in rollups:
+            if row.get("category") is None:
+                continue
+            totals = categories.setdefault(row["category"], [0.0, 0])
+            totals[0] += row["amount"]
+            totals[1] += row["count"]
+        # Largest sums first, ties by category name
+        top = sorted(categories.items(), key=lambda item: (-item[1][0], item[0]))[:3]
+        top_expenses = {
+            category: {"sum": total, "mean": total / count}
+            for category, (total, count) in top
+        }
+        total_expenses = float(monthly.sum())
+        return self._cash_flow_insights(
+            total_expenses, total_expenses / len(months), top_expenses)
+
+    @staticmethod
+    def _monthly_totals(rollups: List[Dict]):
+        """Every calendar month from the first to the last rollup, with totals.
+
+        Months without expenses are included as zero.
+        """
+        by_month: Dict[str, float] = {}
+        for row in rollups:
+            by_month[row["month"]] = by_month.get(row["month"], 0.0) + row["amount"]
+        if not by_month:
+            return [], np.zeros(0)
+
+        first, last = min(by_month), max(by_month)
+        year, month = int(first[:4]), int(first[5:7])
+        months = []
+        while True:
+            key = f"{year:04d}-{month:02d}"
+            months.append(key)
+            if key == last:
+                break
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return months, np.array([by_month.get(key, 0.0) for key in months])
+
+    @staticmethod
+    def _cash_flow_insights(total_expenses, avg_monthly, top_expenses: Dict) -> Dict:
         return {
             "total_expenses": total_expenses,
             "average_monthly": avg_monthly,
-            "top_expense_categories": top_expenses.to_dict('index'),
+            "top_expense_categories": top_expenses,
             "recommendations": [
                 "Consider reducing spending in top expense categories",
                 "Set up automatic tax payments for estimated quarterly taxes",
@@ -0,0 +1,192 @@
+# backend/app/services/image_preprocess.py
+import io
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional, Union
+
+from app.core.settings import settings
+from app.utils.helpers import run_blocking
+
+THUMBNAIL_CONTENT_TYPE = "image/jpeg"
+OCR_CONTENT_TYPE = "image/jpeg"
+
+
+HASH_SIZE = 32
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+
+def hamming(a: str, b: str) -> int:
+    """Bit distance between two hex-encoded perceptual hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def difference_hash(image, size: int = HASH_SIZE) -> str:
+    """Difference hash of a receipt image (``size``² bits, hex encoded).
+
+    Receipts are mostly blank paper, so the usual 8x8 hash cannot tell two
+    receipts with the same layout apart. A finer grid over a normalized copy
+    (fixed resolution, lightly blurred, contrast-stretched) picks up the
+    text lines; re-encodes and moderately rescaled copies stay within about
+    2% of the bits, different receipts from one template at 4% or more.
+    """
+    from PIL import Image, ImageFilter, ImageOps
+
+    normalized = ImageOps.autocontrast(
+        image.convert("L").resize((128, 128), Image.BOX).filter(ImageFilter.GaussianBlur(1)))
+    pixels = normalized.resize((size + 1, size), Image.BOX).tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            index = row * (size + 1) + col
+            bits = (bits << 1) | (pixels[index] > pixels[index + 1])
+    return "%0*x" % (size * size // 4, bits)
+
+
+def _otsu_threshold(histogram) -> int:
+    total = sum(histogram)
+    weighted = sum(i * count for i, count in enumerate(histogram))
+    background = background_sum = 0
+    best, threshold = 0.0, 128
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0 or background == total:
+            continue
+        background_sum += level * count
+        foreground = total - background
+        mean_bg = background_sum / background
+        mean_fg = (weighted - background_sum) / foreground
+        variance = background * foreground * (mean_bg - mean_fg) ** 2
+        if variance > best:
+            best, threshold = variance, level
+    return threshold
+
+
+def crop_to_receipt(gray):
+    """Crop a grayscale photo to the bright paper region, if one stands out.
+
+    Works on a small copy: Otsu-threshold it, drop speckles with a median
+    filter and take the bounding box. Photos where the "receipt" would be
+    nearly the whole frame or a sliver of it are returned unchanged.
+    """
+    from PIL import ImageFilter
+
+    small = gray.copy()
+    small.thumbnail((256, 256))
+    threshold = _otsu_threshold(small.histogram())
+    mask = small.point(lambda p: 255 if p > threshold else 0).filter(
+        ImageFilter.MedianFilter(5))
+    bbox = mask.getbbox()
+    if not bbox:
+        return gray
+    area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]) / (small.width * small.height)
+    if not 0.1 <= area <= 0.9:
+        return gray
+    scale = gray.width / small.width
+    pad = 4
+    return gray.crop((max(0, int((bbox[0] - pad) * scale)),
+                      max(0, int((bbox[1] - pad) * scale)),
+                      min(gray.width, int((bbox[2] + pad) * scale)),
+                      min(gray.height, int((bbox[3] + pad) * scale))))
+
+
+def process_receipt_image(data: Union[bytes, str], ocr: bool, target_dpi: int,
+                          receipt_width: float, max_side: int, quality: int,
+                          thumbnail_size: int) -> Dict:
+    """Render a receipt photo's derived images; {} if ``data`` (the image or
+    a path to it) is not an image.
+
+    Returns the decoded ``format`` (e.g. "JPEG") and a JPEG ``thumbnail``
+    unless ``thumbnail_size`` is 0. With ``ocr``
+    it also returns the ``ocr`` image (upright, grayscale, cropped to the
+    paper, scaled to ``target_dpi`` for a receipt ``receipt_width`` inches
+    wide and recompressed) and its perceptual hash ``phash``. Runs in a
+    worker process, so everything in and out is plain bytes and strings.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        original = Image.open(io.BytesIO(data) if isinstance(data, bytes) else data)
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    except (UnidentifiedImageError, OSError):
+        return {}
+
+    result = {"format": original.format}
+    if thumbnail_size:
+        thumbnail = image.convert("RGB")
+        thumbnail.thumbnail((thumbnail_size, thumbnail_size))
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, "JPEG", quality=80, optimize=True)
+        result["thumbnail"] = buffer.getvalue()
+
+    if ocr:
+        gray = crop_to_receipt(image.convert("L"))
+        scale = min(1.0, target_dpi * receipt_width / gray.width,
+                    max_side / max(gray.size))
+        if scale < 1.0:
+            gray = gray.resize((max(1, round(gray.width * scale)),
+                                max(1, round(gray.height * scale))), Image.LANCZOS)
+        buffer = io.BytesIO()
+        gray.save(buffer, "JPEG", quality=quality, optimize=True)
+        result["ocr"] = buffer.getvalue()
+        result["phash"] = difference_hash(gray)
+    return result
+
+
+class ImagePreprocessor:
+    """Runs receipt image processing on a worker pool off the event loop.
+
+    Decoding and resampling a 12-megapixel photo is CPU-bound, so by default
+    it runs in a process pool rather than the OCR thread pool.
+    """
+
+    def __init__(self, enabled: bool, executor_kind: str, workers: int):
+        self.enabled = enabled
+        self.executor_kind = executor_kind
+        self.workers = workers
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        # Created lazily so importing the app never starts worker processes.
+        # Workers come from a forkserver: forking the running server would
+        # copy its threads' held locks into the children.
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("forkserver"))
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="preprocess")
+        return self._executor
+
+    async def process(self, data: Union[bytes, str], thumbnail: bool = True) -> Dict:
+        """OCR image and phash are only produced when preprocessing is on.
+
+        ``data`` is the image or the path of a file holding it.
+        """
+        return await run_blocking(
+            self.executor, process_receipt_image, data, self.enabled,
+            settings.ocr_target_dpi, settings.ocr_receipt_width,
+            settings.receipt_ocr_max_side, settings.ocr_jpeg_quality,
+            settings.receipt_thumbnail_size if thumbnail else 0)
+
+    async def ocr_bytes(self, data: bytes) -> bytes:
+        """The bytes to send to OCR for ``data``: preprocessed if possible."""
+        if not self.enabled:
+            return data
+        return (await self.process(data, thumbnail=False)).get("ocr", data)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+image_preprocessor = ImagePreprocessor(
+    enabled=settings.ocr_preprocess,
+    executor_kind=settings.ocr_preprocess_executor,
+    workers=settings.ocr_preprocess_workers or os.cpu_count() or 1,
+)
@@ -0,0 +1,306 @@
+# backend/app/services/import_service.py
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import logging
+import re
+import time
+from datetime import datetime
+from itertools import chain, islice
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.models.expense import ExpenseCreate
+from app.utils.helpers import run_blocking
+
+# Header spellings used by common bank and accounting exports, best match first
+COLUMN_ALIASES = {
+    "date": ("date", "transaction date", "posted date", "posting date", "trans. date"),
+    "amount": ("amount", "debit", "amount (usd)", "transaction amount"),
+    "vendor": ("vendor", "payee", "merchant", "name", "description"),
+    "category": ("category", "account"),
+    "description": ("memo", "notes", "description", "details"),
+}
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y%m%d", "%d.%m.%Y")
+OFX_TAG = re.compile(r"<(/?)([A-Z0-9.]+)>([^<\r\n]*)")
+# CSV rows read before deciding which sign marks money out
+SIGN_SAMPLE_ROWS = 1000
+
+ParsedRow = Tuple[int, Dict]
+
+
+def parse_date(value) -> Optional[datetime]:
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date {value!r}")
+
+
+def parse_amount(value) -> Optional[float]:
+    """Signed amounts as exported by banks: "$1,234.50", "-12.00" or "(12.00)"."""
+    if value is None or str(value).strip() == "":
+        return None
+    text = str(value).strip().replace("$", "").replace(",", "")
+    if text.startswith("(") and text.endswith(")"):
+        text = "-" + text[1:-1]
+    return float(text)
+
+
+def _sign(value) -> int:
+    """-1, 0 or 1; 0 for blank or unparseable amounts, left to validation."""
+    try:
+        amount = parse_amount(value)
+    except ValueError:
+        return 0
+    return 0 if not amount else (1 if amount > 0 else -1)
+
+
+def dedupe_key(expense: Dict) -> str:
+    """Identity of an expense: same day, amount and vendor.
+
+    Set on every expense write, however the expense arrived, so an imported
+    row matches a receipt confirmed earlier.
+    """
+    day = expense.get("date")
+    day = day.strftime("%Y-%m-%d") if hasattr(day, "strftime") else str(day)[:10]
+    vendor = (expense.get("vendor") or "").strip().lower()
+    raw = f"{day}|{float(expense.get('amount') or 0):.2f}|{vendor}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _columns(header: List[str]) -> Dict[str, str]:
+    normalized = {name.strip().lower(): name for name in header if name}
+    mapping: Dict[str, str] = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            name = normalized.get(alias)
+            if name and name not in mapping.values():
+                mapping[field] = name
+                break
+    return mapping
+
+
+def parse_csv(stream: IO[str]) -> Iterator[ParsedRow]:
+    """Yield (line number, raw fields) for each debit row, one line at a time.
+
+    Credits are skipped, as in ``parse_ofx``. A signed amount column reads
+    like OFX, negative being money out, when the first rows contain any
+    negative amount; otherwise (and for a ``Debit`` column) expenses are
+    positive and negative rows are refunds.
+    """
+    reader = csv.DictReader(stream)
+    mapping = _columns(reader.fieldnames or [])
+    if "date" not in mapping or "amount" not in mapping:
+        raise ValueError("CSV needs a date and an amount column")
+    rows = ((reader.line_num, {field: row.get(column) for field, column in mapping.items()})
+            for row in reader)
+    sample = list(islice(rows, SIGN_SAMPLE_ROWS))
+    signed = (mapping["amount"].strip().lower() != "debit"
+              and any(_sign(fields["amount"]) < 0 for _, fields in sample))
+    credit = 1 if signed else -1
+    for number, fields in chain(sample, rows):
+        if _sign(fields["amount"]) != credit:
+            yield number, fields
+
+
+def parse_ofx(stream: IO[str]) -> Iterator[ParsedRow]:
+    """Yield debit transactions from an OFX/QFX statement.
+
+    Handles both the SGML (OFX 1.x, unclosed tags) and XML dialects; credits
+    are skipped since they are not expenses.
+    """
+    transaction: Optional[Dict] = None
+    start = 0
+    for number, line in enumerate(stream, start=1):
+        for closing, tag, value in OFX_TAG.findall(line):
+            if tag == "STMTTRN":
+                if closing and transaction is not None:
+                    if transaction.pop("debit", True):
+                        yield start, transaction
+                    transaction = None
+                elif not closing:
+                    transaction, start = {}, number
+            elif transaction is not None and not closing:
+                value = value.strip()
+                if tag == "DTPOSTED":
+                    transaction["date"] = value[:8]
+                elif tag == "TRNAMT":
+                    transaction["amount"] = value
+                    transaction["debit"] = value.startswith("-")
+                elif tag in ("NAME", "PAYEE"):
+                    transaction.setdefault("vendor", value)
+                elif tag == "MEMO":
+                    transaction["description"] = value
+
+
+def _validate(fields: Dict) -> Dict:
+    amount = parse_amount(fields.get("amount"))
+    expense = ExpenseCreate(
+        # Parsers only pass debits on; expenses are stored as positive amounts
+        amount=abs(amount) if amount is not None else None,
+        date=parse_date(fields.get("date")),
+        vendor=(fields.get("vendor") or "").strip() or None,
+        category=(fields.get("category") or "").strip() or None,
+        description=(fields.get("description") or "").strip() or None,
+    ).model_dump(exclude_none=True)
+    expense["dedupe_key"] = dedupe_key(expense)
+    return expense
+
+
+def _validate_batch(rows: Iterator[ParsedRow], size: int) -> Tuple[int, List[Dict], List[Dict]]:
+    """Pull up to ``size`` rows off the parser and validate them."""
+    count, valid, errors = 0, [], []
+    for number, fields in islice(rows, size):
+        count += 1
+        try:
+            valid.append(_validate(fields))
+        except (ValidationError, ValueError, TypeError) as err:
+            message = (err.errors()[0]["msg"] if isinstance(err, ValidationError)
+                       else str(err))
+            errors.append({"row": number, "error": message})
+    return count, valid, errors
+
+
+class ExpenseImporter:
+    """Bulk-loads expense history from CSV or OFX exports.
+
+    Rows are parsed lazily off the uploaded file and validated against
+    ``ExpenseCreate`` in batches on a worker thread; each batch is written
+    with one unordered ``insert_many``. A row whose ``dedupe_key`` the user
+    already has, imported or confirmed from a receipt, is counted as a
+    duplicate and skipped; only imports are deduplicated, so identical
+    purchases entered by hand are all kept. Rollups are rebuilt once at the
+    end rather than per row.
+    """
+
+    def __init__(self, batch_size: int = 1000, max_errors: int = 1000):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+
+    async def run(self, db, user_id: str, stream: IO[bytes], fmt: str, rollups) -> Dict:
+        started = time.perf_counter()
+        report = {"rows": 0, "inserted": 0, "duplicates": 0, "failed": 0,
+                  "errors": [], "errors_truncated": False}
+
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+        rows = parse_ofx(text) if fmt == "ofx" else parse_csv(text)
+        seen = set()
+        while True:
+            count, valid, errors = await run_blocking(
+                None, _validate_batch, rows, self.batch_size)
+            if not count:
+                break
+            report["rows"] += count
+            self._record_errors(report, errors)
+
+            batch = []
+            for expense in valid:
+                if expense["dedupe_key"] in seen:
+                    report["duplicates"] += 1
+                    continue
+                seen.add(expense["dedupe_key"])
+                batch.append({"user_id": user_id, **expense})
+            await self._insert(db, batch, report)
+        text.detach()
+
+        if report["inserted"]:
+            await rollups.rebuild(db, user_id)
+
+        elapsed = time.perf_counter() - started
+        report["seconds"] = round(elapsed, 3)
+        report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed else None
+        logging.info(f"Imported {report['inserted']}/{report['rows']} rows for "
+                     f"{user_id} at {report['rows_per_second']} rows/s")
+        return report
+
+    async def _insert(self, db, batch: List[Dict], report: Dict) -> None:
+        if not batch:
+            return
+        stored = {
+            doc["dedupe_key"] async for doc in db.expenses.find(
+                {"user_id": batch[0]["user_id"],
+                 "dedupe_key": {"$in": [expense["dedupe_key"] for expense in batch]}},
+                {"_id": 0, "dedupe_key": 1})
+        }
+        if stored:
+            report["duplicates"] += sum(expense["dedupe_key"] in stored for expense in batch)
+            batch = [expense for expense in batch if expense["dedupe_key"] not in stored]
+            if not batch:
+                return
+        try:
+            result = await db.expenses.insert_many(batch, ordered=False)
+            report["inserted"] += len(result.inserted_ids)
+        except BulkWriteError as err:
+            details = err.details
+            report["inserted"] += details.get("nInserted", 0)
+            failures = []
+            for write_error in details.get("writeErrors", []):
+                if write_error.get("code") == 11000:
+                    report["duplicates"] += 1
+                else:
+                    failures.append({"row": None, "error": write_error.get("errmsg")})
+            self._record_errors(report, failures)
+
+    def _record_errors(self, report: Dict, errors: List[Dict]) -> None:
+        report["failed"] += len(errors)
+        room = self.max_errors - len(report["errors"])
+        report["errors"].extend(errors[:max(room, 0)])
+        if len(errors) > room:
+            report["errors_truncated"] = True
+
+
+async def backfill_dedupe_keys(db, batch_size: int = 1000) -> int:
+    """Key expenses stored before every write set ``dedupe_key``, so imports
+    recognise them too. Returns the number of expenses keyed."""
+    keyed, updates = 0, []
+    cursor = db.expenses.find({"dedupe_key": {"$exists": False}},
+                              {"date": 1, "amount": 1, "vendor": 1})
+    async for expense in cursor:
+        updates.append(UpdateOne({"_id": expense["_id"]},
+                                 {"$set": {"dedupe_key": dedupe_key(expense)}}))
+        if len(updates) >= batch_size:
+            await db.expenses.bulk_write(updates, ordered=False)
+            keyed, updates = keyed + len(updates), []
+    if updates:
+        await db.expenses.bulk_write(updates, ordered=False)
+        keyed += len(updates)
+    return keyed
+
+
+async def _main(args) -> None:
+    from app.core.database import DATABASE_NAME, create_client
+    from app.core.indexes import ensure_indexes
+
+    client = create_client()
+    db = client[DATABASE_NAME]
+    # Earlier releases made the index unique; it cannot be changed in place
+    index = (await db.expenses.index_information()).get("user_dedupe_key", {})
+    if index.get("unique"):
+        await db.expenses.drop_index("user_dedupe_key")
+    keyed = await backfill_dedupe_keys(db, args.batch_size)
+    await ensure_indexes(db)
+    print(f"Keyed {keyed} expenses")
+    client.close()
+
+
+if __name__ == "__main__":
+    # One-off migration, run once after upgrading:
+    #     python -m app.services.import_service
+    parser = argparse.ArgumentParser(
+        description="Key older expenses so imports can skip them")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,238 @@
+# backend/app/services/ocr_backends.py
+"""OCR and receipt-extraction backends behind ``OCRService``.
+
+An ``OCRBackend`` turns image bytes into text, an ``LLMBackend`` turns that
+text into receipt fields (a JSON string). Both are synchronous, like the
+SDKs they wrap; ``OCRService`` runs them on its thread pool. Which ones are
+used is set by ``OCR_BACKEND`` and ``OCR_LLM_BACKEND``:
+
+- ``google`` / ``gemini``: Google Cloud Vision and Gemini (the default).
+- ``tesseract`` / ``rules``: local and free, no network. Tesseract needs
+  the ``tesseract`` binary and ``pytesseract``; ``rules`` returns what the
+  rule-based parser makes of the text, however unsure it is.
+- ``stub`` / ``stub``: deterministic fakes that sleep a fixed latency, for
+  load tests and benchmarks.
+"""
+import hashlib
+import io
+import json
+import time
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+
+from app.core.settings import settings
+from app.services.receipt_parser import parse_receipt_text
+
+RECEIPT_PROMPT = """
+        Extract the following information from the receipt text provided below.
+        If the information is not found in the text, return null.
+        - total_amount: The total amount of the transaction (number with 2 decimal places).
+        - date: The date of the transaction in YYYY-MM-DD format.
+        - vendor: The name of the vendor or store.
+        - invoice_number: The invoice number, if available.
+        - tax_rate: The applicable tax rate (percentage).
+        - tax_amount: The total tax amount applied to the transaction.
+        - items: A list of purchased items, with the following details:
+          - name: Name of the item.
+          - price: Price of the item (number with 2 decimal places).
+          - quantity: Quantity of the item purchased.
+        - payment_method: The payment method used (if available).
+        - business_purpose: A brief description of the business purpose.
+
+        Receipt Text:
+        {text}
+        """
+
+
+class OCRBackend(ABC):
+    name = "ocr"
+
+    @abstractmethod
+    def recognize(self, image_content: bytes) -> str:
+        """Return the text in an image ("" if there is none)."""
+
+
+class LLMBackend(ABC):
+    name = "llm"
+
+    @abstractmethod
+    def extract(self, text: str) -> str:
+        """Return the receipt fields found in ``text`` as a JSON object."""
+
+
+class GoogleVisionOCR(OCRBackend):
+    name = "google"
+
+    def __init__(self, client=None):
+        from google.cloud import vision
+
+        if client is None:
+            from google.oauth2 import service_account
+
+            from google.auth.exceptions import GoogleAuthError
+
+            if not settings.google_cloud_credentials:
+                raise RuntimeError("GOOGLE_CLOUD_CREDENTIALS is not set")
+            try:
+                credentials = service_account.Credentials.from_service_account_file(
+                    settings.google_cloud_credentials
+                )
+            except (OSError, ValueError, GoogleAuthError) as e:
+                raise RuntimeError(f"Could not load GOOGLE_CLOUD_CREDENTIALS: {e}")
+            client = vision.ImageAnnotatorClient(credentials=credentials)
+        self.client = client
+        self.vision = vision
+
+    def recognize(self, image_content):
+        response = self.client.text_detection(image=self.vision.Image(content=image_content))
+        if not response.full_text_annotation:
+            return ""
+        return response.full_text_annotation.text or ""
+
+
+class GeminiLLM(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, model=None):
+        if model is None:
+            import google.generativeai as genai
+            from google.ai.generativelanguage_v1beta.types import content
+
+            if not settings.gemini_api:
+                raise RuntimeError("GEMINI_API is not set")
+            genai.configure(api_key=settings.gemini_api)
+            model = genai.GenerativeModel(
+                model_name="gemini-2.0-flash-exp",
+                generation_config=self.generation_config(content),
+            )
+        self.model = model
+
+    @staticmethod
+    def generation_config(content) -> dict:
+        return {
+            "temperature": 0.1,
+            "top_p": 0.95,
+            "top_k": 40,
+            "max_output_tokens": 8192,
+            "response_schema": content.Schema(
+                type=content.Type.OBJECT,
+                required=["total_amount", "date", "vendor", "items"],
+                properties={
+                    "total_amount": content.Schema(type=content.Type.NUMBER),
+                    "date": content.Schema(type=content.Type.STRING),
+                    "vendor": content.Schema(type=content.Type.STRING),
+                    "invoice_number": content.Schema(type=content.Type.STRING),
+                    "tax_rate": content.Schema(type=content.Type.NUMBER),
+                    "tax_amount": content.Schema(type=content.Type.NUMBER),
+                    "items": content.Schema(
+                        type=content.Type.ARRAY,
+                        items=content.Schema(
+                            type=content.Type.OBJECT,
+                            required=["name", "price", "quantity"],
+                            properties={
+                                "name": content.Schema(type=content.Type.STRING),
+                                "price": content.Schema(type=content.Type.NUMBER),
+                                "quantity": content.Schema(type=content.Type.NUMBER),
+                            },
+                        ),
+                    ),
+                    "payment_method": content.Schema(type=content.Type.STRING),
+                    "business_purpose": content.Schema(type=content.Type.STRING),
+                },
+            ),
+            "response_mime_type": "application/json",
+        }
+
+    def extract(self, text):
+        response = self.model.generate_content(RECEIPT_PROMPT.format(text=text))
+        return response.text
+
+
+class TesseractOCR(OCRBackend):
+    name = "tesseract"
+
+    def __init__(self, lang: str = "eng", config: str = ""):
+        try:
+            import pytesseract
+        except ImportError:
+            raise RuntimeError("pytesseract is not installed")
+        self.pytesseract = pytesseract
+        self.lang = lang
+        self.config = config
+
+    def recognize(self, image_content):
+        from PIL import Image
+
+        image = Image.open(io.BytesIO(image_content))
+        return self.pytesseract.image_to_string(image, lang=self.lang, config=self.config)
+
+
+class RulesLLM(LLMBackend):
+    """No model at all: the rule-based parser's best guess."""
+
+    name = "rules"
+
+    def extract(self, text):
+        return json.dumps(parse_receipt_text(text).data)
+
+
+STUB_VENDORS = ("Corner Store", "Blue Bottle Cafe", "Office Depot", "Shell", "Home Depot")
+
+
+class StubOCR(OCRBackend):
+    """Blocks for ``latency`` seconds and returns a receipt derived from the bytes.
+
+    The same image always gives the same text, so runs are reproducible.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def recognize(self, image_content):
+        time.sleep(self.latency)
+        seed = int.from_bytes(hashlib.sha256(image_content).digest()[:8], "big")
+        vendor = STUB_VENDORS[seed % len(STUB_VENDORS)]
+        day = date(2024, 1, 1) + timedelta(days=seed % 365)
+        items = [(f"ITEM {seed >> (8 * i) & 0xFFF:04d}", (seed >> (4 * i) & 0x3FF) / 20 + 1)
+                 for i in range(1 + seed % 4)]
+        total = sum(price for _, price in items)
+        return "\n".join([vendor.upper(), day.isoformat(),
+                          *(f"{name}  {price:.2f}" for name, price in items),
+                          f"TOTAL  {total:.2f}"])
+
+
+class StubLLM(RulesLLM):
+    """The ``rules`` answer after blocking for ``latency`` seconds."""
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def extract(self, text):
+        time.sleep(self.latency)
+        return super().extract(text)
+
+
+def get_ocr_backend(name: str) -> OCRBackend:
+    """Build the configured OCR backend; RuntimeError if it cannot run here."""
+    if name == "google":
+        return GoogleVisionOCR()
+    if name == "tesseract":
+        return TesseractOCR(settings.tesseract_lang, settings.tesseract_config)
+    if name == "stub":
+        return StubOCR(settings.ocr_stub_latency)
+    raise RuntimeError(f"Unknown OCR backend {name!r}")
+
+
+def get_llm_backend(name: str) -> LLMBackend:
+    """Build the configured receipt-extraction backend."""
+    if name == "gemini":
+        return GeminiLLM()
+    if name == "rules":
+        return RulesLLM()
+    if name == "stub":
+        return StubLLM(settings.ocr_llm_stub_latency)
+    raise RuntimeError(f"Unknown LLM backend {name!r}")
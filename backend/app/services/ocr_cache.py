@@ -0,0 +1,70 @@
+# backend/app/services/ocr_cache.py
+import copy
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.utils.cache import TTLCache
+
+
+class OCRResultCache:
+    """Content-addressed cache of parsed receipts.
+
+    Results are keyed by the SHA-256 of the image bytes and kept in two tiers:
+    an in-process LRU and a MongoDB collection shared by all workers. Mongo
+    entries carry an ``expires_at`` field backed by a TTL index (see
+    ``app.core.indexes``).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = {"memory": 0, "mongo": 0}
+        self.misses = 0
+
+    @staticmethod
+    def key_for(image_content: bytes, namespace: str = "") -> str:
+        digest = hashlib.sha256(image_content).hexdigest()
+        return f"{namespace}:{digest}" if namespace else digest
+
+    async def get(self, key: str, collection=None) -> Optional[dict]:
+        data = self.memory.get(key)
+        if data is not None:
+            self.hits["memory"] += 1
+            return copy.deepcopy(data)
+
+        if collection is not None:
+            doc = await collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+                {"receipt_data": 1},
+            )
+            if doc:
+                self.hits["mongo"] += 1
+                self.memory.set(key, doc["receipt_data"])
+                return copy.deepcopy(doc["receipt_data"])
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, data: dict, collection=None) -> None:
+        self.memory.set(key, copy.deepcopy(data))
+        if collection is None:
+            return
+        now = datetime.utcnow()
+        await collection.replace_one(
+            {"_id": key},
+            {
+                "receipt_data": data,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl),
+            },
+            upsert=True,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.hits["memory"],
+            "mongo_hits": self.hits["mongo"],
+            "misses": self.misses,
+            "memory_size": len(self.memory),
+        }
@@ -1,110 +1,112 @@
-import io
+import asyncio
 import json
 import logging
-from google.cloud import vision
-from google.oauth2 import service_account
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from app.core.metrics import span
 from app.core.settings import settings  # Ensure this import is correct
-from google.ai.generativelanguage_v1beta.types import content
+from app.services.image_preprocess import image_preprocessor
+from app.services.ocr_backends import (LLMBackend, OCRBackend, get_llm_backend,
+                                       get_ocr_backend)
+from app.services.ocr_cache import OCRResultCache
+from app.services.receipt_parser import parse_receipt_text
+from app.utils.helpers import run_blocking
 
 
 class OCRService:
-    def __init__(self):
-        # Initialize Google Cloud Vision API Client
-        credentials = service_account.Credentials.from_service_account_file(
-            settings.google_cloud_credentials
+    def __init__(self, ocr: Optional[OCRBackend] = None,
+                 llm: Optional[LLMBackend] = None):
+        # The OCR and LLM backends are synchronous, so every call is pushed
+        # onto this pool and the number of receipts in flight is capped.
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.ocr_max_workers, thread_name_prefix="ocr"
         )
-        self.client = vision.ImageAnnotatorClient(credentials=credentials)
-
-        # Initialize Gemini API
-        genai.configure(api_key=settings.gemini_api)
-        self.generation_config = {
-            "temperature": 0.1,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 8192,
-            "response_schema": content.Schema(
-                type=content.Type.OBJECT,
-                required=["total_amount", "date", "vendor", "items"],
-                properties={
-                    "total_amount": content.Schema(type=content.Type.NUMBER),
-                    "date": content.Schema(type=content.Type.STRING),
-                    "vendor": content.Schema(type=content.Type.STRING),
-                    "invoice_number": content.Schema(type=content.Type.STRING),
-                    "tax_rate": content.Schema(type=content.Type.NUMBER),
-                    "tax_amount": content.Schema(type=content.Type.NUMBER),
-                    "items": content.Schema(
-                        type=content.Type.ARRAY,
-                        items=content.Schema(
-                            type=content.Type.OBJECT,
-                            required=["name", "price", "quantity"],
-                            properties={
-                                "name": content.Schema(type=content.Type.STRING),
-                                "price": content.Schema(type=content.Type.NUMBER),
-                                "quantity": content.Schema(type=content.Type.NUMBER),
-                            },
-                        ),
-                    ),
-                    "payment_method": content.Schema(type=content.Type.STRING),
-                    "business_purpose": content.Schema(type=content.Type.STRING),
-                },
-            ),
-            "response_mime_type": "application/json",
-        }
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash-exp",
-            generation_config=self.generation_config,
+        self.semaphore = asyncio.Semaphore(settings.ocr_max_concurrency)
+        self.cache = OCRResultCache(
+            maxsize=settings.ocr_cache_max_entries, ttl=settings.ocr_cache_ttl
         )
+        self.ocr = ocr or get_ocr_backend(settings.ocr_backend)
+        self.llm = llm or get_llm_backend(settings.ocr_llm_backend)
+        # Results from other backends are cached apart from Google/Gemini ones
+        backends = f"{self.ocr.name}+{self.llm.name}"
+        self.cache_namespace = "" if backends == "google+gemini" else backends
+
+    async def extract_receipt_data(self, image_content: bytes, db=None,
+                                   preprocessed: bool = False) -> dict:
+        """Extract receipt fields from an image with the configured backends.
+
+        Identical images are answered from the OCR result cache; pass ``db`` to
+        share cached results across workers through the ``ocr_cache`` collection.
+        Unless ``preprocessed`` is set, photos are shrunk for OCR first (see
+        ``image_preprocess``).
+        """
+        key = OCRResultCache.key_for(image_content, self.cache_namespace)
+        collection = db.ocr_cache if db is not None else None
+        cached = await self.cache.get(key, collection)
+        if cached is not None:
+            return cached
 
-    async def extract_receipt_data(self, image_content: bytes) -> dict:
-        """Extract text from receipt images using Google Cloud Vision API."""
+        if not preprocessed:
+            image_content = await image_preprocessor.ocr_bytes(image_content)
+        async with self.semaphore:
+            extracted_data = await self._extract_receipt_data(image_content)
+        if "error" not in extracted_data:
+            await self.cache.set(key, extracted_data, collection)
+        return extracted_data
+
+    async def _extract_receipt_data(self, image_content: bytes) -> dict:
         try:
-            image = vision.Image(content=image_content)
-            response = self.client.text_detection(image=image)
-            
-            if not response.full_text_annotation or not response.full_text_annotation.text:
+            with span(f"ocr.{self.ocr.name}"):
+                extracted_text = await run_blocking(
+                    self.executor,
+                    self.ocr.recognize,
+                    image_content,
+                    timeout=settings.ocr_vision_timeout,
+                )
+
+            if not extracted_text:
                 return {"error": "No text found in image"}
 
-            extracted_text = response.full_text_annotation.text
+            if settings.ocr_rules_parser:
+                parsed = parse_receipt_text(extracted_text)
+                if parsed.trusted(settings.ocr_rules_min_confidence):
+                    return parsed.data
+                logging.debug("Rule parser confidence %.2f, falling back to %s",
+                              parsed.confidence, self.llm.name)
             extracted_data = await self._parse_receipt_text(extracted_text)
             return extracted_data
+        except asyncio.TimeoutError:
+            logging.error("%s text detection timed out after %ss",
+                          self.ocr.name, settings.ocr_vision_timeout)
+            return {"error": "Timed out while processing image"}
         except Exception as e:
             logging.error(f"Error extracting receipt data: {e}")
             return {"error": "Failed to process image"}
 
     async def _parse_receipt_text(self, text: str) -> dict:
-        """Parse extracted text using Gemini API to identify amount, date, vendor, etc."""
-        prompt = f"""
-        Extract the following information from the receipt text provided below.
-        If the information is not found in the text, return null.
-        - total_amount: The total amount of the transaction (number with 2 decimal places).
-        - date: The date of the transaction in YYYY-MM-DD format.
-        - vendor: The name of the vendor or store.
-        - invoice_number: The invoice number, if available.
-        - tax_rate: The applicable tax rate (percentage).
-        - tax_amount: The total tax amount applied to the transaction.
-        - items: A list of purchased items, with the following details:
-          - name: Name of the item.
-          - price: Price of the item (number with 2 decimal places).
-          - quantity: Quantity of the item purchased.
-        - payment_method: The payment method used (if available).
-        - business_purpose: A brief description of the business purpose.
-
-        Receipt Text:
-        {text}
-        """
+        """Parse extracted text with the LLM backend to identify amount, date, vendor, etc."""
         try:
-            response = self.model.generate_content(prompt)
-            if response.text:
+            with span(f"llm.{self.llm.name}"):
+                response_text = await run_blocking(
+                    self.executor,
+                    self.llm.extract,
+                    text,
+                    timeout=settings.ocr_gemini_timeout,
+                )
+            if response_text:
                 try:
-                    data = json.loads(response.text)
+                    data = json.loads(response_text)
                     return data
                 except json.JSONDecodeError:
-                    logging.error(f"Gemini returned invalid JSON format: {response.text}")
+                    logging.error(f"{self.llm.name} returned invalid JSON format: {response_text}")
                     return {"error": "Could not extract data from text"}
             else:
-                logging.error(f"Gemini response: {response}")
+                logging.error(f"{self.llm.name} returned no text")
                 return {"error": "Could not extract data from text"}
+        except asyncio.TimeoutError:
+            logging.error("%s parsing timed out after %ss",
+                          self.llm.name, settings.ocr_gemini_timeout)
+            return {"error": "Timed out while processing text with Gemini"}
         except Exception as e:
-            logging.error(f"Error using Gemini API: {e}")
+            logging.error(f"Error using {self.llm.name}: {e}")
             return {"error": "Failed to process text with Gemini"}
@@ -0,0 +1,184 @@
+# backend/app/services/receipt_jobs.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+JobHandler = Callable[[object, dict], Awaitable[dict]]
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for a failure retrying cannot fix (an unsupported
+    image, missing credentials); the job is dead-lettered without retries."""
+
+
+class ReceiptJobQueue:
+    """MongoDB-backed work queue for receipt processing.
+
+    Jobs live in ``receipt_jobs`` and reference the upload in receipt
+    storage by its ``receipt_files`` id. Workers claim them with an atomic
+    ``find_one_and_update`` and hold a lease while running, so a job whose
+    worker died is picked up again once the lease expires. Failures are
+    retried with exponential backoff; after ``max_attempts`` (counting
+    attempts whose lease expired) or on a ``PermanentJobError`` the job is
+    copied to ``receipt_jobs_dead`` and marked ``dead``.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        max_attempts: int = 5,
+        backoff_seconds: float = 5,
+        lease_seconds: float = 300,
+        poll_interval: float = 1,
+    ):
+        self.handler = handler
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    async def enqueue(self, db, user_id: str, filename: str, receipt_file_id) -> str:
+        now = datetime.utcnow()
+        result = await db.receipt_jobs.insert_one({
+            "user_id": user_id,
+            "filename": filename,
+            "receipt_file_id": receipt_file_id,
+            "status": "queued",
+            "stage": "queued",
+            "attempts": 0,
+            "run_at": now,
+            "created_at": now,
+            "updated_at": now,
+        })
+        self._wakeup.set()
+        return str(result.inserted_id)
+
+    async def get(self, db, job_id: str, user_id: str) -> Optional[dict]:
+        if not ObjectId.is_valid(job_id):
+            return None
+        return await db.receipt_jobs.find_one(
+            {"_id": ObjectId(job_id), "user_id": user_id}
+        )
+
+    def start(self, db, workers: int) -> None:
+        for _ in range(workers):
+            self._workers.append(asyncio.create_task(self._work(db)))
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def _work(self, db) -> None:
+        while True:
+            try:
+                job = await self._claim(db)
+            except Exception as err:
+                logging.error(f"Error claiming receipt job: {err}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(db, job)
+
+    async def _claim(self, db) -> Optional[dict]:
+        now = datetime.utcnow()
+        # A job whose lease ran out on its last attempt crashed or hung a
+        # worker every time it ran; claiming it again would never end.
+        while await self._dead_letter(
+                db, {"status": "running", "lease_until": {"$lt": now},
+                     "attempts": {"$gte": self.max_attempts}},
+                "Lease expired on the last attempt"):
+            pass
+
+        return await db.receipt_jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {"status": "running", "lease_until": {"$lt": now},
+                 "attempts": {"$lt": self.max_attempts}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "stage": "processing",
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _run(self, db, job: dict) -> None:
+        try:
+            result = await self.handler(db, job)
+        except PermanentJobError as err:
+            logging.error(f"Receipt job {job['_id']} failed permanently: {err}")
+            await self._dead_letter(db, {"_id": job["_id"]}, str(err))
+            return
+        except Exception as err:
+            logging.error(f"Receipt job {job['_id']} failed: {err}")
+            await self._fail(db, job, str(err))
+            return
+
+        await db.receipt_jobs.update_one(
+            {"_id": job["_id"]},
+            {
+                "$set": {
+                    "status": "succeeded",
+                    "stage": "done",
+                    "result": result,
+                    "updated_at": datetime.utcnow(),
+                },
+                "$unset": {"lease_until": "", "error": ""},
+            },
+        )
+
+    async def _fail(self, db, job: dict, error: str) -> None:
+        if job["attempts"] >= self.max_attempts:
+            await self._dead_letter(db, {"_id": job["_id"]}, error)
+            return
+
+        now = datetime.utcnow()
+        delay = self.backoff_seconds * 2 ** (job["attempts"] - 1)
+        await db.receipt_jobs.update_one(
+            {"_id": job["_id"]},
+            {
+                "$set": {
+                    "status": "queued",
+                    "stage": "retrying",
+                    "error": error,
+                    "run_at": now + timedelta(seconds=delay),
+                    "updated_at": now,
+                },
+                "$unset": {"lease_until": ""},
+            },
+        )
+
+    async def _dead_letter(self, db, query: dict, error: str) -> Optional[dict]:
+        """Mark one job matching ``query`` dead and copy it to ``receipt_jobs_dead``."""
+        now = datetime.utcnow()
+        job = await db.receipt_jobs.find_one_and_update(
+            query,
+            {
+                "$set": {"status": "dead", "stage": "failed",
+                         "error": error, "updated_at": now},
+                "$unset": {"lease_until": ""},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None:
+            await db.receipt_jobs_dead.insert_one({**job, "dead_at": now})
+        return job
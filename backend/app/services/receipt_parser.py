@@ -0,0 +1,269 @@
+# backend/app/services/receipt_parser.py
+"""Rule-based receipt parser run on the Vision text before falling back to Gemini.
+
+Most receipts print the vendor at the top, a date in one of a handful of
+formats and a line starting with TOTAL. ``parse_receipt_text`` pulls those out
+with regexes and layout rules and scores how sure it is; ``OCRService`` only
+calls the LLM when the score is low or a required field is missing.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+REQUIRED_FIELDS = ("total_amount", "date", "vendor")
+# How much each field contributes to the overall confidence
+WEIGHTS = {"total_amount": 0.45, "date": 0.25, "vendor": 0.2, "consistency": 0.1}
+
+AMOUNT = r"[-$€£]?\s?\d{1,3}(?:[,.]\d{3})*[.,]\d{2}(?!\d)"
+AMOUNT_RE = re.compile(AMOUNT)
+MONTHS = {name: number for number, names in enumerate((
+    ("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"),
+    ("may",), ("jun", "june"), ("jul", "july"), ("aug", "august"),
+    ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"),
+    ("dec", "december")), start=1) for name in names}
+DATE_PATTERNS = [
+    # (regex, group order, confidence)
+    (re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b"), "ymd", 1.0),
+    (re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4}|\d{2})\b"), "mdy", 0.9),
+    (re.compile(r"\b(\d{1,2})[.-](\d{1,2})[.-](\d{4}|\d{2})\b"), "dmy", 0.85),
+    (re.compile(r"\b([A-Za-z]{3,9})\.?\s+(\d{1,2}),?\s+(\d{4})\b"), "Mdy", 0.95),
+    (re.compile(r"\b(\d{1,2})\s+([A-Za-z]{3,9})\.?,?\s+(\d{4})\b"), "dMy", 0.95),
+]
+# Total keywords, strongest first
+TOTAL_KEYWORDS = [
+    (re.compile(r"\b(grand\s+total|total\s+due|amount\s+due|balance\s+due|total\s+amount|"
+                r"total\s+paid|amount\s+paid|total\s+charged|amount\s+charged)\b", re.I), 1.0),
+    (re.compile(r"^\W*(total|gesamt|summe|totale|total\s+ttc)\b"
+                r"(?!\s*(savings|saved|items?|qty|quantity|discount|tax))", re.I), 0.95),
+    (re.compile(r"\b(?<!sub)(?<!sub\s)total\b(?!\s*(savings|saved|items?|qty|quantity|discount|tax))", re.I), 0.8),
+    (re.compile(r"\b(amount|balance|to pay|charged?)\b", re.I), 0.6),
+]
+SUBTOTAL_RE = re.compile(r"\bsub\s?-?total\b", re.I)
+TAX_RE = re.compile(r"\b(sales\s+tax|tax|vat|gst|hst|pst|mwst|ust|iva|tva)\b(?!\s*(id|no|number|#|reg))", re.I)
+PERCENT_RE = re.compile(r"(\d{1,2}(?:[.,]\d{1,3})?)\s?%")
+INVOICE_RE = re.compile(
+    r"\b(?:invoice|inv|receipt|order|trans(?:action)?|ticket|check|chk)\s*(?:no\.?|number|#|:)\s*:?\s*([A-Z0-9][A-Z0-9-]{2,})",
+    re.I)
+PAYMENT_RE = re.compile(
+    r"\b(visa|mastercard|master card|amex|american express|discover|debit|credit|cash|apple pay|google pay)\b",
+    re.I)
+QUANTITY_RE = re.compile(r"^\s*(\d{1,3})\s*(?:x|@|\*)\s*", re.I)
+# Labels that say which of several printed dates is the transaction date
+DATE_LABEL_RE = re.compile(
+    r"\b(date\s+of\s+issue|issue\s+date|invoice\s+date|statement\s+date|billing\s+date|"
+    r"order\s+placed|billed|date)\b", re.I)
+# Header lines that are not the store name
+NOT_VENDOR_RE = re.compile(
+    r"(welcome|receipt|invoice|tel|phone|fax|www\.|http|@|:$|store\s*#|street|st\.|ave|road|rd\.|blvd|suite|"
+    r"cashier|register|server|table|guest|order|copy|thank)", re.I)
+NON_ITEM_RE = re.compile(
+    r"(total|tax|vat|gst|change|cash|visa|mastercard|amex|debit|credit|card|tip|gratuity|"
+    r"balance|due|tender|payment|auth|approval|discount|savings|rounding)", re.I)
+
+
+@dataclass
+class ParsedReceipt:
+    data: Dict
+    confidence: float
+    fields: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def complete(self) -> bool:
+        return all(self.data.get(name) not in (None, "") for name in REQUIRED_FIELDS)
+
+    def trusted(self, min_confidence: float, min_field: float = 0.5) -> bool:
+        """Good enough to skip the LLM: every required field found, none of
+        them a weak guess, and a high overall score."""
+        return (self.complete and self.confidence >= min_confidence
+                and all(self.fields[name] >= min_field for name in REQUIRED_FIELDS))
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """"1,234.56", "1.234,56" or "$ 12.50" as a float."""
+    cleaned = re.sub(r"[^\d,.-]", "", text)
+    if not cleaned:
+        return None
+    negative = cleaned.startswith("-")
+    cleaned = cleaned.lstrip("-")
+    if re.search(r",\d{2}$", cleaned):
+        cleaned = cleaned.replace(".", "").replace(",", ".")
+    else:
+        cleaned = cleaned.replace(",", "")
+    try:
+        value = float(cleaned)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def _amounts(line: str) -> List[float]:
+    values = [parse_amount(match) for match in AMOUNT_RE.findall(line)]
+    return [value for value in values if value is not None]
+
+
+def _year(text: str) -> int:
+    year = int(text)
+    return year + 2000 if year < 100 else year
+
+
+def _dates_in(line: str) -> List[Tuple[str, float]]:
+    found = []
+    for pattern, order, confidence in DATE_PATTERNS:
+        for match in pattern.finditer(line):
+            a, b, c = match.groups()
+            try:
+                if order == "ymd":
+                    parsed = date(int(a), int(b), int(c))
+                elif order == "mdy":
+                    month, day = int(a), int(b)
+                    if month > 12:  # day-first locale
+                        month, day = day, month
+                    elif day <= 12 and month != day:
+                        confidence = 0.75  # ambiguous, assume US order
+                    parsed = date(_year(c), month, day)
+                elif order == "dmy":
+                    parsed = date(_year(c), int(b), int(a))
+                elif order == "Mdy":
+                    parsed = date(int(c), MONTHS[a.lower()], int(b))
+                else:
+                    parsed = date(int(c), MONTHS[b.lower()], int(a))
+            except (KeyError, ValueError):
+                continue
+            if 2000 <= parsed.year <= 2100:
+                found.append((parsed.isoformat(), confidence))
+    return found
+
+
+def find_date(lines: List[str]) -> Tuple[Optional[str], float]:
+    """The transaction date. Several different dates (arrival/departure, due
+    dates, service periods) make the answer uncertain unless one of them is
+    labelled as the issue/statement date."""
+    candidates = []
+    for line in lines:
+        dates = _dates_in(line)
+        labelled = len(dates) == 1 and bool(DATE_LABEL_RE.search(line))
+        candidates.extend((value, confidence, labelled) for value, confidence in dates)
+    if not candidates:
+        return None, 0.0
+    if len({value for value, _, _ in candidates}) > 1:
+        labelled = [c for c in candidates if c[2]]
+        if len({value for value, _, _ in labelled}) == 1:
+            return labelled[0][0], labelled[0][1] * 0.9
+        value, confidence, _ = candidates[0]
+        return value, confidence * 0.4
+    value, confidence, _ = max(candidates, key=lambda c: c[1])
+    return value, confidence
+
+
+def find_vendor(lines: List[str]) -> Tuple[Optional[str], float]:
+    for position, line in enumerate(lines[:6]):
+        letters = sum(char.isalpha() for char in line)
+        if letters < 3 or letters < len(line) * 0.5:
+            continue
+        if NOT_VENDOR_RE.search(line) or AMOUNT_RE.search(line):
+            continue
+        if _dates_in(line):
+            continue
+        confidence = 1.0 if position == 0 else 0.85 if position <= 2 else 0.6
+        return re.sub(r"\s{2,}", " ", line).strip(" *-=#"), confidence
+    return None, 0.0
+
+
+def _line_amount(lines: List[str], index: int) -> Optional[float]:
+    """Amount on a keyword line, or on the next line when printed below it."""
+    amounts = _amounts(lines[index])
+    if amounts:
+        return amounts[-1]
+    if index + 1 < len(lines) and re.fullmatch(r"\W*" + AMOUNT + r"\W*", lines[index + 1]):
+        return _amounts(lines[index + 1])[-1]
+    return None
+
+
+def find_total(lines: List[str]) -> Tuple[Optional[float], float]:
+    for pattern, confidence in TOTAL_KEYWORDS:
+        # The last match wins: totals come after subtotals and running sums.
+        for index in range(len(lines) - 1, -1, -1):
+            line = lines[index]
+            if SUBTOTAL_RE.search(line) or not pattern.search(line):
+                continue
+            amount = _line_amount(lines, index)
+            if amount is not None and amount > 0:
+                return amount, confidence
+    amounts = [amount for line in lines for amount in _amounts(line) if amount > 0]
+    return (max(amounts), 0.3) if amounts else (None, 0.0)
+
+
+def find_labeled_amount(lines: List[str], pattern) -> Tuple[Optional[float], Optional[str]]:
+    for index, line in enumerate(lines):
+        if pattern.search(line) and not TOTAL_KEYWORDS[0][0].search(line):
+            amount = _line_amount(lines, index)
+            if amount is not None:
+                return amount, line
+    return None, None
+
+
+def find_items(lines: List[str]) -> List[Dict]:
+    items = []
+    for line in lines:
+        amounts = AMOUNT_RE.findall(line)
+        if not amounts or NON_ITEM_RE.search(line):
+            continue
+        name = line[:line.find(amounts[0])].strip(" .:-$")
+        quantity = 1
+        match = QUANTITY_RE.match(name)
+        if match:
+            quantity = int(match.group(1))
+            name = name[match.end():]
+        if sum(char.isalpha() for char in name) < 2:
+            continue
+        price = parse_amount(amounts[-1])
+        if price is None or price <= 0:
+            continue
+        items.append({"name": name.strip(), "price": price, "quantity": quantity})
+    return items
+
+
+def parse_receipt_text(text: str) -> ParsedReceipt:
+    """Extract receipt fields from OCR text and score the result in [0, 1]."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    vendor, vendor_confidence = find_vendor(lines)
+    receipt_date, date_confidence = find_date(lines)
+    total, total_confidence = find_total(lines)
+    subtotal, _ = find_labeled_amount(lines, SUBTOTAL_RE)
+    tax, tax_line = find_labeled_amount(lines, TAX_RE)
+    items = find_items(lines)
+
+    # A total that agrees with subtotal + tax or the item prices is trustworthy.
+    consistency = 0.0
+    if total is not None:
+        if subtotal is not None and abs(subtotal + (tax or 0) - total) < 0.015:
+            consistency = 1.0
+        elif items and abs(sum(i["price"] for i in items) + (tax or 0) - total) < 0.015:
+            consistency = 1.0
+        elif subtotal is not None and subtotal > total + 0.015:
+            total_confidence *= 0.5
+
+    tax_rate = None
+    if tax_line:
+        percent = PERCENT_RE.search(tax_line)
+        if percent:
+            tax_rate = float(percent.group(1).replace(",", "."))
+    invoice = INVOICE_RE.search(text)
+    payment = PAYMENT_RE.search(text)
+
+    scores = {"total_amount": total_confidence, "date": date_confidence,
+              "vendor": vendor_confidence, "consistency": consistency}
+    data = {
+        "total_amount": total,
+        "date": receipt_date,
+        "vendor": vendor,
+        "invoice_number": invoice.group(1) if invoice else None,
+        "tax_rate": tax_rate,
+        "tax_amount": tax,
+        "items": items,
+        "payment_method": payment.group(1).title() if payment else None,
+        "business_purpose": None,
+    }
+    confidence = sum(WEIGHTS[name] * score for name, score in scores.items())
+    return ParsedReceipt(data=data, confidence=round(confidence, 3), fields=scores)
@@ -0,0 +1,252 @@
+# backend/app/services/receipt_storage.py
+import hashlib
+import os
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import IO, AsyncIterator, Dict, Optional
+
+from bson import ObjectId
+
+from app.core.settings import settings
+from app.services.image_preprocess import (HASH_BITS, OCR_CONTENT_TYPE,
+                                           THUMBNAIL_CONTENT_TYPE, hamming,
+                                           image_preprocessor)
+from app.utils.helpers import run_blocking
+
+
+async def read_chunks(source: IO[bytes], chunk_size: int) -> AsyncIterator[bytes]:
+    """Read a (possibly disk-backed) upload chunk by chunk off the event loop."""
+    while True:
+        chunk = await run_blocking(None, source.read, chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class ReceiptStore(ABC):
+    """Blob storage for receipt images; metadata lives in ``receipt_files``."""
+
+    @abstractmethod
+    async def save(self, chunks: AsyncIterator[bytes], filename: str,
+                   content_type: Optional[str]) -> Dict:
+        """Store a stream and return its ``blob_id``, ``sha256`` and ``size``."""
+
+    @abstractmethod
+    def stream(self, blob_id: str, start: int = 0,
+               end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield bytes ``start`` through ``end`` (inclusive) of a blob."""
+
+    @abstractmethod
+    async def delete(self, blob_id: str) -> None:
+        """Remove a blob; missing blobs are ignored."""
+
+    @asynccontextmanager
+    async def local_path(self, blob_id: str) -> AsyncIterator[str]:
+        """A file path holding the blob, for readers that need a file.
+
+        By default the blob is streamed into a temporary file that is
+        removed afterwards.
+        """
+        handle = await run_blocking(
+            None, tempfile.NamedTemporaryFile, prefix="receipt-", delete=False)
+        try:
+            async for chunk in self.stream(blob_id):
+                await run_blocking(None, handle.write, chunk)
+            handle.close()
+            yield handle.name
+        finally:
+            handle.close()
+            os.remove(handle.name)
+
+
+class GridFSReceiptStore(ReceiptStore):
+    def __init__(self, db, bucket_name: str = "receipt_images"):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+
+    async def save(self, chunks, filename, content_type):
+        digest, size = hashlib.sha256(), 0
+        upload = self.bucket.open_upload_stream(
+            filename or "receipt", metadata={"contentType": content_type})
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await upload.write(chunk)
+        except BaseException:
+            await upload.abort()
+            raise
+        await upload.close()
+        return {"blob_id": str(upload._id), "sha256": digest.hexdigest(), "size": size}
+
+    async def stream(self, blob_id, start=0, end=None):
+        download = await self.bucket.open_download_stream(ObjectId(blob_id))
+        end = download.length - 1 if end is None else end
+        download.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await download.read(min(remaining, settings.receipt_chunk_size))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def delete(self, blob_id):
+        await self.bucket.delete(ObjectId(blob_id))
+
+
+class LocalReceiptStore(ReceiptStore):
+    """Content-addressed files under ``root``; identical uploads share a blob."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, blob_id: str) -> str:
+        if len(blob_id) != 64 or not all(c in "0123456789abcdef" for c in blob_id):
+            raise FileNotFoundError(blob_id)
+        return os.path.join(self.root, blob_id[:2], blob_id)
+
+    async def save(self, chunks, filename, content_type):
+        os.makedirs(self.root, exist_ok=True)
+        digest, size = hashlib.sha256(), 0
+        temp_path = os.path.join(self.root, f".upload-{uuid.uuid4().hex}")
+        handle = await run_blocking(None, open, temp_path, "wb")
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await run_blocking(None, handle.write, chunk)
+        except BaseException:
+            handle.close()
+            os.remove(temp_path)
+            raise
+        handle.close()
+
+        blob_id = digest.hexdigest()
+        path = self._path(blob_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return {"blob_id": blob_id, "sha256": blob_id, "size": size}
+
+    async def stream(self, blob_id, start=0, end=None):
+        path = self._path(blob_id)
+        handle = await run_blocking(None, open, path, "rb")
+        try:
+            end = os.fstat(handle.fileno()).st_size - 1 if end is None else end
+            handle.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await run_blocking(
+                    None, handle.read, min(remaining, settings.receipt_chunk_size))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            handle.close()
+
+    async def delete(self, blob_id):
+        try:
+            os.remove(self._path(blob_id))
+        except FileNotFoundError:
+            pass
+
+    @asynccontextmanager
+    async def local_path(self, blob_id):
+        yield self._path(blob_id)
+
+
+def get_receipt_store(db) -> ReceiptStore:
+    if settings.receipt_storage == "local":
+        return LocalReceiptStore(settings.receipt_storage_path)
+    return GridFSReceiptStore(db)
+
+
+async def _single_chunk(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+async def _discard(db, store: ReceiptStore, blob_id: str) -> None:
+    # Local blobs are content-addressed and may back another user's record.
+    if not await db.receipt_files.find_one({"blob_id": blob_id}, {"_id": 1}):
+        await store.delete(blob_id)
+
+
+async def find_near_duplicate(db, user_id: str, phash: str) -> Optional[Dict]:
+    """The user's most recent stored receipt whose phash is within range."""
+    max_bits = int(settings.receipt_near_duplicate_distance * HASH_BITS)
+    if not max_bits:
+        return None
+    cursor = db.receipt_files.find(
+        {"user_id": user_id, "phash": {"$exists": True}}
+    ).sort("created_at", -1).limit(1000)
+    async for doc in cursor:
+        if hamming(doc["phash"], phash) <= max_bits:
+            return doc
+    return None
+
+
+async def read_ocr_image(store: ReceiptStore, doc: Dict) -> bytes:
+    """The image to run OCR on for a ``receipt_files`` document: its OCR
+    variant if preprocessing made one, otherwise the original upload."""
+    ocr_variant = doc["variants"].get("ocr")
+    chunks = store.stream(ocr_variant["blob_id"] if ocr_variant else doc["blob_id"])
+    return b"".join([chunk async for chunk in chunks])
+
+
+async def _reuse(db, store: ReceiptStore, existing: Dict, saved: Dict,
+                 duplicate: str) -> Dict:
+    if existing["blob_id"] != saved["blob_id"]:
+        await _discard(db, store, saved["blob_id"])
+    return {**existing, "duplicate": duplicate,
+            "ocr_bytes": await read_ocr_image(store, existing)}
+
+
+async def store_receipt(db, store: ReceiptStore, user_id: str,
+                        source: IO[bytes], filename: str,
+                        content_type: Optional[str]) -> Dict:
+    """Stream an upload into ``store`` and record it in ``receipt_files``.
+
+    The upload is hashed while it is written. If the user already stored
+    the same bytes (sha256) or a near-identical photo (perceptual hash) the
+    new blob is dropped and the existing record returned with ``duplicate``
+    set to "exact" or "near". Thumbnail and OCR images come from the
+    preprocessing pool; ``image_format`` is None if the upload is not an
+    image PIL can read. Returns the ``receipt_files`` document plus
+    ``ocr_bytes`` (the image to run OCR on).
+    """
+    saved = await store.save(read_chunks(source, settings.receipt_chunk_size),
+                             filename, content_type)
+    existing = await db.receipt_files.find_one(
+        {"user_id": user_id, "sha256": saved["sha256"]})
+    if existing:
+        return await _reuse(db, store, existing, saved, "exact")
+
+    # The worker reads the stored blob itself rather than the upload being
+    # read into memory here and pickled over to it.
+    async with store.local_path(saved["blob_id"]) as path:
+        rendered = await image_preprocessor.process(path)
+    phash = rendered.pop("phash", None)
+    image_format = rendered.pop("format", None)
+    if phash:
+        existing = await find_near_duplicate(db, user_id, phash)
+        if existing:
+            return await _reuse(db, store, existing, saved, "near")
+
+    variants = {}
+    for name, image in rendered.items():
+        variant_type = THUMBNAIL_CONTENT_TYPE if name == "thumbnail" else OCR_CONTENT_TYPE
+        variant = await store.save(_single_chunk(image), f"{name}-{filename}", variant_type)
+        variants[name] = {**variant, "content_type": variant_type}
+    doc = {"_id": ObjectId(), "user_id": user_id, "filename": filename,
+           "content_type": content_type, "image_format": image_format,
+           "variants": variants,
+           "created_at": datetime.utcnow(), **saved}
+    if phash:
+        doc["phash"] = phash
+    await db.receipt_files.insert_one(doc)
+    return {**doc, "duplicate": None, "ocr_bytes": rendered.get("ocr") or await read_ocr_image(store, doc)}
@@ -0,0 +1,138 @@
+# backend/app/services/rollup_service.py
+"""Per-user monthly expense rollups.
+
+``expense_rollups`` holds one document per (user_id, month, category) with
+the summed amount, expense count and summed tax. The write paths keep it
+current with ``$inc``; ``rebuild`` reconstructs it from ``expenses``:
+
+    python -m app.services.rollup_service [--user-id <id>]
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+ROLLUP_FIELDS = ("amount", "date", "category", "tax_amount")
+
+
+def month_key(value) -> Optional[str]:
+    """``YYYY-MM`` for a datetime or ISO date string, else None."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m")
+    if isinstance(value, str) and len(value) >= 7:
+        try:
+            return datetime.strptime(value[:7], "%Y-%m").strftime("%Y-%m")
+        except ValueError:
+            return None
+    return None
+
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class RollupService:
+    async def apply(self, db, user_id: str, expense: Dict, sign: int = 1) -> None:
+        """Add (or with ``sign=-1`` remove) one expense from the rollups."""
+        month = month_key(expense.get("date"))
+        if month is None:
+            return
+        await db.expense_rollups.update_one(
+            {"user_id": user_id, "month": month, "category": expense.get("category")},
+            {"$inc": {
+                "amount": sign * _number(expense.get("amount")),
+                "count": sign,
+                "tax_amount": sign * _number(expense.get("tax_amount")),
+            }},
+            upsert=True,
+        )
+        await self.bump_version(db, user_id)
+
+    async def bump_version(self, db, user_id: str) -> None:
+        """Mark the user's expense data as changed (see ``get_version``)."""
+        await db.expense_versions.update_one(
+            {"_id": user_id}, {"$inc": {"version": 1}}, upsert=True)
+
+    async def get_version(self, db, user_id: str) -> int:
+        """Counter bumped on every rollup change; cache keys include it."""
+        doc = await db.expense_versions.find_one({"_id": user_id})
+        return doc["version"] if doc else 0
+
+    async def apply_update(self, db, user_id: str, before: Dict, after: Dict) -> None:
+        """Move an edited expense's contribution from its old to its new values."""
+        if all(before.get(field) == after.get(field) for field in ROLLUP_FIELDS):
+            return
+        await self.apply(db, user_id, before, sign=-1)
+        await self.apply(db, user_id, after)
+
+    async def rebuild(self, db, user_id: Optional[str] = None) -> int:
+        """Recompute rollups from raw expenses, one user at a time.
+
+        Returns the number of rollup documents written.
+        """
+        query = {"user_id": user_id} if user_id else {}
+        projection = {"user_id": 1, **{field: 1 for field in ROLLUP_FIELDS}}
+        cursor = db.expenses.find(query, projection).sort("user_id", 1)
+
+        written = 0
+        current_user = None
+        totals: Dict[Tuple[str, Optional[str]], List[float]] = defaultdict(
+            lambda: [0.0, 0, 0.0])
+        async for expense in cursor:
+            if expense.get("user_id") != current_user:
+                if current_user is not None:
+                    written += await self._replace(db, current_user, totals)
+                current_user = expense.get("user_id")
+                totals.clear()
+            month = month_key(expense.get("date"))
+            if month is None:
+                continue
+            row = totals[(month, expense.get("category"))]
+            row[0] += _number(expense.get("amount"))
+            row[1] += 1
+            row[2] += _number(expense.get("tax_amount"))
+        if current_user is not None:
+            written += await self._replace(db, current_user, totals)
+        elif user_id:
+            await self._replace(db, user_id, {})
+        return written
+
+    async def _replace(self, db, user_id: str, totals: Dict) -> int:
+        await db.expense_rollups.delete_many({"user_id": user_id})
+        await self.bump_version(db, user_id)
+        if not totals:
+            return 0
+        await db.expense_rollups.insert_many([
+            {"user_id": user_id, "month": month, "category": category,
+             "amount": amount, "count": count, "tax_amount": tax}
+            for (month, category), (amount, count, tax) in totals.items()
+        ])
+        return len(totals)
+
+    async def get_rollups(self, db, user_id: str) -> List[Dict]:
+        """All non-empty rollup rows for a user, oldest month first."""
+        cursor = db.expense_rollups.find(
+            {"user_id": user_id, "count": {"$gt": 0}},
+            {"_id": 0, "month": 1, "category": 1, "amount": 1, "count": 1,
+             "tax_amount": 1},
+        ).sort("month", 1)
+        return await cursor.to_list(length=None)
+
+
+async def _main(args) -> None:
+    from app.core.database import DATABASE_NAME, create_client
+
+    client = create_client()
+    written = await RollupService().rebuild(client[DATABASE_NAME], args.user_id)
+    print(f"Rebuilt {written} rollup rows")
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild expense rollups")
+    parser.add_argument("--user-id", help="only rebuild this user's rollups")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,66 @@
+# backend/app/services/tax_rates.py
+import csv
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class TaxRateTable:
+    """Sales-tax rates loaded from a CSV file and indexed in memory.
+
+    The file has ``state,zip,rate`` columns with ``rate`` as a decimal
+    fraction. Rows with a blank ``zip`` give the statewide rate; rows with a
+    ZIP code override it for that ZIP. The file is re-read when it changes,
+    checked at most every ``refresh_interval`` seconds.
+    """
+
+    def __init__(self, path: str, refresh_interval: float = 3600):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._state_rates: Dict[str, float] = {}
+        self._zip_rates: Dict[Tuple[str, str], float] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        state_rates, zip_rates = {}, {}
+        with open(self.path, newline="") as rate_file:
+            for row in csv.DictReader(rate_file):
+                state = row["state"].strip().upper()
+                zip_code = (row.get("zip") or "").strip()[:5]
+                rate = float(row["rate"])
+                if zip_code:
+                    zip_rates[(state, zip_code)] = rate
+                else:
+                    state_rates[state] = rate
+        # Swap both indexes at once so lookups never see a half-loaded table.
+        self._state_rates, self._zip_rates = state_rates, zip_rates
+        self._mtime = os.path.getmtime(self.path)
+        self._checked_at = time.monotonic()
+
+    def maybe_refresh(self) -> None:
+        if time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            self._checked_at = time.monotonic()
+            try:
+                if os.path.getmtime(self.path) != self._mtime:
+                    self.load()
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Keeping previous tax rates, reload failed: {e}")
+
+    def lookup(self, state: str, zip_code: Optional[str] = None) -> Optional[float]:
+        """Rate for a ZIP if one is listed, else the statewide rate, else None."""
+        self.maybe_refresh()
+        state = state.strip().upper()
+        if zip_code:
+            rate = self._zip_rates.get((state, zip_code.strip()[:5]))
+            if rate is not None:
+                return rate
+        return self._state_rates.get(state)
@@ -1,44 +1,189 @@
 # backend/app/services/tax_service.py
-from datetime import datetime
-from typing import Dict, List
+import asyncio
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
-import taxjar
+import numpy as np
+from app.core.metrics import span
 from app.core.settings import settings
+from app.services.alert_engine import AlertEngine
+from app.services.tax_rates import TaxRateTable
+from app.utils.cache import TTLCache
+from app.utils.helpers import run_blocking
 
 
 class TaxService:
-    def __init__(self):
-        self.client = taxjar.Client(api_key=settings.taxjar_api_key)
-
-    async def get_tax_alerts(self) -> List[Dict]:
-        """Get tax law changes and filing deadlines."""
-        # This is a mock implementation - TaxJar doesn't actually provide this
-        # You'd want to implement your own tax alert system or use a different API
-        current_month = datetime.now().month
-        alerts = []
-
-        if current_month == 3:
-            alerts.append({
-                "type": "deadline",
-                "message": "Q1 estimated tax payment due April 15",
-                "due_date": "2024-04-15"
-            })
-
-        return alerts
-
-    async def calculate_tax_liability(self, amount: float, state: str) -> Dict:
-        """Calculate sales tax for a given amount and location."""
+    def __init__(self, rate_table: Optional[TaxRateTable] = None, client=None):
+        self.rates = rate_table or TaxRateTable(
+            settings.tax_rates_path, settings.tax_rates_refresh_interval)
+
+        # TaxJar is only a fallback for jurisdictions missing from the table
+        if client is None and settings.taxjar_api_key:
+            import taxjar
+
+            client = taxjar.Client(api_key=settings.taxjar_api_key)
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="taxjar")
+        self.fallback_cache = TTLCache(maxsize=10000, ttl=settings.taxjar_cache_ttl)
+        self.alerts = AlertEngine(settings.tax_alert_rules_path)
+
+    async def get_tax_alerts(
+        self,
+        user_id: str,
+        version: int,
+        load_rollups: Callable[[], Awaitable[List[Dict]]],
+        days: int = 30,
+        today: Optional[date] = None
+    ) -> List[Dict]:
+        """Get upcoming filing deadlines and alerts triggered by the user's expenses."""
+        return await self.alerts.user_alerts(
+            user_id, version, load_rollups, today or date.today(), days)
+
+    async def get_rate(self, state: str, zip_code: Optional[str] = None,
+                       amount: float = 100.0) -> Tuple[float, str]:
+        """Resolve a sales-tax rate and report where it came from.
+
+        The local table answers known jurisdictions; anything else goes to
+        TaxJar off the event loop and is cached. Raises ``LookupError`` when
+        no rate can be found.
+        """
+        rate = self.rates.lookup(state, zip_code)
+        if rate is not None:
+            return rate, "local"
+
+        key = (state.strip().upper(), (zip_code or "").strip()[:5])
+        rate = self.fallback_cache.get(key)
+        if rate is not None:
+            return rate, "taxjar"
+        if self.client is None:
+            raise LookupError(f"No tax rate known for {state} {zip_code or ''}".strip())
+
+        import taxjar
+
+        order = {
+            'from_country': 'US',
+            'from_state': state,
+            'to_country': 'US',
+            'to_state': state,
+            'amount': amount,
+            'shipping': 0
+        }
+        if zip_code:
+            order['to_zip'] = zip_code
         try:
-            tax = self.client.tax_for_order({
-                'from_country': 'US',
-                'from_state': state,
-                'amount': amount,
-                'shipping': 0
-            })
-            return {
-                "amount": amount,
-                "tax_amount": tax.amount_to_collect,
-                "tax_rate": tax.rate
-            }
+            with span("taxjar"):
+                tax = await run_blocking(self.executor, self.client.tax_for_order, order,
+                                         timeout=settings.taxjar_timeout)
+        except asyncio.TimeoutError:
+            raise LookupError("Timed out waiting for TaxJar")
         except taxjar.exceptions.TaxJarError as e:
+            raise LookupError(str(e))
+        self.fallback_cache.set(key, tax.rate)
+        return tax.rate, "taxjar"
+
+    async def calculate_tax_liability(self, amount: float, state: str,
+                                      zip_code: Optional[str] = None) -> Dict:
+        """Calculate sales tax for a given amount and location."""
+        try:
+            rate, source = await self.get_rate(state, zip_code, amount)
+        except LookupError as e:
             return {"error": str(e)}
+        return {
+            "amount": amount,
+            "tax_amount": round(amount * rate, 2),
+            "tax_rate": rate,
+            "source": source
+        }
+
+    async def calculate_tax_liabilities(self, rows: List) -> List[Dict]:
+        """Calculate sales tax for many ``(amount, state[, zip, category])`` rows.
+
+        Rows are grouped by jurisdiction so each rate is resolved once, then
+        tax is computed for all rows with one vectorized multiply. Invalid
+        rows get an ``error`` instead of failing the whole request.
+        """
+        results = []
+        async for chunk in self.iter_tax_liabilities(rows):
+            results.extend(chunk)
+        return results
+
+    async def iter_tax_liabilities(self, rows: List,
+                                   chunk_size: int = 500) -> AsyncIterator[List[Dict]]:
+        """``calculate_tax_liabilities`` one chunk of rows at a time, for streaming."""
+        for start in range(0, len(rows), chunk_size):
+            yield await self._calculate_chunk(rows[start:start + chunk_size])
+
+    async def _calculate_chunk(self, rows: List) -> List[Dict]:
+        amounts = np.zeros(len(rows))
+        keys, errors = [], {}
+        for i, row in enumerate(rows):
+            try:
+                amounts[i], state, zip_code = parse_tax_row(row)
+            except ValueError as e:
+                errors[i] = f"Invalid row: {e}"
+                state, zip_code = "", ""
+            keys.append(f"{state}|{zip_code}")
+
+        jurisdictions, inverse = np.unique(np.array(keys), return_inverse=True)
+        rates = np.full(len(jurisdictions), np.nan)
+        sources, lookup_errors = [None] * len(jurisdictions), {}
+        for j, key in enumerate(jurisdictions):
+            state, zip_code = key.split("|")
+            if not state:
+                continue
+            try:
+                rates[j], sources[j] = await self.get_rate(state, zip_code or None)
+            except LookupError as e:
+                lookup_errors[j] = str(e)
+
+        row_rates = rates[inverse]
+        tax_amounts = np.round(amounts * row_rates, 2)
+
+        results = []
+        for i, row in enumerate(rows):
+            j = inverse[i]
+            error = errors.get(i) or lookup_errors.get(j)
+            fields = row if isinstance(row, dict) else {}
+            result = {"amount": fields.get("amount"), "state": fields.get("state"),
+                      "zip": fields.get("zip"), "category": fields.get("category")}
+            if error:
+                result["error"] = error
+            else:
+                result.update({
+                    "amount": float(amounts[i]),
+                    "tax_amount": float(tax_amounts[i]),
+                    "tax_rate": float(row_rates[i]),
+                    "source": sources[j],
+                })
+            results.append(result)
+        return results
+
+
+def parse_tax_row(row) -> Tuple[float, str, str]:
+    """``(amount, STATE, zip5)`` of a bulk row; raises ``ValueError`` if invalid."""
+    if not isinstance(row, dict):
+        raise ValueError("row must be an object")
+    if "amount" not in row:
+        raise ValueError("amount is required")
+    amount = row["amount"]
+    if isinstance(amount, bool) or not isinstance(amount, (int, float, str)):
+        raise ValueError("amount must be a number")
+    try:
+        amount = float(amount)
+    except ValueError:
+        raise ValueError("amount must be a number")
+    if not math.isfinite(amount):
+        raise ValueError("amount must be finite")
+
+    state = row.get("state")
+    if state is None or (isinstance(state, str) and not state.strip()):
+        raise ValueError("state is required")
+    if not isinstance(state, str):
+        raise ValueError("state must be a string")
+
+    zip_code = row.get("zip")
+    if zip_code is not None and not isinstance(zip_code, (str, int)):
+        raise ValueError("zip must be a string")
+    return amount, state.strip().upper(), str(zip_code or "").strip()[:5]
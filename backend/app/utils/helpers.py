@@ -1 +1,56 @@
- 
+# backend/app/utils/helpers.py
+import asyncio
+import base64
+import json
+from concurrent.futures import Executor
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Optional
+
+from bson import ObjectId
+
+
+async def run_blocking(
+    executor: Optional[Executor],
+    func: Callable,
+    *args,
+    timeout: Optional[float] = None,
+    **kwargs
+) -> Any:
+    """Run a blocking callable on an executor so the event loop stays free.
+
+    On timeout the awaiting coroutine gets ``asyncio.TimeoutError``; the worker
+    thread itself cannot be interrupted and finishes in the background.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, partial(func, *args, **kwargs))
+    if timeout is None:
+        return await future
+    return await asyncio.wait_for(future, timeout)
+
+
+def encode_cursor(date: Any, object_id: ObjectId) -> str:
+    """Build an opaque continuation token for a (date, _id) keyset position."""
+    if isinstance(date, datetime):
+        position = {"d": date.isoformat(), "t": "datetime"}
+    else:
+        position = {"d": date, "t": "raw"}
+    position["i"] = str(object_id)
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple:
+    """Inverse of ``encode_cursor``; raises ``ValueError`` on a malformed token."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        position = json.loads(raw)
+        date = position["d"]
+        if position["t"] == "datetime":
+            date = datetime.fromisoformat(date)
+        elif not isinstance(date, (str, int, float, type(None))):
+            # Only scalars: a document here would end up inside the query
+            raise TypeError("Cursor date must be a scalar")
+        return date, ObjectId(position["i"])
+    except Exception as err:
+        raise ValueError("Invalid cursor") from err
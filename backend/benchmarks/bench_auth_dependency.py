@@ -0,0 +1,98 @@
+# backend/benchmarks/bench_auth_dependency.py
+"""Per-request cost of the get_current_user dependency, before and after caching.
+
+"before" reproduces the original dependency: a JWT signature check plus two
+users.find_one calls on every request. "after" is app.api.deps.get_current_user
+with its token and user caches. Use --uri to run against a real mongod instead
+of the in-memory mongomock stand-in.
+
+    python -m benchmarks.bench_auth_dependency --requests 5000
+"""
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+
+from benchmarks.common import summarize
+
+
+async def legacy_get_current_user(token, db, jwt, settings, User):
+    payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
+    user_name = payload.get("sub")
+    user_data = await db.users.find_one({"username": "manoj_panda"})
+    user_data = await db.users.find_one({"username": user_name})
+    return User(id=str(user_data["_id"]), username=str(user_data["username"]),
+                password=str(user_data["hashed_password"]))
+
+
+async def measure(call, requests: int):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def run(args):
+    from jose import jwt
+    from app.api import deps
+    from app.core.security import create_access_token
+    from app.core.settings import settings
+    from app.models.user import User
+
+    if args.uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.uri)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    db = client.taxBusiness_bench
+    await db.users.delete_many({})
+    await db.users.insert_many(
+        [{"username": f"user{i}", "hashed_password": "x"} for i in range(1000)]
+        + [{"username": "manoj_panda", "hashed_password": "x"}])
+
+    tokens = [create_access_token({"sub": f"user{i}"}, timedelta(minutes=30))
+              for i in range(args.users)]
+
+    def cycle():
+        index = 0
+
+        def next_token():
+            nonlocal index
+            index += 1
+            return tokens[index % len(tokens)]
+        return next_token
+
+    before_token = cycle()
+    before = await measure(
+        lambda: legacy_get_current_user(before_token(), db, jwt, settings, User),
+        args.requests)
+
+    deps.token_cache.clear()
+    deps.user_cache.clear()
+    after_token = cycle()
+    after = await measure(
+        lambda: deps.get_current_user(after_token(), db), args.requests)
+
+    print(f"users={args.users} requests={args.requests} "
+          f"backend={'mongod' if args.uri else 'mongomock'}")
+    print(summarize("before (decode + 2 lookups)", before))
+    print(summarize("after (cached)", after))
+    print(f"token cache {deps.token_cache.stats()} user cache {deps.user_cache.stats()}")
+    if args.uri:
+        await db.users.delete_many({})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50,
+                        help="distinct tokens cycled through")
+    parser.add_argument("--uri", help="MongoDB URI; defaults to mongomock")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# backend/benchmarks/bench_forecast_columns.py
+"""Time and memory of the in-memory forecasting path: DataFrame vs columns.
+
+Synthetic expense documents (ObjectId, item list, vendor and notes, like
+stored receipts) are BSON-encoded once, so each path pays the driver's
+decoding cost for what it fetches:
+
+* ``dataframe``: whole documents, ``pd.DataFrame``, ``pd.to_datetime``,
+  a monthly ``pd.Grouper`` and a category groupby, plus the sklearn fit
+  (the previous ``ForecastService`` code);
+* ``columns``: documents projected to ``amount``/``date``/``category``,
+  decoded into NumPy columns by ``ColumnDecoder`` and grouped with
+  ``np.bincount``.
+
+Every run is a forked child (Linux), timed and measured by how far its peak
+RSS grows past what it inherited, NumPy and pandas buffers included.
+
+    python -m benchmarks.bench_forecast_columns --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import time
+from datetime import datetime, timedelta
+
+import bson
+import numpy as np
+
+from benchmarks.common import summarize
+
+CATEGORIES = ["Travel", "Meals", "Software", "Equipment", "Office", "Utilities",
+              "Rent", "Marketing", "Insurance", "Fees", None]
+
+
+def encode_expenses(count: int, rng, chunk: int = 50000):
+    """BSON for ``count`` whole expense documents and for their projection."""
+    start = datetime(2019, 1, 1)
+    full, projected = bytearray(), bytearray()
+    for offset in range(0, count, chunk):
+        size = min(chunk, count - offset)
+        amounts = rng.gamma(2.0, 40.0, size).round(2)
+        days = rng.integers(0, 5 * 365, size)
+        categories = rng.integers(0, len(CATEGORIES), size)
+        for j in range(size):
+            i, amount = offset + j, float(amounts[j])
+            category = CATEGORIES[categories[j]]
+            document = {
+                "_id": bson.ObjectId(), "user_id": "bench", "amount": amount,
+                "date": start + timedelta(days=int(days[j])), "category": category,
+                "vendor": f"Vendor {i % 500}", "description": f"Receipt {i} for {category}",
+                "items": [{"name": "Item A", "price": amount / 2, "quantity": 1},
+                          {"name": "Item B", "price": amount / 2, "quantity": 1}],
+                "tax_amount": amount * 0.08, "receipt_image": f"receipts/{i}.jpg",
+            }
+            full += bson.encode(document)
+            projected += bson.encode({"amount": amount, "date": document["date"],
+                                      "category": category})
+    return bytes(full), bytes(projected)
+
+
+def dataframe_path(payload: bytes):
+    import pandas as pd
+    from sklearn.linear_model import LinearRegression
+
+    df = pd.DataFrame(bson.decode_all(payload))
+    df['date'] = pd.to_datetime(df['date'])
+    total = df['amount'].sum()
+    avg_monthly = df.groupby(pd.Grouper(key='date', freq='ME'))['amount'].sum().mean()
+    top = df.groupby('category')['amount'].agg(['sum', 'mean']).nlargest(3, 'sum')
+    X = np.arange(len(df)).reshape(-1, 1)
+    model = LinearRegression().fit(X, df['amount'].values)
+    model.predict(np.arange(len(df), len(df) + 3).reshape(-1, 1))
+    return total, avg_monthly, top.to_dict('index')
+
+
+def columns_path(service, payload: bytes, batch_size: int):
+    from app.services.expense_columns import ColumnDecoder
+
+    decoder = ColumnDecoder()
+    documents = bson.decode_iter(payload)
+    while True:
+        batch = [document for _, document in zip(range(batch_size), documents)]
+        if not batch:
+            break
+        decoder.add(batch)
+    columns = decoder.finish()
+    insights = asyncio.run(service.get_cash_flow_insights_from_columns(columns))
+    asyncio.run(service.predict_tax_liability_from_columns(columns))
+    return (insights["total_expenses"], insights["average_monthly"],
+            insights["top_expense_categories"])
+
+
+def run_in_child(func):
+    """``(seconds, peak RSS growth in bytes, result)`` of ``func``, run in a
+    forked child so memory one run leaves behind cannot skew the next.
+    ``None`` if the child dies, e.g. killed for running out of memory."""
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+
+    def child():
+        with open("/proc/self/statm") as statm:
+            rss_before = int(statm.read().split()[1]) * resource.getpagesize()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        queue.put((elapsed, peak - rss_before, result))
+
+    process = context.Process(target=child)
+    process.start()
+    process.join()
+    return queue.get() if process.exitcode == 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    # Imported before forking so no child pays for it
+    import pandas  # noqa: F401
+    import sklearn.linear_model  # noqa: F401
+
+    from app.services.forecast_service import ForecastService
+
+    service = ForecastService()
+    rng = np.random.default_rng(7)
+    for size in args.sizes:
+        full, projected = encode_expenses(size, rng)
+        print(f"expenses={size} fetched={len(full) / 2**20:.1f}MB whole, "
+              f"{len(projected) / 2**20:.1f}MB projected")
+        paths = {
+            "dataframe": lambda: dataframe_path(full),
+            "columns": lambda: columns_path(service, projected, args.batch_size),
+        }
+        results, means = {}, {}
+        for label, path in paths.items():
+            runs = [run_in_child(path) for _ in range(args.repeat)]
+            if None in runs:
+                print(f"  {label:<26} died (out of memory?)")
+                continue
+            samples = [elapsed for elapsed, _, _ in runs]
+            means[label], results[label] = sum(samples) / len(samples), runs[0][2]
+            peak = max(peak for _, peak, _ in runs)
+            print(f"{summarize('  ' + label, samples)} peak_rss=+{peak / 2**20:.0f}MB")
+
+        if len(results) == 2:
+            expected, actual = results["dataframe"], results["columns"]
+            assert abs(expected[0] - actual[0]) < 1e-6 * size
+            assert list(expected[2]) == list(actual[2])
+            print(f"  speedup: {means['dataframe'] / means['columns']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# backend/benchmarks/bench_forecast_fit.py
+"""Forecast fit time versus history length.
+
+Compares the per-request linear fit on every expense row
+(predict_tax_liability) with the monthly ForecastEngine fit, including its
+backtest model selection, and with a cached lookup.
+
+    python -m benchmarks.bench_forecast_fit --expenses-per-month 40
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.common import summarize
+
+
+def timed(func, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--months", type=int, nargs="+", default=[12, 36, 120, 360])
+    parser.add_argument("--expenses-per-month", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from app.services.forecast_service import ForecastService
+
+    service = ForecastService()
+    rng = np.random.default_rng(7)
+    for months in args.months:
+        expenses = [
+            {"amount": float(rng.gamma(2.0, 40.0)),
+             "date": datetime(2000, 1, 1) + timedelta(days=30 * m + int(d))}
+            for m in range(months)
+            for d in rng.integers(0, 28, args.expenses_per_month)
+        ]
+        rollups = [
+            {"month": f"{2000 + m // 12:04d}-{m % 12 + 1:02d}", "category": "c",
+             "amount": float(rng.gamma(2.0, 40.0)) * args.expenses_per_month,
+             "count": args.expenses_per_month, "tax_amount": 0.0}
+            for m in range(months)
+        ]
+
+        async def load():
+            return rollups
+
+        legacy = timed(lambda: asyncio.run(service.predict_tax_liability(expenses)),
+                       args.repeat)
+        engine = timed(lambda: service.fit_rollups(rollups), args.repeat)
+        asyncio.run(service.predict_tax_liability_for_user("bench", months, load))
+        cached = timed(lambda: service._predictions(
+            service.engine.cached("bench", months)), args.repeat)
+
+        print(f"history={months} months ({len(expenses)} expenses), "
+              f"model={service.fit_rollups(rollups).model}")
+        print(summarize("  linear fit per expense", legacy))
+        print(summarize("  engine fit + backtest", engine))
+        print(summarize("  cached lookup", cached))
+
+
+if __name__ == "__main__":
+    main()
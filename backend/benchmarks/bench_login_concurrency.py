@@ -0,0 +1,94 @@
+# backend/benchmarks/bench_login_concurrency.py
+"""Concurrent logins alongside ordinary API traffic.
+
+Fires a burst of /api/auth/token requests while a second client keeps
+calling /api/expenses/list/, and reports latency for both. ``--inline``
+runs bcrypt directly on the event loop (the old behaviour); ``--executor``
+chooses the process or thread pool used by PasswordHasher.
+
+    python -m benchmarks.bench_login_concurrency --logins 64 --rounds 12
+"""
+import argparse
+import asyncio
+import time
+from unittest import mock
+
+from benchmarks.common import summarize
+
+
+async def _inline(executor, func, *args, timeout=None, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def run(args):
+    import httpx
+    from mongomock_motor import AsyncMongoMockClient
+
+    with mock.patch("google.oauth2.service_account.Credentials.from_service_account_file"), \
+            mock.patch("google.cloud.vision.ImageAnnotatorClient"):
+        from app.main import app
+        from app.api import deps
+        from app.core.security import password_hasher
+        from app.models.user import User
+
+    deps.client = AsyncMongoMockClient()
+    password_hasher.executor_kind = args.executor
+    password_hasher.rounds = args.rounds
+    password_hasher.queue_limit = args.queue_limit
+    app.dependency_overrides[deps.get_current_user] = lambda: User(
+        id="bench", username="bench", password="")
+    if args.inline:
+        mock.patch("app.core.security.run_blocking", _inline).start()
+
+    credentials = {"username": "bench", "password": "correct horse"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        await http.post("/api/auth/register", data=credentials)
+
+        async def list_loop(stop: asyncio.Event):
+            samples = []
+            while not stop.is_set():
+                start = time.perf_counter()
+                await http.get("/api/expenses/list/")
+                samples.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+            return samples
+
+        statuses = {}
+
+        async def login():
+            start = time.perf_counter()
+            response = await http.post("/api/auth/token", data=credentials)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            return time.perf_counter() - start
+
+        stop = asyncio.Event()
+        background = asyncio.create_task(list_loop(stop))
+        await asyncio.sleep(0.2)
+        started = time.perf_counter()
+        logins = await asyncio.gather(*(login() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        traffic = await background
+
+    mode = "inline" if args.inline else args.executor
+    print(f"mode={mode} rounds={args.rounds} logins={args.logins} "
+          f"burst={elapsed:.2f}s statuses={statuses}")
+    print(summarize("login", logins))
+    print(summarize("list during burst", traffic))
+    password_hasher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--queue-limit", type=int, default=64)
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--inline", action="store_true",
+                        help="hash on the event loop (pre-executor behaviour)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# backend/benchmarks/bench_metrics_overhead.py
+"""Per-request cost of the metrics middleware and of a ``span``.
+
+A one-route FastAPI app (with a path parameter, so the route template has to
+be resolved) is called directly through ASGI ``--requests`` times with and
+without ``MetricsMiddleware``; the difference is what instrumentation adds
+to every request. Each request also opens ``--spans`` spans.
+
+    python -m benchmarks.bench_metrics_overhead --requests 20000
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import summarize
+
+
+def build_app(instrumented: bool, spans: int):
+    from fastapi import APIRouter, FastAPI
+
+    from app.core.metrics import MetricsMiddleware, span
+
+    app = FastAPI()
+    router = APIRouter()
+
+    @router.get("/items/{item_id}")
+    async def item(item_id: int):
+        for _ in range(spans):
+            with span("bench"):
+                pass
+        return {"id": item_id}
+
+    app.include_router(router, prefix="/api")
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def call(app, item_id: int):
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+             "method": "GET", "scheme": "http", "path": f"/api/items/{item_id}",
+             "raw_path": f"/api/items/{item_id}".encode(), "query_string": b"",
+             "root_path": "", "headers": [], "server": ("bench", 80), "client": None}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def run(args):
+    from app.core.metrics import render_metrics, span
+
+    results = {}
+    for instrumented in (False, True):
+        app = build_app(instrumented, args.spans)
+        for i in range(200):
+            await call(app, i)
+        samples = []
+        for i in range(args.requests):
+            start = time.perf_counter()
+            await call(app, i)
+            samples.append(time.perf_counter() - start)
+        label = "instrumented" if instrumented else "plain"
+        results[label] = samples
+        print(summarize(f"request, {label}", samples))
+
+    plain = sum(results["plain"]) / len(results["plain"])
+    instrumented = sum(results["instrumented"]) / len(results["instrumented"])
+    print(f"middleware overhead: {(instrumented - plain) * 1e6:.1f}us per request "
+          f"({(instrumented - plain) / plain:.1%})")
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        with span("bench"):
+            pass
+    print(f"span: {(time.perf_counter() - start) / args.requests * 1e6:.2f}us each")
+    start = time.perf_counter()
+    text = render_metrics()
+    print(f"render /metrics: {(time.perf_counter() - start) * 1000:.2f}ms, "
+          f"{len(text.splitlines())} lines")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--spans", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
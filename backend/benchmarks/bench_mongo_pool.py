@@ -0,0 +1,87 @@
+# backend/benchmarks/bench_mongo_pool.py
+"""Query latency and connection pool waits for a range of pool sizes.
+
+``--concurrency`` tasks run point reads (the write path's lookups) while a
+few tasks run a full-collection aggregation (an analytics read). Each pool
+size gets its own client built by ``create_client``, so the pool listener
+reports how long checkouts waited. Needs a real mongod (pool events are not
+emitted by mongomock):
+
+    python -m benchmarks.bench_mongo_pool --uri mongodb://localhost:27017 \
+        --pool-sizes 5,20,100 --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import summarize
+
+
+def pool_wait_totals():
+    """(checkouts, seconds waited) so far, over all servers."""
+    from app.core.metrics import pool_wait
+
+    with pool_wait.lock:
+        return (sum(sum(series[:-1]) for series in pool_wait.series.values()),
+                sum(series[-1] for series in pool_wait.series.values()))
+
+
+async def run_pool_size(args, pool_size: int):
+    from app.core.database import create_client
+
+    client = create_client(args.uri, maxPoolSize=pool_size)
+    collection = client.taxBusiness_bench.pool
+    if await collection.estimated_document_count() < args.documents:
+        await collection.drop()
+        await collection.insert_many([{"_id": i, "user_id": f"u{i % 100}", "amount": i}
+                                      for i in range(args.documents)])
+    waits_before, seconds_before = pool_wait_totals()
+
+    latencies = []
+    deadline = time.perf_counter() + args.duration
+
+    async def point_reads(worker: int):
+        i = worker
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await collection.find_one({"_id": i % args.documents})
+            latencies.append(time.perf_counter() - start)
+            i += args.concurrency
+
+    async def analytics():
+        while time.perf_counter() < deadline:
+            await collection.aggregate([
+                {"$group": {"_id": "$user_id", "total": {"$sum": "$amount"}}}
+            ]).to_list(length=None)
+
+    await asyncio.gather(*(point_reads(w) for w in range(args.concurrency)),
+                         *(analytics() for _ in range(args.analytics)))
+    waits, seconds = pool_wait_totals()
+    waits, seconds = waits - waits_before, seconds - seconds_before
+    client.close()
+
+    print(f"maxPoolSize={pool_size} reads={len(latencies)} "
+          f"throughput={len(latencies) / args.duration:.0f}/s "
+          f"pool_wait_mean={seconds / max(waits, 1) * 1000:.2f}ms over {waits} checkouts")
+    print(summarize(f"find_one, pool {pool_size}", latencies))
+
+
+async def run(args):
+    for pool_size in (int(size) for size in args.pool_sizes.split(",")):
+        await run_pool_size(args, pool_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", required=True)
+    parser.add_argument("--pool-sizes", default="5,20,100")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--analytics", type=int, default=4,
+                        help="concurrent aggregation loops competing for the pool")
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--duration", type=float, default=5.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
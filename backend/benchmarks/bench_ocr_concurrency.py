@@ -0,0 +1,101 @@
+# backend/benchmarks/bench_ocr_concurrency.py
+"""Measure /api/expenses/list/ latency while receipt uploads are in flight.
+
+OCR and the LLM are the ``stub`` backends, which block their calling thread
+for a fixed latency, which is what the real synchronous SDKs do. With
+``--inline`` the stubs are called directly on the event loop (the old
+behaviour) so the two runs can be compared.
+
+    python -m benchmarks.bench_ocr_concurrency --uploads 16 --vision-latency 0.4
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from unittest import mock
+
+from benchmarks.common import summarize
+
+
+async def _inline(executor, func, *args, timeout=None, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def run(args):
+    import httpx
+    from mongomock_motor import AsyncMongoMockClient
+
+    from app.main import app
+    from app.api import deps
+    from app.core.settings import settings
+    from app.models.user import User
+    from app.services.ocr_backends import StubLLM, StubOCR
+    from app.services.ocr_service import OCRService
+
+    # GridFS needs a real Motor database; mongomock has none
+    settings.receipt_storage = "local"
+    settings.receipt_storage_path = tempfile.mkdtemp(prefix="bench-receipts-")
+    deps.client = AsyncMongoMockClient()
+    db = deps.client.taxBusiness
+    await db.expenses.insert_many([
+        {"user_id": "bench", "amount": float(i), "date": "2024-01-01"}
+        for i in range(50)
+    ])
+    app.dependency_overrides[deps.get_current_user] = lambda: User(
+        id="bench", username="bench", password="")
+
+    ocr_service = OCRService(ocr=StubOCR(args.vision_latency),
+                             llm=StubLLM(args.gemini_latency))
+    app.dependency_overrides[deps.get_ocr_service] = lambda: ocr_service
+    patcher = mock.patch("app.services.ocr_service.run_blocking", _inline)
+    if args.inline:
+        patcher.start()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        async def list_loop(duration: float):
+            samples = []
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await http.get("/api/expenses/list/")
+                samples.append(time.perf_counter() - start)
+                await asyncio.sleep(args.interval)
+            return samples
+
+        async def upload(i: int):
+            # Distinct bytes per upload so the OCR result cache never answers.
+            payload = b"\xff\xd8" * 1024 + i.to_bytes(4, "big")
+            await http.post("/api/expenses/upload-receipt/",
+                            files={"file": ("r.jpg", payload, "image/jpeg")})
+
+        idle = await list_loop(args.duration)
+        started = time.perf_counter()
+        busy, *_ = await asyncio.gather(
+            list_loop(args.duration),
+            *(upload(i) for i in range(args.uploads)),
+        )
+        elapsed = time.perf_counter() - started
+
+    if args.inline:
+        patcher.stop()
+    mode = "inline (blocking)" if args.inline else "executor"
+    print(f"mode={mode} uploads={args.uploads} upload phase={elapsed:.2f}s")
+    print(summarize("list, no uploads", idle))
+    print(summarize("list, uploads in flight", busy))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=16)
+    parser.add_argument("--vision-latency", type=float, default=0.3)
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--inline", action="store_true",
+                        help="call the stubs on the event loop (pre-executor behaviour)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
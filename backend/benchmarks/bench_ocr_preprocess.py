@@ -0,0 +1,130 @@
+# backend/benchmarks/bench_ocr_preprocess.py
+"""Measure bytes sent to OCR and upload latency with preprocessing on and off.
+
+Synthetic phone photos (a receipt on a dark table) are uploaded through
+/api/expenses/upload-receipt/. A share of them are re-encoded or rescaled
+copies of earlier photos, which the perceptual hash should skip. The OCR
+stub records the payload size and sleeps ``--vision-latency`` plus the time
+the payload would take at ``--uplink-mbps``.
+
+    python -m benchmarks.bench_ocr_preprocess --photos 12
+    python -m benchmarks.bench_ocr_preprocess --photos 12 --no-preprocess
+"""
+import argparse
+import asyncio
+import io
+import random
+import tempfile
+import time
+
+from benchmarks.common import summarize
+from app.services.ocr_backends import StubLLM, StubOCR
+
+
+class MeteredOCR(StubOCR):
+    """The stub OCR backend, also paying for uploading the image."""
+
+    def __init__(self, latency: float, uplink_mbps: float):
+        super().__init__(latency)
+        self.uplink = uplink_mbps * 1e6 / 8
+        self.payloads = []
+
+    def recognize(self, image_content):
+        self.payloads.append(len(image_content))
+        time.sleep(len(image_content) / self.uplink)
+        return super().recognize(image_content)
+
+
+def receipt_photo(seed: int, width: int = 3024, height: int = 4032) -> bytes:
+    from PIL import Image, ImageDraw, ImageFont
+
+    rnd = random.Random(seed)
+    scale = width / 3024
+    image = Image.new("RGB", (width, height), (70, 58, 45))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((900 * scale, 400 * scale, 2100 * scale, 3600 * scale),
+                   fill=(246, 244, 238))
+    font = ImageFont.load_default(size=int(56 * scale))
+    for line in range(30):
+        draw.text((980 * scale, (480 + line * 100) * scale),
+                  f"ITEM {rnd.randint(0, 9999):04d}   {rnd.random() * 100:6.2f}",
+                  fill=(20, 20, 20), font=font)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def near_copy(photo: bytes, seed: int) -> bytes:
+    """What a messaging app does to a photo: downscale and recompress."""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(photo))
+    factor = 0.5 + (seed % 3) * 0.15
+    image = image.resize((int(image.width * factor), int(image.height * factor)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=70)
+    return buffer.getvalue()
+
+
+async def run(args):
+    import httpx
+    from mongomock_motor import AsyncMongoMockClient
+
+    from app.main import app
+    from app.api import deps
+    from app.core.settings import settings
+    from app.models.user import User
+    from app.services.image_preprocess import image_preprocessor
+    from app.services.ocr_service import OCRService
+
+    settings.receipt_storage = "local"
+    settings.receipt_storage_path = tempfile.mkdtemp(prefix="bench-receipts-")
+    image_preprocessor.enabled = not args.no_preprocess
+    deps.client = AsyncMongoMockClient()
+    app.dependency_overrides[deps.get_current_user] = lambda: User(
+        id="bench", username="bench", password="")
+    vision = MeteredOCR(args.vision_latency, args.uplink_mbps)
+    ocr_service = OCRService(ocr=vision, llm=StubLLM(args.gemini_latency))
+    app.dependency_overrides[deps.get_ocr_service] = lambda: ocr_service
+
+    originals = [receipt_photo(i) for i in range(args.photos)]
+    uploads = list(originals)
+    for i in range(int(args.photos * args.duplicate_share)):
+        uploads.append(near_copy(originals[i], i))
+    uploaded_bytes = sum(len(photo) for photo in uploads)
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 timeout=None) as http:
+        for i, photo in enumerate(uploads):
+            start = time.perf_counter()
+            response = await http.post("/api/expenses/upload-receipt/",
+                                       files={"file": (f"r{i}.jpg", photo, "image/jpeg")})
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+    image_preprocessor.shutdown()
+
+    mode = "off" if args.no_preprocess else "on"
+    sent = sum(vision.payloads)
+    print(f"preprocess={mode} uploads={len(uploads)} ocr_calls={len(vision.payloads)} "
+          f"uploaded={uploaded_bytes / 1e6:.2f}MB sent_to_ocr={sent / 1e6:.2f}MB "
+          f"({sent / uploaded_bytes:.1%})")
+    print(summarize(f"upload, preprocess {mode}", latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", type=int, default=12)
+    parser.add_argument("--duplicate-share", type=float, default=0.25,
+                        help="extra uploads that are rescaled copies of earlier photos")
+    parser.add_argument("--vision-latency", type=float, default=0.3)
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--uplink-mbps", type=float, default=20.0)
+    parser.add_argument("--no-preprocess", action="store_true",
+                        help="send photos to OCR unchanged (previous behaviour)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# backend/benchmarks/bench_ocr_throughput.py
+"""Receipts per second through ``OCRService`` with the configured backends.
+
+Defaults to the ``stub`` OCR and LLM backends, whose fixed latencies make
+runs reproducible and free; pass ``--ocr-backend``/``--llm-backend`` to put
+Tesseract, the rule parser or the live Google services under the same load.
+Every receipt has distinct bytes, so the result cache never answers.
+
+    python -m benchmarks.bench_ocr_throughput --receipts 64 --ocr-latency 0.3
+    python -m benchmarks.bench_ocr_throughput --no-rules   # LLM for every receipt
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import summarize
+
+
+async def run(args):
+    from app.core.settings import settings
+    from app.services.image_preprocess import image_preprocessor
+    from app.services.ocr_service import OCRService
+
+    settings.ocr_backend = args.ocr_backend
+    settings.ocr_llm_backend = args.llm_backend
+    settings.ocr_stub_latency = args.ocr_latency
+    settings.ocr_llm_stub_latency = args.llm_latency
+    settings.ocr_rules_parser = not args.no_rules
+    if args.concurrency:
+        settings.ocr_max_concurrency = args.concurrency
+        settings.ocr_max_workers = max(settings.ocr_max_workers, args.concurrency * 2)
+    image_preprocessor.enabled = False
+    service = OCRService()
+
+    latencies, errors = [], 0
+
+    async def one(i: int):
+        nonlocal errors
+        start = time.perf_counter()
+        data = await service.extract_receipt_data(f"receipt-{i}".encode())
+        latencies.append(time.perf_counter() - start)
+        errors += "error" in data
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.receipts)))
+    elapsed = time.perf_counter() - started
+    service.executor.shutdown(wait=False)
+
+    print(f"backends={service.ocr.name}+{service.llm.name} receipts={args.receipts} "
+          f"concurrency={settings.ocr_max_concurrency} errors={errors} "
+          f"elapsed={elapsed:.2f}s throughput={args.receipts / elapsed:.1f}/s")
+    print(summarize("extract", latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--receipts", type=int, default=64)
+    parser.add_argument("--ocr-backend", default="stub")
+    parser.add_argument("--llm-backend", default="stub")
+    parser.add_argument("--ocr-latency", type=float, default=0.3)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="receipts in flight (default: OCR_MAX_CONCURRENCY)")
+    parser.add_argument("--no-rules", action="store_true",
+                        help="skip the rule parser so every receipt reaches the LLM")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
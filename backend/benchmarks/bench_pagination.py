@@ -0,0 +1,93 @@
+# backend/benchmarks/bench_pagination.py
+"""Deep-page latency of /api/expenses/list/: skip/limit versus keyset cursor.
+
+Seeds one user with ``--expenses`` documents and times fetching page
+``--page`` both ways. Numbers are only representative against a real mongod
+(``--uri``); mongomock evaluates every query in Python.
+
+    python -m benchmarks.bench_pagination --uri mongodb://localhost:27017 --page 1000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+from benchmarks.common import summarize
+
+
+async def run(args):
+    import httpx
+    from bson import ObjectId
+
+    with mock.patch("google.oauth2.service_account.Credentials.from_service_account_file"), \
+            mock.patch("google.cloud.vision.ImageAnnotatorClient"):
+        from app.main import app
+        from app.api import deps
+        from app.core.indexes import ensure_indexes
+        from app.models.user import User
+        from app.services.import_service import dedupe_key
+        from app.utils.helpers import encode_cursor
+
+    from app.core.database import create_client
+
+    deps.client = create_client(args.uri or "mongomock://")
+    db = deps.client.taxBusiness
+    await ensure_indexes(db)
+    await db.expenses.delete_many({"user_id": "bench"})
+
+    start_date = datetime(2015, 1, 1)
+    docs = [{
+        "_id": ObjectId(),
+        "user_id": "bench",
+        "amount": round(random.uniform(1, 500), 2),
+        "date": start_date + timedelta(hours=i),
+        "vendor": f"vendor {i % 97}",
+        "category": f"category {i % 7}",
+        "items": [{"name": "item", "price": 1.0, "quantity": 1}] * 5,
+    } for i in range(args.expenses)]
+    for doc in docs:
+        doc["dedupe_key"] = dedupe_key(doc)
+    await db.expenses.insert_many(docs)
+
+    # The keyset token for page N points at the last document of page N - 1.
+    ordered = sorted(docs, key=lambda doc: (doc["date"], doc["_id"]), reverse=True)
+    boundary = ordered[(args.page - 1) * args.limit - 1]
+    token = encode_cursor(boundary["date"], boundary["_id"])
+
+    app.dependency_overrides[deps.get_current_user] = lambda: User(
+        id="bench", username="bench", password="")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        async def timed(params):
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = await http.get("/api/expenses/list/", params=params)
+                samples.append(time.perf_counter() - start)
+                response.raise_for_status()
+            return samples
+
+        offset = await timed({"skip": (args.page - 1) * args.limit, "limit": args.limit})
+        keyset = await timed({"cursor": token, "limit": args.limit})
+
+    print(f"expenses={args.expenses} page={args.page} limit={args.limit} "
+          f"backend={'mongod' if args.uri else 'mongomock'}")
+    print(summarize("skip/limit", offset))
+    print(summarize("keyset cursor", keyset))
+    await db.expenses.delete_many({"user_id": "bench"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=20000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--uri", help="MongoDB URI; defaults to mongomock")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# backend/benchmarks/bench_startup.py
+"""Cold-start cost of a worker: time to import ``app.main`` and RSS after it.
+
+Every sample is a fresh interpreter, as on a worker start or autoscale event,
+with no third-party credentials in the environment. ``lazy`` imports the app
+as it boots now; ``eager`` also imports what the endpoint modules used to
+pull in at import time (the OCR, tax and forecast services with Google
+Vision/Gemini, TaxJar, pandas and sklearn), i.e. the previous startup.
+``--importtime`` adds the slowest modules from ``python -X importtime``.
+
+    python -m benchmarks.bench_startup --runs 5 --importtime 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import summarize
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "lazy": ["app.main"],
+    "eager": ["app.main", "app.services.ocr_service", "app.services.tax_service",
+              "app.services.forecast_service", "pandas", "sklearn.linear_model"],
+}
+
+CHILD = """
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({"import": elapsed, "modules": len(sys.modules),
+                  "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def child_env():
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("GOOGLE_CLOUD_CREDENTIALS", "GEMINI_API", "TAXJAR_API_KEY")}
+    env.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+    env.setdefault("JWT_SECRET", "benchmark-secret")
+    env["PYTHONWARNINGS"] = "ignore"
+    return env
+
+
+def sample(modules):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD, *modules], cwd=BACKEND,
+                            env=child_env(), capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    return {**json.loads(result.stdout.strip().splitlines()[-1]), "wall": wall}
+
+
+def slowest_imports(modules, top: int):
+    """(cumulative seconds, module) for the ``top`` slowest imports."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                             "import " + ", ".join(modules)], cwd=BACKEND,
+                            env=child_env(), capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", choices=[*MODES, "both"], default="both")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="also list the N slowest imports per mode")
+    args = parser.parse_args()
+
+    for mode in MODES if args.mode == "both" else [args.mode]:
+        samples = [sample(MODES[mode]) for _ in range(args.runs)]
+        print(summarize(f"import, {mode}", [s["import"] for s in samples]))
+        print(summarize(f"process start, {mode}", [s["wall"] for s in samples]))
+        print("%-28s rss=%.1fMB modules=%d" % (
+            f"worker, {mode}", max(s["rss_mb"] for s in samples), samples[-1]["modules"]))
+        for seconds, name in slowest_imports(MODES[mode], args.importtime):
+            print(f"    {seconds * 1000:9.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# backend/benchmarks/common.py
+"""Shared helpers for the benchmark scripts in this directory.
+
+Run the scripts from ``backend/`` so that ``app`` is importable, e.g.
+``python -m benchmarks.bench_ocr_concurrency``.
+"""
+import os
+import statistics
+from typing import List
+
+# Settings refuse to load without the first two; the credentials are dummies
+# (benchmarks never talk to real services).
+for _name, _value in {
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "JWT_SECRET": "benchmark-secret",
+    "GOOGLE_CLOUD_CREDENTIALS": "/dev/null",
+    "TAXJAR_API_KEY": "benchmark",
+    "GEMINI_API": "benchmark",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``samples``."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(label: str, samples: List[float]) -> str:
+    """Format latency samples (seconds) as a one-line millisecond summary."""
+    return "%-28s n=%-5d p50=%9.3fms p99=%9.3fms max=%9.3fms mean=%9.3fms" % (
+        label,
+        len(samples),
+        percentile(samples, 50) * 1000,
+        percentile(samples, 99) * 1000,
+        max(samples, default=0.0) * 1000,
+        (statistics.fmean(samples) if samples else 0.0) * 1000,
+    )
@@ -1 +1,1273 @@
- 
+# backend/tests/test_api.py
+import asyncio
+import io
+import json
+import os
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+
+for _name in ("MONGODB_URI", "JWT_SECRET", "GOOGLE_CLOUD_CREDENTIALS", "GEMINI_API"):
+    os.environ.setdefault(_name, "test")
+# Image preprocessing on threads so tests never fork a process pool.
+os.environ["OCR_PREPROCESS_EXECUTOR"] = "thread"
+# No API key: TaxService must never reach the real TaxJar during tests.
+os.environ["TAXJAR_API_KEY"] = ""
+
+from mongomock_motor import AsyncMongoMockClient
+
+from app.core.indexes import ensure_indexes
+from app.services.export_service import EXPORT_PROJECTION, export_csv, export_parquet
+from app.services.forecast_service import ForecastService
+from app.services.import_service import ExpenseImporter
+from app.services.receipt_parser import parse_receipt_text
+from app.services.receipt_storage import LocalReceiptStore, store_receipt
+from app.services.rollup_service import RollupService
+from app.services.tax_rates import TaxRateTable
+from app.services.tax_service import TaxService
+
+EXPENSES = [
+    {"user_id": "u1", "amount": 120.0, "date": datetime(2024, 1, 3), "category": "Travel"},
+    {"user_id": "u1", "amount": 45.5, "date": datetime(2024, 1, 20), "category": "Meals"},
+    {"user_id": "u1", "amount": 300.0, "date": datetime(2024, 2, 11), "category": "Equipment"},
+    {"user_id": "u1", "amount": 18.25, "date": datetime(2024, 4, 2), "category": "Meals"},
+    {"user_id": "u1", "amount": 75.0, "date": datetime(2024, 4, 28), "category": "Software"},
+    {"user_id": "u1", "amount": 9.99, "date": datetime(2024, 6, 30), "category": None},
+    {"user_id": "u2", "amount": 999.0, "date": datetime(2024, 3, 1), "category": "Travel"},
+]
+
+
+def seeded_expenses():
+    collection = AsyncMongoMockClient().taxBusiness.expenses
+    asyncio.run(collection.insert_many([dict(expense) for expense in EXPENSES]))
+    return collection
+
+
+def assert_same_insights(actual, expected):
+    assert actual["total_expenses"] == pytest.approx(expected["total_expenses"])
+    assert actual["average_monthly"] == pytest.approx(expected["average_monthly"])
+    assert list(actual["top_expense_categories"]) == list(expected["top_expense_categories"])
+    for category, stats in expected["top_expense_categories"].items():
+        assert actual["top_expense_categories"][category] == pytest.approx(stats)
+
+
+def pandas_cash_flow_insights(service, expenses):
+    """What the original DataFrame implementation returned."""
+    import pandas as pd
+
+    df = pd.DataFrame(expenses)
+    df["date"] = pd.to_datetime(df["date"])
+    top = df.groupby("category")["amount"].agg(["sum", "mean"]).nlargest(3, "sum")
+    return service._cash_flow_insights(
+        df["amount"].sum(),
+        df.groupby(pd.Grouper(key="date", freq="ME"))["amount"].sum().mean(),
+        top.to_dict("index"))
+
+
+def test_cash_flow_insights_aggregation_matches_pandas():
+    service = ForecastService()
+    collection = seeded_expenses()
+    user_expenses = [e for e in EXPENSES if e["user_id"] == "u1"]
+
+    expected = pandas_cash_flow_insights(service, user_expenses)
+    actual = asyncio.run(service.get_cash_flow_insights_from_db(collection, "u1"))
+
+    assert_same_insights(actual, expected)
+    assert_same_insights(asyncio.run(service.get_cash_flow_insights(user_expenses)), expected)
+
+
+def test_columnar_insights_and_predictions_match_pandas():
+    import random
+
+    import pandas as pd
+
+    from app.services.expense_columns import ExpenseColumns, load_expense_columns
+
+    service = ForecastService()
+    collection = seeded_expenses()
+    user_expenses = [e for e in EXPENSES if e["user_id"] == "u1"]
+    user_expenses.append({"amount": 40.0, "date": "2024-02-14", "category": "Travel"})
+    asyncio.run(collection.insert_one({"user_id": "u1", **user_expenses[-1]}))
+
+    columns = asyncio.run(load_expense_columns(collection, {"user_id": "u1"}, batch_size=4))
+    assert columns.amounts.dtype == "float64" and columns.dates.dtype.kind == "M"
+    assert len(columns) == 7 and (columns.category_codes == -1).sum() == 1
+
+    assert_same_insights(asyncio.run(service.get_cash_flow_insights_from_columns(columns)),
+                         pandas_cash_flow_insights(service, user_expenses))
+
+    # Predictions come from monthly totals, empty months included, so the
+    # order the expenses are stored in does not matter
+    df = pd.DataFrame(user_expenses)
+    df["date"] = pd.to_datetime(df["date"])
+    monthly = df.groupby(pd.Grouper(key="date", freq="MS"))["amount"].sum()
+    expected = service._predictions(
+        service.engine.fit(monthly.values, monthly.index[-1].strftime("%Y-%m")))
+    predicted = asyncio.run(service.predict_tax_liability_from_columns(columns))
+    assert predicted["model"] == expected["model"]
+    assert [p["predicted_amount"] for p in predicted["predictions"]] == pytest.approx(
+        [p["predicted_amount"] for p in expected["predictions"]], abs=0.01)
+    shuffled = random.Random(3).sample(user_expenses, len(user_expenses))
+    assert asyncio.run(service.predict_tax_liability(shuffled)) == predicted
+
+    # No usable amount or date: zeros, never NaN (a JSON 500)
+    undated = ExpenseColumns.from_documents(
+        [{"amount": None, "date": datetime(2024, 1, 1), "category": "Meals"},
+         {"amount": 5.0, "date": "not a date", "category": "Meals"}])
+    insights = asyncio.run(service.get_cash_flow_insights_from_columns(undated))
+    predicted = asyncio.run(service.predict_tax_liability_from_columns(undated))
+    json.dumps([insights, predicted], allow_nan=False)
+    assert insights["average_monthly"] == 0.0
+    assert all(p["predicted_amount"] == 0.0 for p in predicted["predictions"])
+
+
+def test_cash_flow_paths_agree_on_string_dates_and_ties():
+    from app.services.expense_columns import load_expense_columns
+
+    service, rollups = ForecastService(), RollupService()
+    db = AsyncMongoMockClient().taxBusiness
+    expenses = [
+        {"user_id": "u1", "amount": 100.0, "date": datetime(2024, 1, 10), "category": "Rent"},
+        {"user_id": "u1", "amount": 50.0, "date": datetime(2024, 3, 5), "category": "Meals"},
+        # As update_collection can leave it
+        {"user_id": "u1", "amount": 30.0, "date": "2024-06-01", "category": "Fees"},
+        {"user_id": "u1", "amount": 20.0, "date": "2024-06-01", "category": "Fees"},
+        {"user_id": "u1", "amount": 50.0, "date": datetime(2024, 2, 1), "category": "Gifts"},
+    ]
+    asyncio.run(db.expenses.insert_many([dict(expense) for expense in expenses]))
+    asyncio.run(rollups.rebuild(db, "u1"))
+
+    aggregate = asyncio.run(service.get_cash_flow_insights_from_db(db.expenses, "u1"))
+    in_memory = asyncio.run(service.get_cash_flow_insights(expenses))
+    columns = asyncio.run(service.get_cash_flow_insights_from_columns(
+        asyncio.run(load_expense_columns(db.expenses, {"user_id": "u1"}))))
+    from_rollups = asyncio.run(service.get_cash_flow_insights_from_rollups(
+        asyncio.run(rollups.get_rollups(db, "u1"))))
+    # January to June; three categories tie at 50, kept by name
+    assert aggregate["average_monthly"] == pytest.approx(250.0 / 6)
+    assert list(aggregate["top_expense_categories"]) == ["Rent", "Fees", "Gifts"]
+    for other in (in_memory, columns, from_rollups):
+        assert_same_insights(aggregate, other)
+
+    # Unparseable dates count towards the total but not the months
+    asyncio.run(db.expenses.insert_one(
+        {"user_id": "u2", "amount": 20.0, "date": "not a date", "category": "Meals"}))
+    assert_same_insights(
+        asyncio.run(service.get_cash_flow_insights_from_db(db.expenses, "u2")),
+        asyncio.run(service.get_cash_flow_insights(
+            [{"amount": 20.0, "date": "not a date", "category": "Meals"}])))
+
+
+def test_cash_flow_insights_without_expenses():
+    service = ForecastService()
+    collection = seeded_expenses()
+
+    expected = asyncio.run(service.get_cash_flow_insights([]))
+    actual = asyncio.run(service.get_cash_flow_insights_from_db(collection, "nobody"))
+
+    assert actual == expected
+    assert actual["total_expenses"] == 0.0
+
+
+def test_rollups_match_raw_expenses_after_incremental_updates():
+    service, rollups = ForecastService(), RollupService()
+    db = seeded_expenses().database
+    user_expenses = [dict(e) for e in EXPENSES if e["user_id"] == "u1"]
+
+    async def scenario():
+        await rollups.rebuild(db)
+        moved = {**user_expenses[0], "amount": 60.0, "date": datetime(2024, 7, 1)}
+        await rollups.apply_update(db, "u1", user_expenses[0], moved)
+        extra = {"amount": 12.0, "date": "2024-07-15", "category": "Meals"}
+        await rollups.apply(db, "u1", extra)
+        return await rollups.get_rollups(db, "u1"), [moved, *user_expenses[1:], extra]
+
+    rows, current = asyncio.run(scenario())
+    expected = asyncio.run(service.get_cash_flow_insights(current))
+    actual = asyncio.run(service.get_cash_flow_insights_from_rollups(rows))
+    assert_same_insights(actual, expected)
+
+    asyncio.run(db.expenses.update_one({"amount": 120.0},
+                                       {"$set": {"amount": 60.0, "date": datetime(2024, 7, 1)}}))
+    asyncio.run(db.expenses.insert_one({"user_id": "u1", **current[-1]}))
+    asyncio.run(rollups.rebuild(db, "u1"))
+    rebuilt = asyncio.run(rollups.get_rollups(db, "u1"))
+    key = lambda row: (row["month"], str(row["category"]))
+    assert sorted(map(key, rebuilt)) == sorted(map(key, rows))
+    for a, b in zip(sorted(rebuilt, key=key), sorted(rows, key=key)):
+        assert a["amount"] == pytest.approx(b["amount"])
+        assert a["count"] == b["count"]
+
+
+def test_forecast_reuses_fitted_model_until_data_version_changes():
+    service = ForecastService()
+    rows = [{"month": f"2024-{m:02d}", "category": "Meals", "amount": 100.0 + 10 * m,
+             "count": 1, "tax_amount": 0.0} for m in range(1, 13)]
+    loads = []
+
+    async def load_rollups():
+        loads.append(1)
+        return rows
+
+    first = asyncio.run(service.predict_tax_liability_for_user("u1", 1, load_rollups))
+    again = asyncio.run(service.predict_tax_liability_for_user("u1", 1, load_rollups))
+    assert again == first and len(loads) == 1
+
+    asyncio.run(service.predict_tax_liability_for_user("u1", 2, load_rollups))
+    assert len(loads) == 2
+    assert len(first["predictions"]) == 3
+    assert first["model"] in ("linear_trend", "seasonal_naive", "exponential_smoothing")
+
+
+def test_batch_forecast_is_served_until_its_version_or_month_is_stale():
+    from app.services.forecast_batch import ForecastBatchJob
+
+    service, rollups = ForecastService(), RollupService()
+    db = seeded_expenses().database
+    asyncio.run(rollups.rebuild(db))
+    version = asyncio.run(rollups.get_version(db, "u1"))
+    loads = []
+
+    async def load_rollups():
+        loads.append(1)
+        return await rollups.get_rollups(db, "u1")
+
+    def predict(version):
+        stored = asyncio.run(db.forecasts.find_one({"_id": "u1"}))
+        return asyncio.run(service.predict_tax_liability_for_user(
+            "u1", version, load_rollups, stored))
+
+    stats = asyncio.run(ForecastBatchJob(workers=0, shard_size=1).run(db))
+    assert stats["users"] == 2 and stats["shards"] == 2
+    stored = asyncio.run(db.forecasts.find_one({"_id": "u1"}))
+    assert stored["month"] == datetime.now().strftime("%Y-%m")
+    assert predict(version)["predictions"] == stored["predictions"] and not loads
+
+    # New data: the live version moved past the stored one
+    assert predict(version + 1)["model"] == stored["model"] and len(loads) == 1
+
+    # Generated in an earlier month: its horizon starts in the past
+    asyncio.run(ForecastBatchJob(workers=0).run(db, current_month="2000-01"))
+    assert predict(version)["predictions"][0]["month"] > datetime.now().strftime("%Y-%m")
+    assert len(loads) == 2
+
+
+@pytest.fixture
+def rate_file(tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text("state,zip,rate\nCA,,0.0725\nCA,94103,0.08625\nOR,,0\n")
+    return path
+
+
+class FakeTaxJar:
+    def __init__(self):
+        self.orders = []
+
+    def tax_for_order(self, order):
+        self.orders.append(order)
+        return SimpleNamespace(rate=0.05, amount_to_collect=order["amount"] * 0.05)
+
+
+def test_tax_liability_uses_local_rate_table(rate_file):
+    client = FakeTaxJar()
+    service = TaxService(TaxRateTable(str(rate_file)), client=client)
+
+    statewide = asyncio.run(service.calculate_tax_liability(200.0, "ca"))
+    by_zip = asyncio.run(service.calculate_tax_liability(200.0, "CA", "94103-1234"))
+    exempt = asyncio.run(service.calculate_tax_liability(200.0, "OR"))
+
+    assert statewide == {"amount": 200.0, "tax_amount": 14.5, "tax_rate": 0.0725,
+                         "source": "local"}
+    assert by_zip["tax_rate"] == 0.08625 and by_zip["tax_amount"] == 17.25
+    assert exempt["tax_amount"] == 0.0
+    assert client.orders == []
+
+
+def test_tax_liability_falls_back_to_taxjar_once_per_jurisdiction(rate_file):
+    client = FakeTaxJar()
+    service = TaxService(TaxRateTable(str(rate_file)), client=client)
+
+    first = asyncio.run(service.calculate_tax_liability(100.0, "TX"))
+    second = asyncio.run(service.calculate_tax_liability(40.0, "TX"))
+
+    assert first["source"] == second["source"] == "taxjar"
+    assert second["tax_amount"] == 2.0
+    assert len(client.orders) == 1
+
+
+def test_tax_rate_table_reloads_changed_file(rate_file):
+    table = TaxRateTable(str(rate_file), refresh_interval=0)
+    rate_file.write_text("state,zip,rate\nCA,,0.08\n")
+    os.utime(rate_file, (0, 0))
+
+    assert table.lookup("CA") == 0.08
+    assert table.lookup("OR") is None
+    assert "error" in asyncio.run(
+        TaxService(table, client=None).calculate_tax_liability(1.0, "OR"))
+
+
+def test_bulk_tax_liability_resolves_each_jurisdiction_once(rate_file):
+    client = FakeTaxJar()
+    service = TaxService(TaxRateTable(str(rate_file)), client=client)
+    rows = [{"amount": 10 * i, "state": state, "zip": zip_code}
+            for i, (state, zip_code) in enumerate(
+                [("CA", None), ("TX", ""), ("CA", "94103"), ("TX", None)] * 50)]
+    rows.append({"amount": "n/a", "state": "CA"})
+
+    results = asyncio.run(service.calculate_tax_liabilities(rows))
+
+    assert len(client.orders) == 1
+    assert results[0]["tax_amount"] == 0.0 and results[0]["source"] == "local"
+    assert results[2]["tax_amount"] == round(20 * 0.08625, 2)
+    assert results[3]["tax_rate"] == 0.05 and results[3]["source"] == "taxjar"
+    assert "error" in results[-1]
+
+
+def test_bulk_tax_liability_reports_invalid_rows_and_streams_per_chunk(rate_file):
+    from app.api import deps
+    from app.main import app
+
+    client = FakeTaxJar()
+    service = TaxService(TaxRateTable(str(rate_file)), client=client)
+    bad_rows = [5, None, ["CA", 1], {"amount": 1, "state": None},
+                {"amount": "nan", "state": "CA"}, {"amount": "inf", "state": "CA"},
+                {"amount": True, "state": "CA"}, {"state": "CA"},
+                {"amount": 1, "state": 6}, {"amount": 1, "state": "CA", "zip": {}}]
+    results = asyncio.run(service.calculate_tax_liabilities(
+        [{"amount": 10, "state": "CA"}, *bad_rows]))
+    assert results[0]["tax_amount"] == 0.72
+    assert all(result["error"].startswith("Invalid row") for result in results[1:])
+    assert results[1]["error"] == "Invalid row: row must be an object"
+    assert results[4]["state"] is None and client.orders == []  # never sent as "NONE"
+
+    # Later chunks are only computed once the earlier ones have been consumed
+    async def first_chunk():
+        chunks = service.iter_tax_liabilities(
+            [{"amount": 1, "state": "TX"}, {"amount": 1, "state": "NV"}], chunk_size=1)
+        first = await chunks.__anext__()
+        orders = [order["to_state"] for order in client.orders]
+        await chunks.aclose()
+        return first, orders
+    first, orders = asyncio.run(first_chunk())
+    assert first[0]["source"] == "taxjar" and orders == ["TX"]
+
+    _, headers = signed_in("grace")
+    app.dependency_overrides[deps.get_tax_service] = lambda: service
+    try:
+        response = asyncio.run(call_api(
+            "POST", "/api/tax-alerts/calculate-liability/bulk/", params={"stream": True},
+            json=[{"amount": 10, "state": "CA"}] * 600 + bad_rows, headers=headers))
+    finally:
+        app.dependency_overrides.clear()
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.status_code == 200 and len(lines) == 600 + len(bad_rows) + 1
+    assert lines[-1]["summary"] == {"rows": 610, "errors": 10,
+                                    "total_amount": 6000.0, "total_tax": 432.0}
+
+
+def test_tax_alerts_come_from_calendar_and_cached_thresholds(rate_file):
+    service = TaxService(TaxRateTable(str(rate_file)), client=None)
+    rows = [{"month": "2025-04", "category": "Travel", "amount": 9000.0},
+            {"month": "2025-05", "category": None, "amount": 3000.0}]
+    loads = []
+
+    async def load_rollups():
+        loads.append(1)
+        return rows
+
+    alerts = asyncio.run(service.get_tax_alerts(
+        "u1", 1, load_rollups, days=60, today=date(2025, 5, 20)))
+    assert [a["id"] for a in alerts if a["type"] == "deadline"] == ["q2_estimate"]
+    assert alerts[0]["due_date"] == "2025-06-16"  # June 15, 2025 is a Sunday
+    assert {a["id"] for a in alerts if a["type"] == "threshold"} == {
+        "quarter_expenses_high", "uncategorized_expenses"}
+
+    asyncio.run(service.get_tax_alerts("u1", 1, load_rollups, today=date(2025, 5, 21)))
+    assert len(loads) == 1
+    asyncio.run(service.get_tax_alerts("u1", 2, load_rollups, today=date(2025, 5, 21)))
+    assert len(loads) == 2
+
+    january = asyncio.run(service.get_tax_alerts(
+        "u1", 2, load_rollups, days=20, today=date(2025, 12, 28)))
+    assert [a["id"] for a in january if a["type"] == "deadline"] == ["q4_estimate"]
+    assert "Q4 2025" in january[0]["message"]
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+def test_export_streams_csv_and_parquet_in_batches():
+    collection = seeded_expenses()
+
+    def cursor():
+        return collection.find({"user_id": "u1"}, EXPORT_PROJECTION).sort("date", 1)
+
+    chunks = asyncio.run(collect(export_csv(cursor(), batch_size=4)))
+    lines = "".join(chunks).splitlines()
+    assert len(chunks) == 2
+    assert lines[0].startswith("id,date,amount")
+    assert len(lines) == 7 and ",120.0," in lines[1]
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    data = b"".join(asyncio.run(collect(export_parquet(cursor(), batch_size=4))))
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.num_row_groups == 2
+    assert parquet.read().column("amount").to_pylist()[:2] == [120.0, 45.5]
+
+
+def test_import_skips_duplicates_and_reports_bad_rows():
+    db = AsyncMongoMockClient().taxBusiness
+    asyncio.run(ensure_indexes(db))
+    # Signed like a bank export: negative is money out, the credit is skipped
+    csv_file = (b"Transaction Date,Payee,Amount,Memo\n"
+                b"01/05/2024,Staples,\"-$1,042.10\",paper\n"
+                b"01/05/2024,staples ,-1042.10,duplicate in file\n"
+                b"2024-02-11,Delta,(300.00),\n"
+                b"not a date,Delta,-5,\n"
+                b"2024-02-12,Uber,,\n"
+                b"2024-02-13,Delta,300.00,refund\n")
+    importer = ExpenseImporter(batch_size=2)
+
+    report = asyncio.run(importer.run(db, "u1", io.BytesIO(csv_file), "csv", RollupService()))
+    assert (report["rows"], report["inserted"], report["duplicates"], report["failed"]) == (5, 2, 1, 2)
+    assert [error["row"] for error in report["errors"]] == [5, 6]
+    rollups = asyncio.run(RollupService().get_rollups(db, "u1"))
+    assert sum(row["amount"] for row in rollups) == pytest.approx(1342.10)
+
+    again = asyncio.run(importer.run(db, "u1", io.BytesIO(csv_file), "csv", RollupService()))
+    assert again["inserted"] == 0 and again["duplicates"] == 3
+
+    ofx_file = (b"<OFX><BANKTRANLIST>\n<STMTTRN><DTPOSTED>20240301120000[-5:EST]"
+                b"<TRNAMT>-12.50<NAME>Cafe\n</STMTTRN>\n"
+                b"<STMTTRN><DTPOSTED>20240302<TRNAMT>900.00<NAME>Payroll\n</STMTTRN>\n")
+    report = asyncio.run(importer.run(db, "u1", io.BytesIO(ofx_file), "ofx", RollupService()))
+    assert report["inserted"] == 1
+
+    # Unsigned ledger: expenses are positive, the negative row is a refund
+    ledger = b"Date,Amount,Vendor\n2024-04-01,20.00,Cafe\n2024-04-02,-20.00,Cafe\n"
+    report = asyncio.run(importer.run(db, "u1", io.BytesIO(ledger), "csv", RollupService()))
+    assert (report["rows"], report["inserted"]) == (1, 1)
+
+
+def test_import_skips_expenses_already_entered_by_hand():
+    from app.services.import_service import backfill_dedupe_keys, dedupe_key
+
+    db = AsyncMongoMockClient().taxBusiness
+    asyncio.run(ensure_indexes(db))
+    coffee = {"user_id": "u1", "amount": 4.5, "date": datetime(2024, 5, 1), "vendor": "Cafe"}
+    # Two identical purchases entered by hand, as confirm_receipt stores them
+    asyncio.run(db.expenses.insert_many(
+        [{**coffee, "dedupe_key": dedupe_key(coffee)} for _ in range(2)]))
+    # Stored before expenses carried a key
+    asyncio.run(db.expenses.insert_one(
+        {"user_id": "u1", "amount": 30.0, "date": datetime(2024, 5, 3), "vendor": "Deli"}))
+    assert asyncio.run(backfill_dedupe_keys(db)) == 1
+
+    export = (b"Date,Amount,Payee\n2024-05-01,-4.50,CAFE\n2024-05-03,-30.00,Deli\n"
+              b"2024-05-04,-3.00,Cafe\n")
+    report = asyncio.run(ExpenseImporter().run(
+        db, "u1", io.BytesIO(export), "csv", RollupService()))
+    assert (report["inserted"], report["duplicates"]) == (1, 2)
+    assert asyncio.run(db.expenses.count_documents({"user_id": "u1"})) == 4
+
+
+def test_receipt_storage_hashes_dedupes_and_renders_variants(tmp_path):
+    from PIL import Image
+
+    photo = io.BytesIO()
+    Image.new("RGB", (1200, 900), "white").save(photo, "JPEG")
+    db = AsyncMongoMockClient().taxBusiness
+    store = LocalReceiptStore(str(tmp_path))
+
+    def upload():
+        return asyncio.run(store_receipt(db, store, "u1", io.BytesIO(photo.getvalue()),
+                                         "r.jpg", "image/jpeg"))
+
+    first, second = upload(), upload()
+    assert first["_id"] == second["_id"] and first["size"] == len(photo.getvalue())
+    assert set(first["variants"]) == {"thumbnail", "ocr"}
+    assert Image.open(io.BytesIO(first["ocr_bytes"])).mode == "L"
+
+    async def read(blob_id, start, end):
+        return b"".join([chunk async for chunk in store.stream(blob_id, start, end)])
+
+    assert asyncio.run(read(first["blob_id"], 5, 14)) == photo.getvalue()[5:15]
+    thumbnail = asyncio.run(read(first["variants"]["thumbnail"]["blob_id"], 0, None))
+    assert max(Image.open(io.BytesIO(thumbnail)).size) == 320
+
+
+def test_receipts_are_preprocessed_from_the_stored_blob(tmp_path):
+    from contextlib import asynccontextmanager
+
+    from PIL import Image
+
+    from app.services.receipt_storage import ReceiptStore
+
+    with pytest.raises(TypeError):
+        ReceiptStore()
+
+    class MemoryStore(ReceiptStore):
+        """Has no file of its own, so preprocessing goes via a temporary file."""
+
+        def __init__(self):
+            self.blobs, self.paths = {}, []
+
+        async def save(self, chunks, filename, content_type):
+            data = b"".join([chunk async for chunk in chunks])
+            blob_id = str(len(self.blobs))
+            self.blobs[blob_id] = data
+            return {"blob_id": blob_id, "sha256": blob_id + "-sha", "size": len(data)}
+
+        async def stream(self, blob_id, start=0, end=None):
+            yield self.blobs[blob_id][start:None if end is None else end + 1]
+
+        async def delete(self, blob_id):
+            self.blobs.pop(blob_id, None)
+
+        @asynccontextmanager
+        async def local_path(self, blob_id):
+            async with super().local_path(blob_id) as path:
+                self.paths.append(path)
+                yield path
+
+    class ReadOnce(io.BytesIO):
+        def seek(self, *args):
+            raise AssertionError("the upload is read once, while it is stored")
+
+    photo = io.BytesIO()
+    Image.new("RGB", (640, 480), "white").save(photo, "PNG")
+    store = MemoryStore()
+    stored = asyncio.run(store_receipt(AsyncMongoMockClient().taxBusiness, store, "u1",
+                                       ReadOnce(photo.getvalue()), "r.png", "image/png"))
+    assert stored["image_format"] == "PNG" and len(store.paths) == 1
+    assert Image.open(io.BytesIO(stored["ocr_bytes"])).mode in ("L", "RGB")
+    assert not os.path.exists(store.paths[0])
+
+
+def receipt_photo(seed, width=1200, height=1600):
+    import random
+
+    from PIL import Image, ImageDraw, ImageFont
+
+    rnd = random.Random(seed)
+    image = Image.new("RGB", (width, height), (70, 58, 45))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((360, 160, 840, 1440), fill=(246, 244, 238))
+    font = ImageFont.load_default(size=24)
+    for line in range(30):
+        draw.text((390, 190 + line * 40), f"ITEM {rnd.randint(0, 9999):04d} {rnd.random():.2f}",
+                  fill=(20, 20, 20), font=font)
+    return image
+
+
+def jpeg(image, quality=92):
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_preprocessing_shrinks_ocr_payload_and_skips_near_duplicates(tmp_path):
+    from PIL import Image
+
+    from app.services.image_preprocess import process_receipt_image
+
+    photo = receipt_photo(1)
+    processed = process_receipt_image(jpeg(photo), True, 100, 3.2, 2000, 85, 0)
+    ocr_image = Image.open(io.BytesIO(processed["ocr"]))
+    assert ocr_image.mode == "L" and ocr_image.width == 320
+    assert ocr_image.height / ocr_image.width > 2.5  # cropped to the paper
+    assert "thumbnail" not in processed
+
+    db = AsyncMongoMockClient().taxBusiness
+    store = LocalReceiptStore(str(tmp_path))
+
+    def upload(data):
+        return asyncio.run(store_receipt(db, store, "u1", io.BytesIO(data), "r.jpg", "image/jpeg"))
+
+    first = upload(jpeg(photo))
+    rescaled = upload(jpeg(photo.resize((840, 1120)), quality=70))
+    other = upload(jpeg(receipt_photo(2)))
+    assert first["duplicate"] is None and rescaled["duplicate"] == "near"
+    assert rescaled["_id"] == first["_id"] and other["duplicate"] is None
+    assert len(list(tmp_path.glob("*/*"))) == 6  # two originals, each with two variants
+
+
+SIMPLE_RECEIPT = """CORNER HARDWARE
+Store #12
+03/14/2024 10:02
+NAILS 1LB              4.99
+2 x TAPE              6.00
+SUBTOTAL              10.99
+TAX 8.25%              0.91
+TOTAL                 11.90
+VISA                  11.90"""
+
+
+def test_rule_parser_extracts_simple_receipt_and_flags_unclear_ones():
+    parsed = parse_receipt_text(SIMPLE_RECEIPT)
+    assert parsed.trusted(0.8)
+    assert (parsed.data["vendor"], parsed.data["date"], parsed.data["total_amount"]) == (
+        "CORNER HARDWARE", "2024-03-14", 11.90)
+    assert parsed.data["tax_amount"] == 0.91 and parsed.data["tax_rate"] == 8.25
+    assert parsed.data["items"][1] == {"name": "TAPE", "price": 6.00, "quantity": 2}
+
+    # Two candidate dates and no total keyword: leave it to the LLM.
+    unclear = parse_receipt_text("PARKING\nEntry 07/01/2024\nExit 07/03/2024\n72.00")
+    assert not unclear.trusted(0.8)
+
+
+def test_ocr_service_only_calls_llm_for_low_confidence_text():
+    from app.services.image_preprocess import image_preprocessor
+    from app.services.ocr_backends import GeminiLLM, GoogleVisionOCR
+    from app.services.ocr_service import OCRService
+
+    texts = {b"clear": SIMPLE_RECEIPT, b"unclear": "tony's garage\noil change 45\n= 45 paid"}
+    vision = SimpleNamespace(text_detection=lambda image: SimpleNamespace(
+        full_text_annotation=SimpleNamespace(text=texts[image.content])))
+    prompts = []
+
+    def generate_content(prompt):
+        prompts.append(prompt)
+        return SimpleNamespace(text='{"total_amount": 45.0, "date": null, '
+                                    '"vendor": "Tony\'s Garage", "items": []}')
+
+    enabled, image_preprocessor.enabled = image_preprocessor.enabled, False
+    service = OCRService(ocr=GoogleVisionOCR(client=vision),
+                         llm=GeminiLLM(model=SimpleNamespace(generate_content=generate_content)))
+    try:
+        clear = asyncio.run(service.extract_receipt_data(b"clear"))
+        unclear = asyncio.run(service.extract_receipt_data(b"unclear"))
+    finally:
+        image_preprocessor.enabled = enabled
+    assert clear["total_amount"] == 11.90
+    assert unclear["vendor"] == "Tony's Garage"
+    assert len(prompts) == 1 and "oil change" in prompts[0]
+
+
+def test_stub_backends_are_deterministic_and_cached_apart():
+    from app.services.image_preprocess import image_preprocessor
+    from app.core.settings import settings
+    from app.services.ocr_backends import StubLLM, StubOCR, get_ocr_backend
+    from app.services.ocr_cache import OCRResultCache
+    from app.services.ocr_service import OCRService
+
+    ocr = StubOCR(latency=0)
+    assert ocr.recognize(b"receipt-1") == ocr.recognize(b"receipt-1")
+    assert ocr.recognize(b"receipt-1") != ocr.recognize(b"receipt-2")
+
+    enabled, image_preprocessor.enabled = image_preprocessor.enabled, False
+    rules, settings.ocr_rules_parser = settings.ocr_rules_parser, False
+    try:
+        service = OCRService(ocr=ocr, llm=StubLLM(latency=0))
+        first = asyncio.run(service.extract_receipt_data(b"receipt-1"))
+        again = asyncio.run(OCRService(ocr=StubOCR(), llm=StubLLM()).extract_receipt_data(
+            b"receipt-1"))
+    finally:
+        image_preprocessor.enabled = enabled
+        settings.ocr_rules_parser = rules
+    assert first == again
+    assert first["vendor"] and first["date"].startswith("2024-") and first["total_amount"] > 0
+    assert service.cache_namespace == "stub+stub"
+    assert OCRResultCache.key_for(b"x", "stub+stub") != OCRResultCache.key_for(b"x")
+    with pytest.raises(RuntimeError):
+        get_ocr_backend("carrier-pigeon")
+
+
+def test_slow_ocr_and_llm_calls_time_out_without_blocking_the_loop():
+    import time
+
+    from app.core.settings import settings
+    from app.services.image_preprocess import image_preprocessor
+    from app.services.ocr_backends import StubLLM, StubOCR
+    from app.services.ocr_service import OCRService
+    from app.utils.helpers import run_blocking
+
+    async def scenario(service, image):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        try:
+            return await service.extract_receipt_data(image), ticks
+        finally:
+            task.cancel()
+
+    saved = (settings.ocr_vision_timeout, settings.ocr_gemini_timeout,
+             settings.ocr_rules_parser, image_preprocessor.enabled)
+    settings.ocr_vision_timeout = settings.ocr_gemini_timeout = 0.1
+    settings.ocr_rules_parser, image_preprocessor.enabled = False, False
+    try:
+        slow_ocr = OCRService(ocr=StubOCR(latency=0.5), llm=StubLLM())
+        ocr_result, ticks = asyncio.run(scenario(slow_ocr, b"slow-ocr"))
+        slow_llm = OCRService(ocr=StubOCR(), llm=StubLLM(latency=0.5))
+        llm_result, _ = asyncio.run(scenario(slow_llm, b"slow-llm"))
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(run_blocking(None, time.sleep, 0.5, timeout=0.05))
+    finally:
+        (settings.ocr_vision_timeout, settings.ocr_gemini_timeout,
+         settings.ocr_rules_parser, image_preprocessor.enabled) = saved
+
+    assert ocr_result == {"error": "Timed out while processing image"}
+    assert llm_result["error"].startswith("Timed out")
+    assert ticks >= 5  # the event loop kept running while OCR hung
+    # Failures are not cached
+    assert slow_ocr.cache.stats()["memory_size"] == 0
+
+
+def test_ocr_result_cache_hits_misses_and_expiry_in_both_tiers():
+    import time
+
+    from app.services.ocr_cache import OCRResultCache
+
+    collection = AsyncMongoMockClient().taxBusiness.ocr_cache
+    key = OCRResultCache.key_for(b"receipt")
+    receipt = {"total_amount": 11.9, "items": [{"name": "TAPE"}]}
+
+    async def scenario():
+        worker_a, worker_b = OCRResultCache(16, ttl=60), OCRResultCache(16, ttl=60)
+        assert await worker_a.get(key, collection) is None
+        await worker_a.set(key, receipt, collection)
+        hit = await worker_a.get(key, collection)
+        hit["items"].append("mutated by caller")
+        shared = await worker_b.get(key, collection)  # another worker, via Mongo
+        again = await worker_b.get(key, collection)   # now in its memory tier
+
+        await collection.update_one({"_id": key},
+                                    {"$set": {"expires_at": datetime(2000, 1, 1)}})
+        worker_c = OCRResultCache(16, ttl=60)
+        expired_in_mongo = await worker_c.get(key, collection)
+
+        short = OCRResultCache(16, ttl=0.05)
+        await short.set(key, receipt)
+        time.sleep(0.1)
+        expired_in_memory = await short.get(key)
+        return worker_a, worker_b, worker_c, shared, again, expired_in_mongo, expired_in_memory
+
+    worker_a, worker_b, worker_c, shared, again, expired_in_mongo, expired_in_memory = \
+        asyncio.run(scenario())
+    assert shared == again == receipt  # callers get copies
+    assert worker_a.stats() == {"memory_hits": 1, "mongo_hits": 0, "misses": 1,
+                                "memory_size": 1}
+    assert (worker_b.hits, worker_b.misses) == ({"memory": 1, "mongo": 1}, 0)
+    assert expired_in_mongo is None and worker_c.misses == 1
+    assert expired_in_memory is None
+    assert OCRResultCache.key_for(b"receipt") != OCRResultCache.key_for(b"receipt2")
+
+
+def signed_in(username):
+    """A fresh mongomock database behind the app and auth headers for ``username``."""
+    from app.api import deps
+    from app.core.security import create_access_token
+
+    deps.client = AsyncMongoMockClient()
+    deps.user_cache.pop(username)
+    asyncio.run(deps.client.taxBusiness.users.insert_one(
+        {"username": username, "hashed_password": "x"}))
+    token = create_access_token({"sub": username})
+    return deps.client.taxBusiness, {"Authorization": f"Bearer {token}"}
+
+
+async def call_api(method, url, **kwargs):
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.request(method, url, **kwargs)
+
+
+def test_batch_upload_streams_one_result_per_file_and_names_failures(tmp_path, monkeypatch):
+    from bson import ObjectId
+
+    from app.api import deps
+    from app.core.settings import settings
+    from app.main import app
+
+    monkeypatch.setattr(settings, "receipt_storage", "local")
+    monkeypatch.setattr(settings, "receipt_storage_path", str(tmp_path))
+    db, headers = signed_in("batch-user")
+
+    class FakeOCR:
+        async def extract_receipt_data(self, contents, db=None, preprocessed=False):
+            if contents == b"corrupt":
+                raise ValueError("cannot identify image file")
+            if contents == b"blank":
+                return {"error": "No text found in image"}
+            return {"total_amount": 12.5, "vendor": contents.decode()}
+
+    def files():
+        return [("files", (name, data, "image/jpeg")) for name, data in
+                (("cafe.jpg", b"Cafe"), ("bad.jpg", b"corrupt"), ("blank.jpg", b"blank"))]
+
+    app.dependency_overrides[deps.get_ocr_service] = FakeOCR
+    try:
+        ndjson = asyncio.run(call_api("POST", "/api/expenses/upload-receipts/",
+                                      files=files(), headers=headers))
+        sse = asyncio.run(call_api("POST", "/api/expenses/upload-receipts/?stream_format=sse",
+                                   files=files(), headers=headers))
+    finally:
+        app.dependency_overrides.pop(deps.get_ocr_service)
+
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in ndjson.text.splitlines()]
+    by_file = {line["filename"]: line for line in lines[:-1]}
+    assert by_file["bad.jpg"] == {"status": "error", "filename": "bad.jpg",
+                                  "error": "Failed to process receipt"}
+    assert by_file["blank.jpg"]["error"] == "No text found in image"
+    assert by_file["cafe.jpg"]["receipt"]["merchant"] == "Cafe"
+    assert lines[-1] == {"status": "done", "processed": 1, "failed": 2, "inserted": 1}
+    # Ids are only announced once their receipt is saved
+    saved = asyncio.run(db.receipts.find_one({"_id": ObjectId(by_file["cafe.jpg"]["id"])}))
+    assert saved["merchant"] == "Cafe"
+    # Each file is kept in receipt storage, like a single upload
+    stored = asyncio.run(db.receipt_files.find_one({"_id": ObjectId(saved["receipt_image"])}))
+    assert stored["filename"] == "cafe.jpg"
+
+    assert sse.headers["content-type"].startswith("text/event-stream")
+    events = [event.split("\n") for event in sse.text.strip().split("\n\n")]
+    assert sorted(event[0] for event in events) == [
+        "event: done", "event: error", "event: error", "event: ok"]
+    # Re-uploading the same bytes returns the receipt already parsed
+    ok = next(event for event in events if event[0] == "event: ok")
+    assert json.loads(ok[1][len("data: "):])["id"] == by_file["cafe.jpg"]["id"]
+    assert json.loads(events[-1][1][len("data: "):])["inserted"] == 0
+    assert asyncio.run(db.receipts.count_documents({"merchant": "Cafe"})) == 1
+
+
+def test_receipt_job_queue_claims_retries_and_dead_letters():
+    from datetime import timedelta
+
+    from bson import ObjectId
+
+    from app.services.receipt_jobs import PermanentJobError, ReceiptJobQueue
+
+    db = AsyncMongoMockClient().taxBusiness
+    outcomes = []
+
+    async def handler(db, job):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    queue = ReceiptJobQueue(handler, max_attempts=3, backoff_seconds=10, lease_seconds=60)
+
+    async def job(job_id):
+        return await db.receipt_jobs.find_one({"_id": job_id})
+
+    async def make_due(job_id, field):
+        await db.receipt_jobs.update_one(
+            {"_id": job_id}, {"$set": {field: datetime.utcnow() - timedelta(seconds=1)}})
+
+    async def scenario():
+        await queue.enqueue(db, "u1", "flaky.jpg", ObjectId())
+        flaky = await queue._claim(db)
+        assert (flaky["status"], flaky["attempts"]) == ("running", 1)
+        assert await queue._claim(db) is None  # leased, nothing else queued
+
+        delays = []
+        for attempt in (1, 2, 3):
+            outcomes.append(RuntimeError("Timed out while processing image"))
+            await queue._run(db, flaky)
+            current = await job(flaky["_id"])
+            if current["status"] == "dead":
+                break
+            assert current["stage"] == "retrying" and await queue._claim(db) is None
+            delays.append(round((current["run_at"] - current["updated_at"]).total_seconds()))
+            await make_due(flaky["_id"], "run_at")
+            flaky = await queue._claim(db)
+            assert flaky["attempts"] == attempt + 1
+        assert delays == [10, 20] and current["status"] == "dead"
+        assert (await db.receipt_jobs_dead.find_one({"_id": flaky["_id"]}))["attempts"] == 3
+
+        # A worker that crashes or hangs never reports back; its lease runs out
+        await queue.enqueue(db, "u1", "crash.jpg", ObjectId())
+        crash = await queue._claim(db)
+        for attempt in (2, 3):
+            await make_due(crash["_id"], "lease_until")
+            crash = await queue._claim(db)
+            assert crash["attempts"] == attempt
+        await make_due(crash["_id"], "lease_until")
+        assert await queue._claim(db) is None
+        crashed = await job(crash["_id"])
+        assert crashed["status"] == "dead" and "Lease expired" in crashed["error"]
+
+        await queue.enqueue(db, "u1", "blank.jpg", ObjectId())
+        blank = await queue._claim(db)
+        outcomes.append(PermanentJobError("No text found in image"))
+        await queue._run(db, blank)
+        blank = await job(blank["_id"])
+        assert (blank["status"], blank["attempts"]) == ("dead", 1)
+
+        await queue.enqueue(db, "u1", "ok.jpg", ObjectId())
+        ok = await queue._claim(db)
+        outcomes.append({"receipt_id": "r1"})
+        await queue._run(db, ok)
+        ok = await job(ok["_id"])
+        assert (ok["status"], ok["result"]) == ("succeeded", {"receipt_id": "r1"})
+        assert await db.receipt_jobs_dead.count_documents({}) == 3
+
+    asyncio.run(scenario())
+
+
+def test_async_upload_queues_a_reference_to_the_stored_file(tmp_path, monkeypatch):
+    from bson import ObjectId
+    from PIL import Image
+
+    from app.api.endpoints import expenses
+    from app.core.settings import settings
+    from app.services.receipt_jobs import PermanentJobError
+
+    monkeypatch.setattr(settings, "receipt_storage", "local")
+    monkeypatch.setattr(settings, "receipt_storage_path", str(tmp_path))
+    db, headers = signed_in("async-user")
+    photo = io.BytesIO()
+    Image.new("RGB", (600, 800), "white").save(photo, "JPEG")
+
+    def upload(name, data):
+        response = asyncio.run(call_api(
+            "POST", "/api/expenses/upload-receipt/async/", headers=headers,
+            files={"file": (name, data, "image/jpeg")}))
+        assert response.status_code == 202
+        return asyncio.run(db.receipt_jobs.find_one(
+            {"_id": ObjectId(response.json()["job_id"])}))
+
+    job = upload("r.jpg", photo.getvalue())
+    assert "image" not in job and job["filename"] == "r.jpg"
+    assert asyncio.run(db.receipt_files.find_one({"_id": job["receipt_file_id"]}))
+
+    class FakeOCR:
+        async def extract_receipt_data(self, contents, db=None, preprocessed=False):
+            return {"total_amount": 8.5, "vendor": "Cafe"}
+
+    monkeypatch.setattr(expenses, "get_ocr_service", FakeOCR)
+    result = asyncio.run(expenses.process_receipt_job(db, job))
+    assert result["amount"] == 8.5 and result["receipt_image"] == str(job["receipt_file_id"])
+
+    not_an_image = upload("notes.txt", b"not an image")
+    with pytest.raises(PermanentJobError):
+        asyncio.run(expenses.process_receipt_job(db, not_an_image))
+
+
+def test_auth_caches_expire_and_user_writes_invalidate_them(monkeypatch):
+    import time
+    from datetime import timedelta
+
+    from app.api import deps
+    from app.core import security
+    from app.core.security import create_access_token
+    from app.models.user import User
+    from app.utils.cache import TTLCache
+
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set("short", 1)
+    cache.set("long", 2, ttl=10)
+    time.sleep(0.1)
+    assert cache.get("short") is None and cache.get("long") == 2
+    cache.set("c", 3)
+    cache.set("d", 4)  # evicts the least recently used entry
+    assert cache.get("long") is None and len(cache) == 2
+
+    # A cached token payload never outlives the token's exp claim
+    token = create_access_token({"sub": "carol"}, expires_delta=timedelta(seconds=5))
+    payload = deps.decode_token(token)
+    expires_at, _ = deps.token_cache._data[token]
+    assert expires_at - time.monotonic() <= payload["exp"] - time.time() + 0.01
+
+    # Registering (today the only write to users) drops a stale cached user
+    monkeypatch.setattr(security.password_hasher, "executor_kind", "thread")
+    monkeypatch.setattr(security.password_hasher, "rounds", 4)
+    deps.client = AsyncMongoMockClient()
+    db = deps.client.taxBusiness
+    deps.user_cache.set("carol", User(id="stale", username="carol", password="x"))
+    response = asyncio.run(call_api("POST", "/api/auth/register",
+                                    data={"username": "carol", "password": "pw"}))
+    assert response.status_code == 200
+    user = asyncio.run(deps.get_current_user(token, db))
+    stored = asyncio.run(db.users.find_one({"username": "carol"}))
+    assert user.id == str(stored["_id"]) != "stale"
+
+
+def test_password_hasher_uses_forkserver_workers_and_sheds_load(monkeypatch):
+    from app.api import deps
+    from app.api.endpoints import auth
+    from app.core.security import PasswordHasher, PasswordHasherBusy
+
+    hasher = PasswordHasher(executor_kind="process", workers=1, rounds=4,
+                            max_concurrency=1, queue_limit=1)
+    try:
+        assert hasher.executor._mp_context.get_start_method() == "forkserver"
+
+        async def hash_and_verify():
+            hashed = await hasher.hash("pw")
+            return await hasher.verify("pw", hashed)
+        assert asyncio.run(hash_and_verify())
+    finally:
+        hasher.shutdown()
+
+    # One operation running and one waiting: the third is turned away
+    hasher = PasswordHasher(executor_kind="thread", workers=1, rounds=4,
+                            max_concurrency=1, queue_limit=1)
+
+    async def flood():
+        results = await asyncio.gather(*(hasher.hash("pw") for _ in range(3)),
+                                       return_exceptions=True)
+        return [type(result) for result in results]
+    assert asyncio.run(flood()) == [str, str, PasswordHasherBusy]
+
+    # The app's shutdown handler stops the pools
+    from fastapi import FastAPI
+    app = FastAPI()
+    deps.define_worker_pools(app, hasher)
+    for handler in app.router.on_shutdown:
+        asyncio.run(handler())
+    assert hasher._executor is None
+
+    # A full queue is a 503 with a retry hint, not a hung login
+    monkeypatch.setattr(auth, "password_hasher",
+                        PasswordHasher(executor_kind="thread", workers=1, rounds=4,
+                                       max_concurrency=1, queue_limit=0))
+    deps.client = AsyncMongoMockClient()
+    asyncio.run(deps.client.taxBusiness.users.insert_one(
+        {"username": "dave", "hashed_password": "x"}))
+    response = asyncio.run(call_api("POST", "/api/auth/token",
+                                    data={"username": "dave", "password": "pw"}))
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_explain_report_reads_classic_and_sbe_plans_and_flags_scans():
+    from app.core.indexes import diagnostic_queries, explain_queries, format_report
+
+    # mongomock has no explain(); these are trimmed server explain documents
+    classic = {"queryPlanner": {"winningPlan": {
+                   "stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}},
+               "executionStats": {"totalDocsExamined": 3, "totalKeysExamined": 3,
+                                  "nReturned": 3}}
+    sbe = {"queryPlanner": {"winningPlan": {"queryPlan": {
+               "stage": "SORT", "inputStages": [{"stage": "COLLSCAN"}]}}},
+           "executionStats": {"totalDocsExamined": 500, "totalKeysExamined": 0,
+                              "nReturned": 3}}
+    sorts = []
+
+    class FakeCursor:
+        def __init__(self, name):
+            self.name = name
+
+        def sort(self, spec):
+            sorts.append(spec)
+            return self
+
+        async def explain(self):
+            return classic if self.name == "users" else sbe
+
+    class FakeCollection:
+        def __init__(self, name):
+            self.name = name
+
+        def find(self, query):
+            return FakeCursor(self.name)
+
+    class FakeDB:
+        def __getitem__(self, name):
+            return FakeCollection(name)
+
+    report = asyncio.run(explain_queries(FakeDB(), "u1", "erin"))
+    assert [row["endpoint"] for row in report] == list(diagnostic_queries("u1", "erin"))
+    assert sorts == [[("date", -1), ("_id", -1)]]
+    user_row = report[0]
+    assert user_row["plan"] == "FETCH <- IXSCAN" and not user_row["collection_scan"]
+    assert (user_row["docs_examined"], user_row["returned"]) == (3, 3)
+    expense_row = report[1]
+    assert expense_row["plan"] == "SORT <- COLLSCAN" and expense_row["collection_scan"]
+
+    lines = format_report(report).splitlines()
+    assert lines[0].split()[:2] == ["endpoint", "collection"]
+    assert len(lines) == len(report) + 1
+    assert "COLLECTION SCAN" not in lines[1] and lines[2].endswith("(COLLECTION SCAN)")
+
+
+def test_misconfigured_ocr_is_a_503_and_backends_are_abstract(tmp_path, monkeypatch):
+    from fastapi import HTTPException
+
+    from app.api import deps
+    from app.core.settings import settings
+    from app.services.ocr_backends import LLMBackend, OCRBackend
+
+    for base in (OCRBackend, LLMBackend):
+        with pytest.raises(TypeError):
+            base()
+
+    bad_json = tmp_path / "credentials.json"
+    bad_json.write_text("{not json")
+    monkeypatch.setattr(settings, "ocr_backend", "google")
+    for path in (str(tmp_path / "missing.json"), str(bad_json), str(tmp_path)):
+        monkeypatch.setattr(settings, "google_cloud_credentials", path)
+        deps.get_ocr_service.cache_clear()
+        with pytest.raises(HTTPException) as error:
+            deps.get_ocr_service()
+        assert error.value.status_code == 503
+        assert "GOOGLE_CLOUD_CREDENTIALS" in error.value.detail
+    deps.get_ocr_service.cache_clear()
+
+
+def test_app_imports_without_credentials_or_heavy_sdks():
+    import subprocess
+    import sys
+
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("GOOGLE_CLOUD_CREDENTIALS", "GEMINI_API", "TAXJAR_API_KEY")}
+    script = ("import sys, app.main; print(sorted(m for m in ('pandas', 'sklearn', "
+              "'taxjar', 'google.cloud.vision', 'google.generativeai') if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+
+    from fastapi import HTTPException
+    from app.api import deps
+
+    deps.get_ocr_service.cache_clear()
+    credentials, deps.settings.google_cloud_credentials = \
+        deps.settings.google_cloud_credentials, None
+    try:
+        with pytest.raises(HTTPException) as error:
+            deps.get_ocr_service()
+    finally:
+        deps.settings.google_cloud_credentials = credentials
+    assert error.value.status_code == 503
+
+
+def test_metrics_time_routes_and_stages_and_log_slow_requests(caplog):
+    import httpx
+    from app.api import deps
+    from app.core.metrics import render_metrics
+    from app.core.security import create_access_token
+    from app.core.settings import settings
+    from app.main import app
+
+    deps.client = AsyncMongoMockClient()
+    deps.user_cache.pop("metrics-user")
+    asyncio.run(deps.client.taxBusiness.users.insert_one(
+        {"username": "metrics-user", "hashed_password": "x"}))
+    token = create_access_token({"sub": "metrics-user"})
+
+    async def requests():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            listed = await http.get("/api/expenses/list/",
+                                    headers={"Authorization": f"Bearer {token}"})
+            missing = await http.get("/no/such/page")
+            metrics = await http.get("/metrics")
+        return listed, missing, metrics
+
+    threshold, settings.metrics_slow_request_seconds = \
+        settings.metrics_slow_request_seconds, 0
+    try:
+        with caplog.at_level("WARNING"):
+            listed, missing, metrics = asyncio.run(requests())
+    finally:
+        settings.metrics_slow_request_seconds = threshold
+
+    assert listed.status_code == 200 and missing.status_code == 404
+    assert metrics.headers["content-type"].startswith("text/plain")
+    text = render_metrics()
+    assert 'app_request_duration_seconds_count{method="GET",route="/api/expenses/list/",' \
+           'status="200"} 1' in text
+    assert 'route="unmatched",status="404"' in text
+    assert 'app_stage_duration_seconds_count{stage="user_lookup"}' in text
+    slow = [json.loads(record.getMessage()) for record in caplog.records
+            if '"slow_request"' in record.getMessage()]
+    listed_log = next(entry for entry in slow if entry["route"] == "/api/expenses/list/")
+    assert {"jwt_decode", "user_lookup"} <= set(listed_log["spans"])
+
+
+def test_mongo_client_factory_pool_options_and_analytics_reads():
+    from app.api import deps
+    from app.core import metrics
+    from app.core.database import client_options, create_client
+    from app.core.settings import settings
+
+    saved = (settings.mongodb_max_pool_size, settings.mongodb_wait_queue_timeout_ms,
+             settings.mongodb_compressors, settings.mongodb_analytics_max_staleness)
+    settings.mongodb_max_pool_size, settings.mongodb_wait_queue_timeout_ms = 20, 500
+    settings.mongodb_compressors, settings.mongodb_analytics_max_staleness = "zlib", 120
+    try:
+        options = client_options()
+        deps.client = create_client("mongomock://")
+
+        async def analytics_read():
+            # mongomock hands out one Database per name, so ask for the
+            # analytics view before anything else touches it
+            db = await deps.get_analytics_db().__anext__()
+            primary = await deps.get_db().__anext__()
+            await primary.expenses.insert_one({"user_id": "u1"})
+            return db.read_preference, await db.expenses.count_documents({})
+
+        read_preference, count = asyncio.run(analytics_read())
+    finally:
+        (settings.mongodb_max_pool_size, settings.mongodb_wait_queue_timeout_ms,
+         settings.mongodb_compressors, settings.mongodb_analytics_max_staleness) = saved
+
+    assert options["maxPoolSize"] == 20 and options["waitQueueTimeoutMS"] == 500
+    assert options["compressors"] == "zlib" and "socketTimeoutMS" not in options
+    assert {type(listener) for listener in options["event_listeners"]} == {
+        metrics.MongoCommandListener, metrics.MongoPoolListener}
+    assert read_preference.mongos_mode == "secondaryPreferred"
+    assert read_preference.max_staleness == 120 and count == 1
+
+    listener, event = metrics.MongoPoolListener(), SimpleNamespace(
+        address=("db", 27017), reason="timeout")
+    listener.connection_created(event)
+    listener.connection_check_out_started(event)
+    listener.connection_checked_out(event)
+    listener.connection_check_out_started(event)
+    listener.connection_check_out_failed(event)
+    assert metrics.pool_in_use.value(("db:27017",)) == 1
+    assert metrics.pool_checkouts.value(("db:27017", "timeout")) == 1
+    assert 'app_mongo_pool_wait_seconds_count{address="db:27017"} 2' in metrics.render_metrics()
+
+
+def test_cursor_pagination_walks_every_page_and_rejects_bad_input():
+    import base64
+    import json
+    from datetime import datetime
+
+    db, headers = signed_in("frank")
+    user = asyncio.run(db.users.find_one({"username": "frank"}))
+    # Two expenses share a date, so the _id tie-break is exercised
+    dates = [datetime(2024, 1, day) for day in (1, 2, 2, 3, 4)]
+    asyncio.run(db.expenses.insert_many(
+        [{"user_id": str(user["_id"]), "amount": float(i), "date": date}
+         for i, date in enumerate(dates)]))
+
+    def page(**params):
+        return asyncio.run(call_api("GET", "/api/expenses/list/", params=params,
+                                    headers=headers))
+
+    seen, params = [], {"pagination": "cursor", "limit": 2}
+    while True:
+        body = page(**params).json()
+        seen += [item["amount"] for item in body["items"]]
+        if body["next_cursor"] is None:
+            break
+        params = {"cursor": body["next_cursor"], "limit": 2}
+    assert seen == [4.0, 3.0, 2.0, 1.0, 0.0]
+    # A page that ends exactly on the last expense has no next cursor
+    assert page(pagination="cursor", limit=5).json()["next_cursor"] is None
+
+    def token(position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+    for bad in ["!!!", token(["not", "an", "object"]),
+                base64.urlsafe_b64encode(b"not json").decode(),
+                token({"d": {"$gt": ""}, "t": "raw", "i": str(user["_id"])})]:
+        assert page(cursor=bad).status_code == 400
+    for limit in (0, -1, 101):
+        assert page(pagination="cursor", limit=limit).status_code == 422